@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stage-by-stage benchmark of the BOM pipeline on synthetic data.
+
+Runs the three pipelines -- ``run_early_warning``, ``run_fp_growth`` and
+``run_rules`` (Apriori), with the scripts' settings -- on each requested size
+tier and reads every stage's timings back from the run telemetry: wall and
+CPU time, the tracemalloc peak of the stage (unless ``--no-memory``) and the
+process' peak RSS. Each pipeline runs on a fresh copy of the tier's inputs,
+so its parse cache, stores and history start cold, and commits the batch as
+the scripts do. Inputs are generated with synthetic_bom.py on first use and
+kept under benchmarks/data/.
+
+    python benchmarks/bench_pipeline.py --tiers small medium --output bench.json
+    python benchmarks/bench_pipeline.py --tiers small --baseline bench.json   # exit 1 on regression
+
+``--scripts`` also runs the three scripts end to end on a copy of each tier.
+FP-Growth_version.py reads its working directory; Early_warning.py and
+Apriori_version.py read a fixed desktop folder, so a copy of each with that
+folder replaced by the work directory is run. The Apriori pipeline and
+script mine with mlxtend's apriori like the script, on inputs with smaller
+workbooks (see PIPELINES). Memory is only traced in this process, so keep
+``--workers 1`` (the default) when comparing peaks.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+from bom_warning.pipeline import InputPaths  # noqa: E402
+from bom_warning.report_backends import OUTPUT_FORMATS  # noqa: E402
+from bom_warning.runs import RunSettings, run_early_warning, run_fp_growth, run_rules  # noqa: E402
+from synthetic_bom import GENERATOR_VERSION, TIERS, generate  # noqa: E402
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+INPUT_FILES = ("Historical_BOM.zip", "To_be_Added.zip", "KONE_Critical_Item.xlsx")
+NOISE_SECONDS = 0.05  # Differences below this are never reported as regressions
+
+# At the script's 0.07 min support every itemset of the five mined workbooks
+# is frequent, so mlxtend's apriori grows as 2^(rows per workbook); its inputs
+# keep the tier but with workbooks this small (about 8 s untraced on small).
+APRIORI_ROWS_PER_FILE = 10
+
+# Pipeline -> (run, writes a quarter delta, settings the script sets on top of
+# the RunSettings defaults, changes to the tier's synthetic inputs).
+PIPELINES = {
+    "early_warning": (run_early_warning, True, {}, {}),
+    "fp_growth": (run_fp_growth, True, {"rule_engine": "fpgrowth", "max_files": 2}, {}),
+    "apriori": (
+        run_rules, False,
+        {"rule_engine": "apriori", "max_files": 5, "rule_min_support": 0.07, "rule_min_confidence": 0.5},
+        {"rows_per_file": APRIORI_ROWS_PER_FILE},
+    ),
+}
+SCRIPT_FOLDER = "/Users/mahtab/Desktop/AIRE"  # Fixed Input / Output folder of Early_warning.py and Apriori_version.py
+# Script -> (pipeline whose inputs it runs on, telemetry report it writes under the work directory)
+SCRIPTS = {
+    "Early_warning.py": ("early_warning", "Output/Early_warning_telemetry.json"),
+    "FP-Growth_version.py": ("fp_growth", "Input/FP_Growth_telemetry.json"),
+    "Apriori_version.py": ("apriori", "Output/Apriori_telemetry.json"),
+}
+
+
+def tier_data(tier: str, seed: int, changes: dict) -> Path:
+    suffix = "".join(f"-{name}{value}" for name, value in sorted(changes.items()))
+    path = DATA_DIR / f"{tier}-seed{seed}-v{GENERATOR_VERSION}{suffix}"
+    if not (path / "To_be_Added.zip").exists():
+        print(f"Generating {tier}{suffix} inputs in {path}")
+        generate(path, replace(TIERS[tier], seed=seed, **changes))
+    return path
+
+
+def _copy_inputs(data: Path, work: Path) -> None:
+    for name in INPUT_FILES:
+        shutil.copy(data / name, work)
+
+
+# === Pipelines (the scripts' runs, timed by their own telemetry)
+def run_pipeline(tier: str, seed: int, name: str, workers: int, formats: tuple, trace_memory: bool) -> list:
+    run, delta, options, changes = PIPELINES[name]
+    data = tier_data(tier, seed, changes)
+    with tempfile.TemporaryDirectory() as work:
+        work = Path(work)
+        _copy_inputs(data, work)
+        telemetry_path = work / f"{name}_telemetry.json"
+        settings = RunSettings(
+            paths=InputPaths.under(work), output=work / "Output" / f"{name}.xlsx", ingest_workers=workers,
+            mining_workers=workers, output_formats=formats, telemetry_path=telemetry_path,
+            trace_memory=trace_memory, delta_output=work / "Output" / "Quarter_Delta.xlsx" if delta else None, **options,
+        )
+        run(settings)
+        report = json.loads(telemetry_path.read_text())
+
+    results = []
+    for stage in report["stages"]:
+        result = {
+            "tier": tier, "stage": f"{name}:{stage['stage']}", "seconds": stage["wall_seconds"],
+            "cpu_seconds": stage["cpu_seconds"], "peak_traced_mb": stage["stage_peak_mb"],
+            "max_rss_mb": stage["process_peak_rss_mb"], "rows_in": stage["rows_in"], "rows_out": stage["rows_out"],
+        }
+        results.append(result)
+        print(
+            f"  {result['stage']:<28} {result['seconds']:9.3f} s  peak {result['peak_traced_mb']} MB  "
+            f"rss {result['max_rss_mb']} MB  rows {result['rows_in']} -> {result['rows_out']}"
+        )
+    return results
+
+
+def run_script(tier: str, seed: int, script: str) -> dict:
+    pipeline, telemetry_name = SCRIPTS[script]
+    data = tier_data(tier, seed, PIPELINES[pipeline][3])
+    with tempfile.TemporaryDirectory() as work:
+        work = Path(work)
+        (work / "Input").mkdir()
+        (work / "Output").mkdir()
+        _copy_inputs(data, work / "Input")
+        # The script itself, reading and writing the work directory instead of the desktop folder
+        (work / script).write_text((REPO / script).read_text().replace(SCRIPT_FOLDER, str(work)))
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO), os.environ.get("PYTHONPATH")]))}
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, str(work / script)], cwd=work / "Input", env=env, capture_output=True, text=True
+        )
+        seconds = time.perf_counter() - start
+        # The child's own peak: RUSAGE_CHILDREN would also count the RSS it inherits when forked
+        telemetry_path = work / telemetry_name
+        peak_rss = json.loads(telemetry_path.read_text())["process_peak_rss_mb"] if telemetry_path.exists() else None
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+    result = {
+        "tier": tier, "stage": f"script:{script}", "seconds": round(seconds, 4), "peak_traced_mb": None,
+        "max_rss_mb": peak_rss, "returncode": completed.returncode,
+    }
+    print(f"  {script:<28} {seconds:9.3f} s  child rss {result['max_rss_mb']} MB  exit {completed.returncode}")
+    return result
+
+
+# === Regression check
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    reference = {(r["tier"], r["stage"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get((result["tier"], result["stage"]))
+        if base is None:
+            continue
+        for metric, floor in (("seconds", NOISE_SECONDS), ("peak_traced_mb", 1.0)):
+            new, old = result.get(metric), base.get(metric)
+            if new is None or old is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(f"{result['tier']}/{result['stage']} {metric}: {old} -> {new}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=["small"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Parser / mining processes")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=["xlsx"])
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows allocation-heavy stages)")
+    parser.add_argument("--scripts", action="store_true", help="Also run the three scripts end to end")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown / growth vs the baseline")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = []
+    for tier in args.tiers:
+        print(f"Tier {tier}")
+        for name in args.pipelines:
+            results.extend(run_pipeline(tier, args.seed, name, args.workers, tuple(args.formats), not args.no_memory))
+        if args.scripts:
+            results.extend(run_script(tier, args.seed, script) for script in SCRIPTS)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=1))
+        print(f"✅ Results written to {args.output}")
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
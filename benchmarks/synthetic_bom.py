@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic BOM generator.
+
+Writes Historical_BOM.zip, To_be_Added.zip and KONE_Critical_Item.xlsx with
+the same 22-column layout as the real KONE exports: multi-level BOMs (Level,
+Pos numbered per parent in steps of 10, Qty), KM component codes with the
+usual revision / variant suffixes, and kmfg material. Component usage follows
+a Zipf law, each component has a usual material and a configurable share of
+rows use an off-pattern one, which is what produces rare pairs. The history
+is spread evenly over ``quarters`` quarters and the To_be_Added batch falls in
+the quarter after; like real exports, each workbook is dated by its created
+document property (the zip timestamps are fixed and carry no date). The same
+seed always gives the same rows.
+
+    python benchmarks/synthetic_bom.py --out benchmarks/data/small --tier small
+    python benchmarks/synthetic_bom.py --out /tmp/bom --files 2000 --components 200000
+"""
+
+import argparse
+import zipfile
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from openpyxl import Workbook
+
+BOM_HEADER = [
+    "Level", "Pos", "Component", "Qty", "Unit of measure", "Description / TITLE", "smt thickness",
+    "kmfg length", "kmfg width", "kmfg flat length", "kmfg flat width", "kmfg material",
+    "Surface Finishing", "Woodwork Manufacturing", "Laser cut", "Purchase", "Custom Material",
+    "Custom Dimensions", "Note", "Revision date", "Manufacturing technology", "Level of Pre-engineering",
+]
+CRITICAL_HEADER = ["KONE_Critical_Items", "ItemID_KONE", "ItemName", "Comment"]
+BASE_MATERIALS = ["Z", "STEEL", "Steel", "aluminum", "S355", "AISI304", "DC01", "PVC", "RUBBER", "COPPER"]
+CODE_SUFFIXES = ["", "/A", "/B", " REV C", "-01"]
+ZIP_DATE = (2024, 1, 1, 0, 0, 0)  # Same for every member, so archives are reproducible
+FIRST_QUARTER = (2022, 1)  # Quarter of the oldest history workbook
+GENERATOR_VERSION = 2  # 2: workbooks dated across quarters
+
+
+@dataclass(frozen=True)
+class SyntheticConfig:
+    files: int = 50  # Historical BOM files
+    new_files: int = 5  # To_be_Added BOM files
+    rows_per_file: int = 60  # Mean rows per BOM (actual count varies +-50%)
+    components: int = 2_000  # Distinct component codes in the history
+    materials: int = 50  # Distinct kmfg materials
+    component_skew: float = 1.1  # Zipf exponent of component usage
+    rare_pair_rate: float = 0.02  # Share of rows with an off-pattern material
+    new_component_rate: float = 0.05  # Share of To_be_Added rows with unseen components
+    missing_description_rate: float = 0.02
+    max_level: int = 6
+    critical_share: float = 0.01  # Share of components listed as critical
+    quarters: int = 8  # Quarters the history is spread over
+    seed: int = 0
+
+
+TIERS = {
+    "small": SyntheticConfig(),
+    "medium": SyntheticConfig(files=500, new_files=25, rows_per_file=200, components=50_000, materials=500),
+    "large": SyntheticConfig(files=5_000, new_files=100, rows_per_file=400, components=1_000_000, materials=5_000),
+}
+
+
+class BomGenerator:
+    def __init__(self, config: SyntheticConfig):
+        self.config = config
+        self.rng = np.random.default_rng(config.seed)
+        n = config.components
+        weights = 1.0 / np.arange(1, n + 1) ** config.component_skew
+        self.component_cdf = np.cumsum(weights / weights.sum())
+        # Random rank -> code mapping, so popular codes are spread over the number range.
+        self.component_numbers = self.rng.choice(900_000 if n <= 900_000 else 10 * n, size=n, replace=False) + 100_000
+        self.usual_material = self.rng.integers(0, config.materials, size=n)
+        self.materials = [
+            BASE_MATERIALS[i] if i < len(BASE_MATERIALS) else f"MAT-{i:05d}" for i in range(config.materials)
+        ]
+        self.next_new_component = int(self.component_numbers.max()) + 1
+
+    def component_code(self, number: int) -> str:
+        return f"KM{number:06d}{CODE_SUFFIXES[number % len(CODE_SUFFIXES)]}"
+
+    def _levels(self, rows: int) -> tuple:
+        """Depth-first Level / Pos columns for one BOM (row 0 is the top assembly)."""
+        levels, positions = [0], [None]
+        counters = [0] * (self.config.max_level + 1)
+        steps = self.rng.integers(-2, 2, size=rows)  # Mostly stay or climb back up, sometimes go deeper
+        for step in steps[1:]:
+            level = int(min(max(1, levels[-1] + step), self.config.max_level))
+            counters[level] += 10
+            counters[level + 1:] = [0] * (len(counters) - level - 1)
+            levels.append(level)
+            positions.append(counters[level])
+        return levels, positions
+
+    def bom_rows(self, new: bool = False) -> list:
+        config = self.config
+        rows = max(2, int(config.rows_per_file * self.rng.uniform(0.5, 1.5)))
+        ranks = np.searchsorted(self.component_cdf, self.rng.random(rows))
+        ranks = np.minimum(ranks, config.components - 1)
+        materials = self.usual_material[ranks]
+        off_pattern = self.rng.random(rows) < config.rare_pair_rate
+        materials[off_pattern] = self.rng.integers(0, config.materials, size=int(off_pattern.sum()))
+        numbers = self.component_numbers[ranks]
+        if new:
+            unseen = self.rng.random(rows) < config.new_component_rate
+            fresh = np.arange(self.next_new_component, self.next_new_component + int(unseen.sum()))
+            self.next_new_component += len(fresh)
+            numbers[unseen] = fresh
+        missing = self.rng.random(rows) < config.missing_description_rate
+        quantities = self.rng.geometric(0.4, size=rows)
+        levels, positions = self._levels(rows)
+
+        out = []
+        for i in range(rows):
+            code = self.component_code(int(numbers[i]))
+            row = [None] * len(BOM_HEADER)
+            row[0] = levels[i]
+            row[1] = positions[i]
+            row[2] = code
+            row[3] = None if i == 0 else int(quantities[i])
+            row[4] = "PC"
+            row[5] = None if missing[i] else f"PART {code.split('/')[0]}"
+            row[11] = self.materials[materials[i]]
+            row[19] = "2024-06-18"
+            row[21] = "F"
+            out.append(row)
+        return out
+
+    def critical_rows(self) -> list:
+        count = max(1, int(self.config.components * self.config.critical_share))
+        ranks = self.rng.choice(self.config.components, size=count, replace=False)
+        return [[800_000 + i, f"KM{self.component_numbers[r]:06d}", None, None] for i, r in enumerate(ranks)]
+
+
+def quarter_date(quarter: int, day: int = 0) -> datetime:
+    """``day`` days into the ``quarter``-th quarter after FIRST_QUARTER."""
+    year, first = FIRST_QUARTER
+    year, index = divmod(year * 4 + first - 1 + quarter, 4)
+    return datetime(year, index * 3 + 1, 1) + timedelta(days=day % 90)
+
+
+def workbook_bytes(header: list, rows: list, created: Optional[datetime] = None) -> bytes:
+    book = Workbook(write_only=True)
+    if created is not None:
+        book.properties.created = created
+    sheet = book.create_sheet("Sheet1")
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    book.save(buffer)
+    return buffer.getvalue()
+
+
+def write_archive(path: Path, generator: BomGenerator, count: int, prefix: str, quarters: list, new: bool = False) -> None:
+    """Write ``count`` BOMs, the i-th dated in quarter ``quarters[i]`` (see ``quarter_date``)."""
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for i in range(count):
+            info = zipfile.ZipInfo(f"{prefix}{i:06d}.xlsx", date_time=ZIP_DATE)
+            book = workbook_bytes(BOM_HEADER, generator.bom_rows(new), created=quarter_date(quarters[i], day=7 * i))
+            archive.writestr(info, book, compress_type=zipfile.ZIP_DEFLATED)
+
+
+def generate(out_dir: Path, config: SyntheticConfig) -> Path:
+    """Write the three input files for ``config`` into ``out_dir``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    generator = BomGenerator(config)
+    history_quarters = [i * config.quarters // config.files for i in range(config.files)]
+    write_archive(out_dir / "Historical_BOM.zip", generator, config.files, "BOM_", history_quarters)
+    write_archive(out_dir / "To_be_Added.zip", generator, config.new_files, "NEW_", [config.quarters] * config.new_files, new=True)
+    (out_dir / "KONE_Critical_Item.xlsx").write_bytes(workbook_bytes(CRITICAL_HEADER, generator.critical_rows()))
+    return out_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--out", type=Path, required=True, help="Output directory")
+    parser.add_argument("--tier", choices=sorted(TIERS), default="small", help="Preset sizes (overridable below)")
+    names = [field.name for field in fields(SyntheticConfig)]
+    for field in fields(SyntheticConfig):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=type(field.default), default=None)
+    args = parser.parse_args()
+    overrides = {k: v for k, v in vars(args).items() if k in names and v is not None}
+    config = replace(TIERS[args.tier], **overrides)
+    generate(args.out, config)
+    print(f"✅ Synthetic BOM inputs ({config}) written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
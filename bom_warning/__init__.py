@@ -0,0 +1,35 @@
+"""
+BOM early warning: rarity, novelty and criticality of (Component, Material)
+pairs across quarterly BOM batches.
+
+The stage API lives in ``bom_warning.pipeline`` and the end-to-end runs in
+``bom_warning.runs``; both are imported on first use, so importing the
+package (and starting the ``bom-warning`` command) does not load pandas.
+"""
+
+from importlib import import_module
+
+__version__ = "1.0.0"
+
+_LAZY = {
+    "InputPaths": "pipeline",
+    "BomData": "pipeline",
+    "Metrics": "pipeline",
+    "RunSettings": "runs",
+    "run_early_warning": "runs",
+    "run_fp_growth": "runs",
+    "run_rules": "runs",
+    "mine_rules": "mining",
+    "write_report": "report_backends",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(import_module(f".{_LAZY[name]}", __name__), name)
+    if name in ("pipeline", "runs", "mining"):
+        return import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["__version__", *_LAZY]
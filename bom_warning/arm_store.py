@@ -0,0 +1,441 @@
+"""
+Persistent ARM metric store.
+
+Keeps the counters behind Support and Confidence -- per-(Component, Material)
+file occurrences, per-Component file totals and the set of counted files -- so
+a quarterly To_be_Added batch is applied in time proportional to the batch
+instead of re-aggregating the whole history. Counted files are known by
+Source_File and content key, so a batch whose files are already counted is
+skipped without reading its rows.
+
+The same counters are also kept per calendar quarter (the quarter each file
+is dated to, see ``bom_ingest.member_quarter``). A batch only touches the
+slices of its own quarters, and sliding-window or exponentially decayed
+Support and Confidence are summed from the slices when the metrics are read.
+Files with no date count in the all-history metrics and in the UNDATED slice,
+which no window or decay weight reaches.
+
+The store records the code mapping its counts were taken under (see
+``bom_codes.code_map_version``). Merged codes cannot be split again, nor can
+per-file pairs be re-keyed without the files, so opening the store under
+another mapping -- canonicalization switched on or off, a mapping proposed,
+accepted or rejected -- starts the counters afresh and every file is recounted.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PAIR_KEYS = ["Component", "Material"]
+STORE_VERSION = 3  # 2: per-quarter slices, 3: slices by file date instead of archive timestamp
+UNDATED = 0  # Quarter of files with no date in their name, workbook or batch settings
+SUPPORT_COLUMNS = {"all": "Support", "window": "Window_Support", "decayed": "Decayed_Support"}  # Status by support mode
+
+
+# === Quarters (ordinal = year * 4 + quarter - 1)
+def quarter_of(when) -> int:
+    """Quarter ordinal of a datetime or a ZipInfo ``date_time`` tuple."""
+    year, month = (when.year, when.month) if isinstance(when, datetime) else when[:2]
+    return year * 4 + (month - 1) // 3
+
+
+def quarter_label(quarter: int) -> str:
+    return "undated" if quarter == UNDATED else f"{quarter // 4}Q{quarter % 4 + 1}"
+
+
+def parse_quarter(text: str) -> int:
+    """Quarter ordinal of ``"2024Q3"`` (also ``"2024-Q3"``, ``"2024 q3"``)."""
+    match = re.fullmatch(r"\s*(\d{4})[-_ ]?[Qq]([1-4])\s*", str(text))
+    if match is None:
+        raise ValueError(f"Not a quarter: {text!r} (expected e.g. 2024Q3)")
+    return int(match.group(1)) * 4 + int(match.group(2)) - 1
+
+
+class ArmMetricStore:
+    def __init__(self, code_map_version: str = ""):
+        self.code_map_version = code_map_version  # Code mapping the counts were taken under, "" = raw codes
+        self.pairs = CountTable(PAIR_KEYS, "File_Occurrence")
+        self.components = CountTable(["Component"], "Component_Total")
+        self.files = []  # Counted Source_Files in the order they were added
+        self.file_keys = {}  # Source_File -> content key (SHA-256), None if unknown
+        self._key_files = {}  # content key -> Source_File
+        # Per-quarter counters: quarter -> pair counts / component totals / file count
+        self.pair_slices = {}
+        self.component_slices = {}
+        self.quarter_files = {}
+
+    @property
+    def pair_counts(self) -> pd.Series:
+        return self.pairs.series()
+
+    @property
+    def component_totals(self) -> pd.Series:
+        return self.components.series()
+
+    @property
+    def total_files(self) -> int:
+        return len(self.files)
+
+    @property
+    def quarters(self) -> list:
+        return sorted(self.quarter_files)
+
+    @property
+    def sliced_files(self) -> int:
+        return sum(self.quarter_files.values())
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ArmMetricStore":
+        store = cls()
+        store.apply_batch(df)
+        return store
+
+    # === Batch updates
+    def new_files(self, source_files, file_keys: Optional[dict] = None) -> list:
+        """The files of ``source_files`` the store has not counted yet.
+
+        A file is known by its Source_File and, where ``file_keys`` gives one,
+        its content key. Content already counted under another name is left
+        out; a counted name arriving with other content raises ValueError,
+        because adding it would count two different workbooks as one file.
+        """
+        file_keys = file_keys or {}
+        new = []
+        for source_file in source_files:
+            key = file_keys.get(source_file)
+            if source_file in self.file_keys:
+                counted = self.file_keys[source_file]
+                if key is not None and counted is not None and key != counted:
+                    raise ValueError(
+                        f"{source_file} is already counted with other content; "
+                        "re-sent files need a new Source_File (see history_store)"
+                    )
+            elif key is not None and key in self._key_files:
+                logger.info(f"Skipping {source_file}: counted as {self._key_files[key]}")
+            else:
+                new.append(source_file)
+        return new
+
+    def apply_batch(self, df: pd.DataFrame, quarters=None, file_keys: Optional[dict] = None) -> int:
+        """Count the files in ``df`` that the store has not seen yet.
+
+        Only the batch is deduplicated and grouped, and only the keys it
+        touches are updated (see ``CountTable``). Files already counted (see
+        ``new_files``) are skipped, so applying the same batch twice is a
+        no-op. Returns the number of files added. ``quarters`` maps
+        Source_File to its quarter ordinal (see ``bom_ingest.member_quarter``);
+        unmapped files count as UNDATED. ``file_keys`` maps Source_File to its
+        content key.
+        """
+        candidates = _file_names(df["Source_File"])
+        new = self.new_files(candidates, file_keys)
+        if not new:
+            return 0
+        if len(new) < len(candidates):
+            logger.debug(f"Skipping {len(candidates) - len(new)} files already in the metric store")
+            df = df[df["Source_File"].isin(new)]
+        unique = df[["Component", "Material", "Source_File"]].drop_duplicates()
+        if unique.empty:
+            return 0
+        self.pairs.add(unique.groupby(PAIR_KEYS, observed=True).size())
+        self.components.add(unique.groupby("Component", observed=True)["Source_File"].nunique())
+        added = [str(f) for f in unique["Source_File"].unique()]
+        self._add_files(added, file_keys or {})
+        self._apply_slices(unique, quarters)
+        return len(added)
+
+    def _add_files(self, source_files: list, file_keys: dict) -> None:
+        for source_file in source_files:
+            key = file_keys.get(source_file)
+            self.files.append(source_file)
+            self.file_keys[source_file] = key
+            if key is not None:
+                self._key_files[key] = source_file
+
+    def _apply_slices(self, unique: pd.DataFrame, quarters) -> None:
+        # Only the slices of the quarters present in the batch are touched.
+        file_quarter = pd.Series(np.asarray(unique["Source_File"], dtype=object)).map(quarters if quarters is not None else {})
+        undated = file_quarter.isna()
+        if undated.any():
+            logger.warning(f"{unique.loc[undated.to_numpy(), 'Source_File'].nunique()} files have no quarter; counted as undated")
+        file_quarter = file_quarter.fillna(UNDATED).astype("int64").to_numpy()
+        for quarter in np.unique(file_quarter):
+            part = unique[file_quarter == quarter]
+            quarter = int(quarter)
+            if quarter not in self.quarter_files:
+                self.pair_slices[quarter] = CountTable(PAIR_KEYS, "File_Occurrence")
+                self.component_slices[quarter] = CountTable(["Component"], "Component_Total")
+                self.quarter_files[quarter] = 0
+            self.pair_slices[quarter].add(part.groupby(PAIR_KEYS, observed=True).size())
+            self.component_slices[quarter].add(part.groupby("Component", observed=True)["Source_File"].nunique())
+            self.quarter_files[quarter] += int(part["Source_File"].nunique())
+
+    # === Metrics
+    def to_metrics(
+        self,
+        count_column: str = "File_Occurrence",
+        window: Optional[int] = None,
+        half_life: Optional[float] = None,
+        as_of: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Return the metrics frame the scripts used to build from scratch.
+
+        ``window`` adds Window_Support / Window_Confidence over the last
+        ``window`` quarters up to ``as_of`` (default: the latest quarter);
+        ``half_life`` adds Decayed_Support / Decayed_Confidence, where a
+        quarter's counts lose half their weight every ``half_life`` quarters.
+        """
+        metrics = self.pair_counts.rename(count_column).reset_index()
+        metrics = metrics.sort_values(PAIR_KEYS, ignore_index=True)
+        metrics = metrics.merge(self.component_totals.reset_index(), on="Component", how="left")
+        metrics["Support"] = metrics[count_column] / self.total_files
+        metrics["Confidence"] = metrics[count_column] / metrics["Component_Total"]
+        metrics["Support_Confidence_Sum"] = metrics["Support"] + metrics["Confidence"]
+        if window is not None or half_life is not None:
+            if self.sliced_files < self.total_files:
+                logger.warning(
+                    f"Only {self.sliced_files} of {self.total_files} files have quarter slices; "
+                    "rebuild the metric store for complete windowed / decayed metrics"
+                )
+            if self.quarter_files.get(UNDATED):
+                logger.warning(
+                    f"{self.quarter_files[UNDATED]} undated files are left out of the windowed / decayed metrics; "
+                    "date them by file name or with --quarter"
+                )
+            dated = [q for q in self.quarters if q != UNDATED]
+            as_of = dated[-1] if as_of is None and dated else as_of
+            quarters = np.array([q for q in dated if as_of is None or q <= as_of], dtype=np.int64)
+            if window is not None:
+                weights = (quarters > as_of - window).astype(float) if len(quarters) else quarters
+                metrics[["Window_Support", "Window_Confidence"]] = self._weighted_metrics(metrics, quarters, weights)
+            if half_life is not None:
+                weights = 0.5 ** ((as_of - quarters) / half_life) if len(quarters) else quarters
+                metrics[["Decayed_Support", "Decayed_Confidence"]] = self._weighted_metrics(metrics, quarters, weights)
+        return metrics.round(5)
+
+    def _weighted_metrics(self, metrics: pd.DataFrame, quarters: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Support and Confidence from the slices, each quarter scaled by its weight."""
+        used = [(int(q), w) for q, w in zip(quarters, weights) if w > 0]
+        files = sum(self.quarter_files[q] * w for q, w in used)
+        pairs = _weighted_sum([self.pair_slices[q].series() * w for q, w in used], PAIR_KEYS)
+        components = _weighted_sum([self.component_slices[q].series() * w for q, w in used], ["Component"])
+        keys = pd.MultiIndex.from_frame(metrics[PAIR_KEYS])
+        pair_weight = pairs.reindex(keys).fillna(0.0).to_numpy()
+        component_weight = components.reindex(metrics["Component"]).to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            support = pair_weight / files if files else np.zeros(len(metrics))
+            confidence = np.where(component_weight > 0, pair_weight / component_weight, 0.0)
+        return np.column_stack([support, confidence])
+
+    # === Persistence
+    def save(self, path: Path) -> None:
+        """Write the store to ``path``, replacing any previous version whole."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        self.pairs.frame().to_parquet(tmp / "pairs.parquet", index=False)
+        self.components.frame().to_parquet(tmp / "components.parquet", index=False)
+        files = pd.DataFrame({"Source_File": self.files, "Content_Key": [self.file_keys[f] for f in self.files]}, dtype=object)
+        files.to_parquet(tmp / "files.parquet", index=False)
+        _slice_frame(self.pair_slices, self.pairs).to_parquet(tmp / "pair_slices.parquet", index=False)
+        _slice_frame(self.component_slices, self.components).to_parquet(tmp / "component_slices.parquet", index=False)
+        (tmp / "store.json").write_text(json.dumps({
+            "version": STORE_VERSION,
+            "code_map_version": self.code_map_version,
+            "total_files": self.total_files,
+            "quarter_files": {str(q): n for q, n in sorted(self.quarter_files.items())},
+        }))
+        old = path.with_name(path.name + ".old")
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path) -> "ArmMetricStore":
+        path = Path(path)
+        meta = json.loads((path / "store.json").read_text())
+        if meta.get("version") not in (1, 2, STORE_VERSION):
+            raise ValueError(f"Unsupported metric store version {meta.get('version')} in {path}")
+        store = cls(meta.get("code_map_version", ""))
+        store.pairs = CountTable.from_frame(pd.read_parquet(path / "pairs.parquet"), PAIR_KEYS, "File_Occurrence")
+        store.components = CountTable.from_frame(pd.read_parquet(path / "components.parquet"), ["Component"], "Component_Total")
+        files = pd.read_parquet(path / "files.parquet")
+        # Stores written before content keys were recorded know their files by name only.
+        keys = files["Content_Key"] if "Content_Key" in files.columns else pd.Series(None, index=files.index, dtype=object)
+        store._add_files([str(f) for f in files["Source_File"]], {f: k for f, k in zip(files["Source_File"], keys) if k is not None})
+        if meta["version"] == 1:
+            logger.warning(f"Metric store {path} predates quarter slices; windowed / decayed metrics need a rebuild")
+            return store
+        if meta["version"] == 2:
+            logger.warning(f"Metric store {path} sliced files by archive timestamp; windowed / decayed metrics need a rebuild")
+            return store
+        store.pair_slices = _read_slices(path / "pair_slices.parquet", PAIR_KEYS, "File_Occurrence")
+        store.component_slices = _read_slices(path / "component_slices.parquet", ["Component"], "Component_Total")
+        store.quarter_files = {int(q): n for q, n in meta["quarter_files"].items()}
+        return store
+
+    @classmethod
+    def open(cls, path: Path, code_map_version: str = "") -> "ArmMetricStore":
+        """Load the store at ``path`` for counts under ``code_map_version``.
+
+        Starts an empty store if there is none yet or if its counts were taken
+        under another code mapping.
+        """
+        if not (Path(path) / "store.json").exists():
+            return cls(code_map_version)
+        store = cls.load(path)
+        if store.code_map_version != code_map_version:
+            logger.warning(
+                f"Metric store {path} was counted under code mapping {store.code_map_version or 'none'}, "
+                f"this run uses {code_map_version or 'none'}; recounting every file"
+            )
+            return cls(code_map_version)
+        return store
+
+
+# === Counters
+class CountTable:
+    """int64 counts keyed by label tuples, updated in place.
+
+    Counts and labels live in growable arrays in the order their keys first
+    appeared. Keys are found through sorted runs of 64-bit label hashes: a
+    batch's new keys are appended and form a new run, and runs are merged
+    only while the newest is at least half the size of the one before, so an
+    update costs a search per batch key plus amortised logarithmic merging,
+    never a pass over the stored keys.
+    """
+
+    def __init__(self, names: list, value_name: str):
+        self.names = list(names)
+        self.value_name = value_name
+        self.size = 0
+        self.values = np.zeros(0, dtype=np.int64)
+        self.labels = [np.empty(0, dtype=object) for _ in self.names]
+        self.runs = []  # (sorted hashes, positions), oldest first
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, names: list, value_name: str) -> "CountTable":
+        table = cls(names, value_name)
+        table.add(frame.set_index(names)[value_name])
+        return table
+
+    def add(self, counts: pd.Series) -> None:
+        """Add ``counts`` (indexed by unique label tuples) to the table."""
+        if counts.empty:
+            return
+        # Dictionary-encoded batches are decoded here because the stored keys
+        # must outlive this run's codes.
+        index = counts.index
+        labels = [np.asarray(index.get_level_values(i), dtype=object) for i in range(len(self.names))]
+        values = counts.to_numpy(dtype=np.int64)
+        hashes = _hash_labels(labels)
+        positions = self._find(hashes)
+        found = positions >= 0
+        for stored, given in zip(self.labels, labels):
+            if not np.array_equal(stored[positions[found]], given[found]):
+                raise RuntimeError(f"Label hash collision in the {self.value_name} counts")
+        self.values[positions[found]] += values[found]
+        new = ~found
+        added = int(new.sum())
+        if not added:
+            return
+        self._reserve(self.size + added)
+        stop = self.size + added
+        self.values[self.size:stop] = values[new]
+        for stored, given in zip(self.labels, labels):
+            stored[self.size:stop] = given[new]
+        new_hashes = hashes[new]
+        order = np.argsort(new_hashes, kind="stable")
+        self.runs.append((new_hashes[order], np.arange(self.size, stop, dtype=np.int64)[order]))
+        self.size = stop
+        self._merge_runs()
+
+    def _find(self, hashes: np.ndarray) -> np.ndarray:
+        positions = np.full(len(hashes), -1, dtype=np.int64)
+        for run_hashes, run_positions in self.runs:
+            at = np.minimum(np.searchsorted(run_hashes, hashes), len(run_hashes) - 1)
+            hit = run_hashes[at] == hashes
+            positions[hit] = run_positions[at[hit]]
+        return positions
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self.values):
+            return
+        capacity = max(size, 2 * len(self.values), 1024)
+        values = np.zeros(capacity, dtype=np.int64)
+        values[:self.size] = self.values[:self.size]
+        self.values = values
+        for i, stored in enumerate(self.labels):
+            labels = np.empty(capacity, dtype=object)
+            labels[:self.size] = stored[:self.size]
+            self.labels[i] = labels
+
+    def _merge_runs(self) -> None:
+        while len(self.runs) > 1 and 2 * len(self.runs[-1][0]) >= len(self.runs[-2][0]):
+            (older, older_positions), (newer, newer_positions) = self.runs[-2], self.runs[-1]
+            hashes = np.concatenate([older, newer])
+            order = np.argsort(hashes, kind="stable")
+            self.runs[-2:] = [(hashes[order], np.concatenate([older_positions, newer_positions])[order])]
+
+    def series(self) -> pd.Series:
+        """The counts as a Series indexed by the labels, in insertion order."""
+        labels = [stored[:self.size] for stored in self.labels]
+        if len(self.names) == 1:
+            index = pd.Index(labels[0], dtype=object, name=self.names[0])
+        else:
+            index = pd.MultiIndex.from_arrays(labels, names=self.names)
+        return pd.Series(self.values[:self.size].copy(), index=index, name=self.value_name)
+
+    def frame(self) -> pd.DataFrame:
+        data = {name: stored[:self.size] for name, stored in zip(self.names, self.labels)}
+        data[self.value_name] = self.values[:self.size]
+        return pd.DataFrame(data)
+
+
+def _hash_labels(labels: list) -> np.ndarray:
+    frame = pd.DataFrame({i: column for i, column in enumerate(labels)}, dtype=object)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def _file_names(source_files: pd.Series) -> list:
+    # A dictionary-encoded column is read through its codes: one counting pass,
+    # no hashing of strings. The vocabulary is shared across frames (see
+    # bom_codes.encode_frames), so only the categories with rows here count.
+    if isinstance(source_files.dtype, pd.CategoricalDtype):
+        codes = source_files.cat.codes.to_numpy()
+        categories = source_files.cat.categories
+        present = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        return [str(f) for f in categories[present]]
+    return [str(f) for f in source_files.unique()]
+
+
+def _weighted_sum(parts: list, names: list) -> pd.Series:
+    if not parts:
+        return CountTable(names, "Count").series().astype(float)
+    return pd.concat(parts).groupby(level=list(range(len(names)))).sum()
+
+
+# === Slice persistence: one long table with a Quarter column
+def _slice_frame(slices: dict, like: CountTable) -> pd.DataFrame:
+    frames = [table.frame().assign(Quarter=q) for q, table in sorted(slices.items())]
+    return pd.concat(frames, ignore_index=True) if frames else like.frame().assign(Quarter=np.int64(0)).iloc[:0]
+
+
+def _read_slices(path: Path, names: list, value_name: str) -> dict:
+    frame = pd.read_parquet(path)
+    return {int(q): CountTable.from_frame(part, names, value_name) for q, part in frame.groupby("Quarter", sort=True)}
@@ -0,0 +1,76 @@
+"""
+Dictionary encoding for BOM frames.
+
+Component, Material, Description, Source_File and Source_Type are stored as
+pandas categoricals: every distinct string is interned once and rows hold
+integer codes. Frames that will be concatenated or joined are encoded against
+one shared vocabulary per column so the codes line up and stay categorical;
+strings only come back when a sheet is written.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+CODED_COLUMNS = ["Component", "Material", "Description / TITLE", "Source_File", "Source_Type"]
+
+
+def build_vocabulary(*frames: pd.DataFrame, columns=CODED_COLUMNS) -> dict:
+    """Return one CategoricalDtype per column covering every value in ``frames``."""
+    vocabulary = {}
+    for column in columns:
+        values = [np.asarray(df[column].unique(), dtype=object) for df in frames if column in df.columns]
+        if not values:
+            continue
+        # Sorted categories keep groupby output in the same order as on strings.
+        categories = pd.Index(pd.unique(np.concatenate(values))).dropna().sort_values()
+        vocabulary[column] = pd.CategoricalDtype(categories)
+    return vocabulary
+
+
+def encode_frames(*frames: pd.DataFrame, columns=CODED_COLUMNS) -> list:
+    """Encode the string columns of ``frames`` against a shared vocabulary."""
+    vocabulary = build_vocabulary(*frames, columns=columns)
+    return [df.astype({c: dtype for c, dtype in vocabulary.items() if c in df.columns}) for df in frames]
+
+
+def code_map_version(code_map: Optional[dict]) -> str:
+    """Fingerprint of a code mapping (see code_canonical); "" when no code is renamed.
+
+    Counts and snapshots record it, so anything counted under another mapping
+    is recognized and recounted instead of mixing raw and canonical codes.
+    """
+    items = {kind: sorted(mapping.items()) for kind, mapping in sorted((code_map or {}).items()) if mapping}
+    if not items:
+        return ""
+    return hashlib.sha256(json.dumps(items).encode()).hexdigest()[:16]
+
+
+def category_codes(vocabulary: pd.Index, values: pd.Series) -> np.ndarray:
+    """Position of every value in ``vocabulary`` (-1 if absent).
+
+    Categorical input is looked up once per category and expanded by code, so
+    the hashing cost is proportional to the distinct values, not the rows.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.append(vocabulary.get_indexer(values.cat.categories), -1)
+        return lookup[values.cat.codes.to_numpy()]
+    return vocabulary.get_indexer(values)
+
+
+def observed_counts(values: pd.Series) -> pd.Series:
+    """``value_counts`` of the observed values, counted on the codes.
+
+    Categorical ``value_counts`` lists unused categories and breaks ties in
+    category order; counting the codes keeps only observed values and breaks
+    ties by first appearance, exactly like counting the strings.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.value_counts()
+    counts = pd.Series(values.cat.codes.to_numpy()).value_counts()
+    counts = counts[counts.index >= 0]
+    counts.index = values.cat.categories[counts.index.to_numpy()]
+    return counts
@@ -0,0 +1,152 @@
+"""
+Multi-level BOM hierarchy index and rarity roll-ups.
+
+The KONE workbooks list each BOM depth-first with a Level column, so a row's
+parent is the closest earlier row with a smaller Level. Parsing records that
+as ``Row`` / ``Parent_Row`` (sheet row numbers, re-pointed to the nearest
+kept ancestor whenever a row is dropped) next to ``Level``, ``Pos`` and
+``Qty``. ``BomHierarchy`` turns the loaded frame into flat arrays -- parent
+pointers, CSR child lists and the nodes of each depth -- and rolls flags up
+one depth at a time with ``np.bincount``, so millions of nodes cost a few
+array passes and no per-node Python objects.
+"""
+
+import numpy as np
+import pandas as pd
+
+HIERARCHY_COLUMNS = ["Level", "Pos", "Qty", "Row", "Parent_Row"]
+HIERARCHY_DTYPES = {"Level": "int16", "Qty": "float64", "Row": "int64", "Parent_Row": "int64"}
+ROLLUP_COLUMNS = ["Descendants", "Rare_Descendants", "New_Descendants", "Critical_Descendants", "Exposure"]
+
+
+# === Parent pointers (per workbook)
+# Rows without a usable Level get -1: they hang off no parent and are never
+# anyone's parent, so blank separator rows do not cut a BOM in two.
+def parse_levels(values) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(-1).to_numpy(dtype=np.int16)
+
+
+def parse_quantities(values) -> np.ndarray:
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(1.0).to_numpy(dtype=np.float64)
+
+
+def parent_rows(levels: np.ndarray) -> np.ndarray:
+    """Row of each row's parent (-1 for top-level rows), one pass per Level."""
+    levels = np.asarray(levels)
+    parents = np.full(len(levels), -1, dtype=np.int64)
+    for level in np.unique(levels[levels >= 0]):
+        rows = np.flatnonzero(levels == level)
+        shallower = np.flatnonzero((levels >= 0) & (levels < level))
+        if not len(shallower):
+            continue
+        previous = np.searchsorted(shallower, rows) - 1
+        parents[rows] = np.where(previous >= 0, shallower[np.maximum(previous, 0)], -1)
+    return parents
+
+
+def drop_nodes(df: pd.DataFrame, keep) -> pd.DataFrame:
+    """Keep the ``keep`` rows of one workbook's frame, re-pointing children of
+    dropped rows to their nearest kept ancestor. ``Row`` must be ascending.
+    """
+    keep = np.asarray(keep, dtype=bool)
+    if keep.all():
+        return df
+    rows = df["Row"].to_numpy()
+    parents = df["Parent_Row"].to_numpy()
+    positions = np.minimum(np.searchsorted(rows, parents), max(len(rows) - 1, 0))
+    parent_pos = np.where((parents >= 0) & (rows[positions] == parents), positions, -1)
+    while True:
+        dropped = parent_pos >= 0
+        dropped[dropped] = ~keep[parent_pos[dropped]]
+        if not dropped.any():
+            break
+        parent_pos[dropped] = parent_pos[parent_pos[dropped]]
+    return df.assign(Parent_Row=np.where(parent_pos >= 0, rows[parent_pos], -1))[keep]
+
+
+# === Hierarchy index (whole load)
+class BomHierarchy:
+    def __init__(self, parent: np.ndarray, qty: np.ndarray):
+        self.parent = parent
+        self.qty = qty
+        has_parent = parent >= 0
+        self.child_order = np.flatnonzero(has_parent)[np.argsort(parent[has_parent], kind="stable")]
+        self.child_ptr = np.concatenate(([0], np.cumsum(np.bincount(parent[has_parent], minlength=len(parent)))))
+        self.depths = self._depths()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "BomHierarchy":
+        """Index the nodes of a loaded frame (one node per row, in row order)."""
+        rows = df["Row"].to_numpy(dtype=np.int64)
+        # A new workbook starts where Source_File changes or Row stops increasing,
+        # so re-sent files with the same name stay separate trees.
+        files = pd.factorize(df["Source_File"])[0]
+        block = np.cumsum(np.concatenate(([True], (np.diff(files) != 0) | (np.diff(rows) <= 0))))
+        keys = block.astype(np.int64) << 32 | rows
+        parents = df["Parent_Row"].to_numpy(dtype=np.int64)
+        parent_keys = block.astype(np.int64) << 32 | np.maximum(parents, 0)
+        positions = np.minimum(np.searchsorted(keys, parent_keys), max(len(keys) - 1, 0))
+        found = (parents >= 0) & (len(keys) > 0) & (keys[positions] == parent_keys)
+        return cls(np.where(found, positions, -1), df["Qty"].to_numpy(dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def children(self, nodes: np.ndarray) -> np.ndarray:
+        starts, stops = self.child_ptr[nodes], self.child_ptr[nodes + 1]
+        counts = stops - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.child_order[np.repeat(starts, counts) + offsets]
+
+    def _depths(self) -> list:
+        depths = []
+        frontier = np.flatnonzero(self.parent < 0)
+        while len(frontier):
+            depths.append(frontier)
+            frontier = self.children(frontier)
+        return depths
+
+    # === Roll-ups
+    def descendant_counts(self, flags: np.ndarray) -> np.ndarray:
+        """Number of flagged strict descendants of every node."""
+        return self._rollup(np.asarray(flags, dtype=np.float64), np.ones(len(self)))
+
+    def exposure(self, flags: np.ndarray) -> np.ndarray:
+        """Quantity-weighted flagged descendants: each one counts the product
+        of Qty along the path below the node (how many end up in one unit)."""
+        return self._rollup(np.asarray(flags, dtype=np.float64), self.qty)
+
+    def _rollup(self, flags: np.ndarray, weight: np.ndarray) -> np.ndarray:
+        totals = np.zeros(len(self))
+        for nodes in reversed(self.depths[1:]):
+            contribution = weight[nodes] * (flags[nodes] + totals[nodes])
+            totals += np.bincount(self.parent[nodes], weights=contribution, minlength=len(self))
+        return totals
+
+
+def rollup_frame(nodes: pd.DataFrame, rare, new, critical) -> pd.DataFrame:
+    """Roll-up columns for every node of ``nodes`` (aligned with its rows)."""
+    hierarchy = BomHierarchy.from_frame(nodes)
+    rare, new, critical = (np.asarray(flag, dtype=bool) for flag in (rare, new, critical))
+    at_risk = rare | new | critical
+    return pd.DataFrame({
+        "Descendants": hierarchy.descendant_counts(np.ones(len(hierarchy))).astype(np.int64),
+        "Rare_Descendants": hierarchy.descendant_counts(rare).astype(np.int64),
+        "New_Descendants": hierarchy.descendant_counts(new).astype(np.int64),
+        "Critical_Descendants": hierarchy.descendant_counts(critical).astype(np.int64),
+        "Exposure": hierarchy.exposure(at_risk).round(5),
+    }, index=nodes.index)
+
+
+def assembly_rollup(nodes: pd.DataFrame, rollup: pd.DataFrame) -> pd.DataFrame:
+    """One row per assembly (node with children), highest exposure first."""
+    columns = ["Source_File", "Source_Type", "Level", "Pos", "Component", "Material", "Qty"]
+    sheet = pd.concat([nodes[columns], rollup], axis=1)
+    sheet = sheet[sheet["Descendants"] > 0]
+    return sheet.sort_values(["Exposure", "Rare_Descendants"], ascending=False, kind="stable", ignore_index=True)
+
+
+def pair_rollup(nodes: pd.DataFrame, rollup: pd.DataFrame) -> pd.DataFrame:
+    """Worst case over every occurrence of each (Component, Material) pair."""
+    frame = pd.concat([nodes[["Component", "Material"]], rollup[ROLLUP_COLUMNS[1:]]], axis=1)
+    return frame.groupby(["Component", "Material"], observed=True).max().reset_index()
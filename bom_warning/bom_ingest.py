@@ -0,0 +1,369 @@
+"""
+Shared BOM ingestion for the Early Warning scripts.
+
+Parses the .xlsx members of a BOM archive on a process pool and keeps a local
+Parquet cache of the normalized rows, keyed by each member's CRC and size, so
+repeat runs only parse members that are new or changed.
+"""
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .arm_store import UNDATED, quarter_of
+from .bom_hierarchy import HIERARCHY_COLUMNS, HIERARCHY_DTYPES, drop_nodes, parent_rows, parse_levels, parse_quantities
+
+logger = logging.getLogger(__name__)
+
+MEMBER_COLUMNS = ["Component", "Material", "Description / TITLE", *HIERARCHY_COLUMNS]
+BOM_COLUMNS = [*MEMBER_COLUMNS, "Source_File", "Source_Type"]
+CACHE_VERSION = 3  # 2: Level / Pos / Qty / Row / Parent_Row kept for the hierarchy index, 3: header row found
+HEADER_SCAN_ROWS = 10  # Title or blank rows allowed above the header row
+
+
+class BomParseError(RuntimeError):
+    """Workbooks of an archive that could not be parsed, reported together."""
+
+    def __init__(self, zip_path: Path, failures: dict):
+        self.zip_path = Path(zip_path)
+        self.failures = failures  # member name -> exception
+        listed = "; ".join(f"{name}: {error}" for name, error in failures.items())
+        super().__init__(f"{len(failures)} BOM file(s) in {zip_path} could not be parsed: {listed}")
+
+
+# === Format Component
+def format_component(code) -> str:
+    code = str(code)
+    match = re.search(r"(KM\d+)", code)
+    return match.group(1) if match else code.split("/")[0]
+
+
+def is_bom_member(info: zipfile.ZipInfo) -> bool:
+    return info.filename.endswith(".xlsx") and "__MACOSX" not in info.filename
+
+
+def bom_members(archive: zipfile.ZipFile, source_names: Optional[dict] = None) -> list:
+    """(ZipInfo, Source_File) of the BOM members to read.
+
+    ``source_names`` maps member names to the Source_File they are reported
+    under (see ``HistoryStore.batch_plan``); members it leaves out are
+    skipped. Without it every BOM member is read under its base name.
+    """
+    members = [info for info in archive.infolist() if is_bom_member(info)]
+    if source_names is None:
+        return [(info, Path(info.filename).name) for info in members]
+    return [(info, source_names[info.filename]) for info in members if info.filename in source_names]
+
+
+# === Quarters
+# A date in the file name: 2024Q3, 2024-07-15 / 2024_07 / 2024.07, or 20240715.
+FILENAME_QUARTER = re.compile(r"(?<!\d)((?:19|20)\d{2})[-_ ]?[Qq]([1-4])(?!\d)")
+FILENAME_DATE = re.compile(
+    r"(?<!\d)((?:19|20)\d{2})(?:[-_.](0[1-9]|1[0-2])(?:[-_.](?:0[1-9]|[12]\d|3[01]))?|(0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01]))(?!\d)"
+)
+
+
+def filename_quarter(name: str) -> Optional[int]:
+    """Quarter ordinal of a date in a workbook's file name, if it has one."""
+    stem = Path(name).stem
+    match = FILENAME_QUARTER.search(stem)
+    if match:
+        return int(match.group(1)) * 4 + int(match.group(2)) - 1
+    match = FILENAME_DATE.search(stem)
+    if match:
+        return int(match.group(1)) * 4 + (int(match.group(2) or match.group(3)) - 1) // 3
+    return None
+
+
+def workbook_quarter(data: bytes) -> Optional[int]:
+    """Quarter ordinal of the workbook's created (else modified) document property."""
+    try:
+        with zipfile.ZipFile(BytesIO(data)) as book:
+            core = ET.fromstring(book.read("docProps/core.xml"))
+    except (KeyError, zipfile.BadZipFile, ET.ParseError):
+        return None
+    dates = {elem.tag.rpartition("}")[2]: (elem.text or "").strip() for elem in core}
+    for prop in ("created", "modified"):
+        try:
+            return quarter_of(datetime.fromisoformat(dates[prop].replace("Z", "+00:00")))
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def member_quarter(name: str, data: bytes, quarter: Optional[int] = None) -> int:
+    """Quarter ordinal a workbook is counted in.
+
+    In order: ``quarter`` (given for the whole batch), a date in the file
+    name, the workbook's created / modified property. A workbook with none of
+    these is UNDATED; the archive's member timestamps are never used, as
+    they change whenever a file is copied or re-zipped.
+    """
+    for found in (quarter, filename_quarter(name)):
+        if found is not None:
+            return found
+    found = workbook_quarter(data)
+    if found is None:
+        logger.warning(f"{name} has no date in its name or properties; counted as undated")
+        return UNDATED
+    return found
+
+
+def member_quarters(zip_path: Path, source_names: Optional[dict] = None, quarter: Optional[int] = None) -> dict:
+    """Source_File -> quarter ordinal (see ``member_quarter``) for an archive's BOM members."""
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        return {
+            name: member_quarter(Path(info.filename).name, archive.read(info), quarter)
+            for info, name in bom_members(archive, source_names)
+        }
+
+
+# === Member parsing
+def parse_member(data: bytes, streaming: bool = False) -> pd.DataFrame:
+    """Parse one BOM workbook into normalized Component/Material/Description rows.
+
+    The header is the first of the top ``HEADER_SCAN_ROWS`` rows holding
+    both Component and kmfg material, so title or blank rows above it are
+    skipped. Rows missing Component or Material are dropped. A missing
+    description is kept as NaN when the workbook has the column and as ""
+    when it does not, so callers can reproduce either of the scripts' dropna
+    rules. Level, Pos and Qty are kept with the row's parent pointer (see
+    bom_hierarchy). With ``streaming`` only the BOM columns are read from the
+    sheet XML.
+    """
+    if streaming:
+        from .bom_stream import read_member_columns
+
+        return read_member_columns(data)
+    df = _below_header(pd.read_excel(BytesIO(data), engine="openpyxl", dtype=str, header=None))
+    if df is None:
+        return pd.DataFrame(columns=MEMBER_COLUMNS).astype(HIERARCHY_DTYPES)
+    df = df.rename(columns={"kmfg material": "Material"})
+    if "Description / TITLE" not in df.columns:
+        df["Description / TITLE"] = ""
+    levels = parse_levels(df["Level"] if "Level" in df.columns else np.full(len(df), None))
+    df["Level"] = levels
+    df["Pos"] = df["Pos"] if "Pos" in df.columns else None
+    df["Qty"] = parse_quantities(df["Qty"] if "Qty" in df.columns else np.full(len(df), None))
+    df["Row"] = np.arange(len(df), dtype=np.int64)
+    df["Parent_Row"] = parent_rows(levels)
+    df = drop_nodes(df[MEMBER_COLUMNS], df["Component"].notna() & df["Material"].notna())
+    df["Component"] = _normalize_unique(df["Component"], format_component)
+    df["Material"] = _normalize_unique(df["Material"])
+    return df.reset_index(drop=True)
+
+
+def _below_header(sheet: pd.DataFrame) -> Optional[pd.DataFrame]:
+    # The rows under the header row, named as read_excel names a header
+    # (blank cells "Unnamed: i", repeats "Qty.1"); None if there is no header.
+    for position in range(min(HEADER_SCAN_ROWS, len(sheet))):
+        values = sheet.iloc[position]
+        if not {"Component", "kmfg material"} <= set(values.dropna()):
+            continue
+        names, seen = [], {}
+        for i, value in enumerate(values):
+            name = f"Unnamed: {i}" if pd.isna(value) else value
+            seen[name] = seen.get(name, -1) + 1
+            names.append(f"{name}.{seen[name]}" if seen[name] else name)
+        return sheet.iloc[position + 1:].set_axis(names, axis=1).reset_index(drop=True)
+    return None
+
+
+def _normalize_unique(values: pd.Series, formatter=None) -> pd.Series:
+    # BOM codes repeat heavily, so clean each distinct raw value once and
+    # expand the result back by position.
+    codes, uniques = pd.factorize(values)
+    cleaned = pd.Series(uniques)
+    if formatter is not None:
+        cleaned = cleaned.apply(formatter)
+    cleaned = cleaned.str.strip().str.upper()
+    return pd.Series(cleaned.to_numpy()[codes], index=values.index)
+
+
+_worker_archives = {}
+
+
+def _timed_parse(data: bytes, streaming: bool) -> tuple:
+    start = time.perf_counter()
+    df = parse_member(data, streaming)
+    return df, time.perf_counter() - start
+
+
+def _parse_archive_member(zip_path: str, info: zipfile.ZipInfo, streaming: bool) -> tuple:
+    # Each worker keeps its archive handles open instead of re-reading the
+    # central directory for every member.
+    archive = _worker_archives.get(zip_path)
+    if archive is None:
+        archive = _worker_archives[zip_path] = zipfile.ZipFile(zip_path, "r")
+    return _timed_parse(archive.read(info), streaming)
+
+
+def pool_context():
+    # The scripts do their work at module level, so workers are forked where
+    # the platform allows it; a spawned worker would re-run the whole script.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+# === Parsed-member cache
+class MemberCache:
+    """Content-addressed Parquet cache of parsed members.
+
+    Entries are keyed by the CRC-32 and uncompressed size recorded in the
+    member's ZipInfo, so a renamed or re-zipped file is still a cache hit and a
+    changed file is always re-parsed.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.path = Path(cache_dir) / f"v{CACHE_VERSION}"
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("pyarrow") is not None
+
+    def _entry(self, info: zipfile.ZipInfo) -> Path:
+        return self.path / f"{info.CRC:08x}-{info.file_size}.parquet"
+
+    def get(self, info: zipfile.ZipInfo, columns: Optional[list] = None) -> Optional[pd.DataFrame]:
+        entry = self._entry(info)
+        if not entry.exists():
+            return None
+        try:
+            return pd.read_parquet(entry, columns=columns)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {entry.name}: {e}")
+            return None
+
+    def put(self, info: zipfile.ZipInfo, df: pd.DataFrame) -> None:
+        entry = self._entry(info)
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, entry)
+
+
+# === Load BOMs from ZIP
+def empty_frame(columns: Optional[list] = None) -> pd.DataFrame:
+    """A row-less BOM frame with the columns ``load_zip`` would return."""
+    return pd.DataFrame(columns=BOM_COLUMNS if columns is None else [*columns, "Source_File", "Source_Type"])
+
+
+def load_zip(
+    zip_path: Path,
+    source_type: str,
+    cache_dir: Optional[Path] = None,
+    workers: Optional[int] = None,
+    max_files: Optional[int] = None,
+    require_description: bool = True,
+    streaming: bool = False,
+    file_times: Optional[dict] = None,
+    source_names: Optional[dict] = None,
+    columns: Optional[list] = None,
+) -> pd.DataFrame:
+    """Load every BOM member of ``zip_path`` into one normalized frame.
+
+    Cached members are read from ``cache_dir``; the rest are parsed on a pool
+    of ``workers`` processes (all cores by default, 1 parses in-process).
+    With ``require_description`` rows whose description cell is empty are
+    dropped, matching the loaders that included the column in ``dropna``.
+    ``streaming`` selects the bounded-memory sheet reader from bom_stream.
+    ``source_names`` selects and names the members (see ``bom_members``).
+    ``columns`` keeps only those member columns (plus Source_File and
+    Source_Type); cached members are read with just those columns.
+    If ``file_times`` is given, the parse time in seconds of every member that
+    was not served from the cache is stored in it under ``(archive name,
+    member name)``, so equal names in different segments stay apart.
+
+    A member that fails to parse does not stop the others (and the ones that
+    parsed are still cached), but once all have been tried a ``BomParseError``
+    listing every failure is raised: a run never silently counts a partial
+    archive.
+    """
+    start_time = time.time()
+    cache = None
+    if cache_dir is not None:
+        if MemberCache.available():
+            cache = MemberCache(cache_dir)
+        else:
+            logger.warning("pyarrow is not installed; parsed-member cache disabled")
+
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        selected = bom_members(archive, source_names)
+    members, source_files = [info for info, _ in selected], [name for _, name in selected]
+    if max_files is not None:
+        members, source_files = members[:max_files], source_files[:max_files]
+
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys([*columns, *(["Description / TITLE"] if require_description else [])]))
+    parsed = {}
+    pending = []
+    for i, info in enumerate(members):
+        cached = cache.get(info, read_columns) if cache is not None else None
+        if cached is not None:
+            parsed[i] = cached
+        else:
+            pending.append(i)
+    logger.info(f"{zip_path}: {len(members)} BOM files, {len(members) - len(pending)} cached, {len(pending)} to parse")
+
+    parse_times = {}
+    failures = {}
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=pool_context()) as pool:
+            futures = {i: pool.submit(_parse_archive_member, str(zip_path), members[i], streaming) for i in pending}
+            for i, future in futures.items():
+                try:
+                    parsed[i], seconds = future.result()
+                    parse_times[i] = seconds
+                except Exception as e:
+                    logger.error(f"Error processing {members[i].filename}: {e}")
+                    failures[members[i].filename] = e
+    else:
+        with zipfile.ZipFile(zip_path, "r") as archive:
+            for i in pending:
+                try:
+                    parsed[i], seconds = _timed_parse(archive.read(members[i]), streaming)
+                    parse_times[i] = seconds
+                except Exception as e:
+                    logger.error(f"Error processing {members[i].filename}: {e}")
+                    failures[members[i].filename] = e
+
+    if file_times is not None:
+        file_times.update(((Path(zip_path).name, members[i].filename), seconds) for i, seconds in parse_times.items())
+    if cache is not None:
+        for i in pending:
+            if i in parsed:
+                cache.put(members[i], parsed[i])
+    if failures:
+        raise BomParseError(zip_path, failures)
+
+    records = []
+    for i, name in enumerate(source_files):
+        df = parsed.get(i)
+        if df is None or df.empty:
+            continue
+        if require_description:
+            keep = df["Description / TITLE"].notna()
+            df = drop_nodes(df, keep) if "Parent_Row" in df.columns else df[keep]
+        if columns is not None:
+            df = df[columns]
+        df = df.assign(Source_File=name, Source_Type=source_type)
+        records.append(df)
+    result = pd.concat(records, ignore_index=True) if records else empty_frame(columns)
+    logger.info(f"Loaded {len(result)} records from {zip_path} in {time.time() - start_time:.2f} seconds")
+    return result
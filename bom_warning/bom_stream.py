@@ -0,0 +1,327 @@
+"""
+Streaming, bounded-memory BOM reading.
+
+Reads only the Component, kmfg material, Description / TITLE, Level, Pos and
+Qty cells of each workbook straight from the worksheet XML with iterparse, one row at a time,
+normalizes them in a generator pipeline and feeds the metric store in
+fixed-size chunks. Neither a whole member nor a full-width DataFrame is ever
+held in memory, so peak memory stays flat however large the history grows.
+
+Cell values are converted the way ``pd.read_excel(..., dtype=str)`` converts
+them (integral numbers without ".0", pandas' default NA strings as missing),
+so both readers produce the same rows. Date-formatted cells are returned as
+their serial number; BOM code columns do not use date formats.
+"""
+
+import logging
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+
+from .arm_store import ArmMetricStore
+from .bom_hierarchy import HIERARCHY_DTYPES
+from .bom_ingest import HEADER_SCAN_ROWS, MEMBER_COLUMNS, BomParseError, bom_members, format_component, member_quarters
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COLUMNS = {"Component": 0, "kmfg material": 1, "Description / TITLE": 2, "Level": 3, "Pos": 4, "Qty": 5}
+CHUNK_ROWS = 200_000
+SPOOL_BYTES = 16 * 1024 * 1024
+
+# pandas' default na_values for read_excel
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+
+def _column_number(ref: str) -> int:
+    number = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        number = number * 26 + ord(ch.upper()) - 64
+    return number
+
+
+def _text(elem) -> str:
+    # Rich text keeps its runs in <r><t>; phonetic hints (<rPh>) are not cell text.
+    parts = []
+    for child in elem:
+        name = _local(child.tag)
+        if name == "t":
+            parts.append(child.text or "")
+        elif name == "r":
+            parts.extend(t.text or "" for t in child if _local(t.tag) == "t")
+    return "".join(parts)
+
+
+# === Workbook structure
+def _first_sheet_paths(book: zipfile.ZipFile) -> tuple:
+    """Return the part names of the first worksheet and the shared strings."""
+    rels = {}
+    for elem in ET.fromstring(book.read("xl/_rels/workbook.xml.rels")):
+        target = elem.get("Target", "")
+        rels[elem.get("Id")] = (elem.get("Type", ""), target.lstrip("/") if target.startswith("/") else "xl/" + target)
+    sheet_path = None
+    for elem in ET.fromstring(book.read("xl/workbook.xml")).iter():
+        if _local(elem.tag) == "sheet":
+            rel_id = next(v for k, v in elem.attrib.items() if _local(k) == "id")
+            sheet_path = rels[rel_id][1]
+            break
+    strings_path = next((path for kind, path in rels.values() if kind.endswith("/sharedStrings")), None)
+    return sheet_path, strings_path
+
+
+def _shared_strings(book: zipfile.ZipFile, path: Optional[str]) -> list:
+    strings = []
+    if path is None or path not in book.namelist():
+        return strings
+    with book.open(path) as f:
+        for _, elem in ET.iterparse(f):
+            if _local(elem.tag) == "si":
+                strings.append(_text(elem))
+                elem.clear()
+    return strings
+
+
+def _cell_value(cell, strings: list) -> Optional[str]:
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        inline = next((child for child in cell if _local(child.tag) == "is"), None)
+        value = _text(inline) if inline is not None else None
+    else:
+        raw = next((child.text for child in cell if _local(child.tag) == "v"), None)
+        if raw is None:
+            return None
+        if kind == "s":
+            value = strings[int(raw)]
+        elif kind == "b":
+            value = "True" if raw == "1" else "False"
+        elif kind in ("str", "e", "d"):
+            value = raw
+        else:
+            number = float(raw)
+            value = str(int(number)) if number.is_integer() else str(number)
+    return None if value is None or value in NA_STRINGS else value
+
+
+def iter_sheet_rows(book: zipfile.ZipFile) -> Iterator[tuple]:
+    """Yield (row, (Component, Material, Description, Level, Pos, Qty)) per data row.
+
+    The header is the first row within the top ``HEADER_SCAN_ROWS`` that
+    holds both Component and kmfg material; nothing is yielded if there is
+    none. ``row`` is the 0-based data row below it (sheet row - header row -
+    1), as ``bom_ingest.parse_member`` numbers them. Only the BOM columns are
+    decoded; every other cell is skipped and each row element is cleared as
+    soon as it has been read. Description is "" when the sheet has no such
+    column and None when its cell is empty.
+    """
+    sheet_path, strings_path = _first_sheet_paths(book)
+    strings = _shared_strings(book, strings_path)
+    wanted = None
+    with book.open(sheet_path) as f:
+        sheet_data = None
+        row_number = 0
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if sheet_data is None and _local(elem.tag) == "sheetData":
+                    sheet_data = elem
+                continue
+            if _local(elem.tag) != "row":
+                continue
+            row_number = int(elem.get("r", row_number + 1))
+            values = {}
+            column = 0
+            for cell in elem:
+                if _local(cell.tag) != "c":
+                    continue
+                ref = cell.get("r")
+                column = _column_number(ref) if ref else column + 1
+                if wanted is None or column in wanted:
+                    values[column] = _cell_value(cell, strings)
+            # Drop finished rows so the parsed tree never grows past one row.
+            sheet_data.clear()
+            if wanted is None:
+                if row_number > HEADER_SCAN_ROWS:
+                    return
+                header = {}
+                for col, name in sorted(values.items()):
+                    if name in SOURCE_COLUMNS and name not in header.values():
+                        header[col] = name
+                if "Component" not in header.values() or "kmfg material" not in header.values():
+                    continue
+                wanted, header_row = header, row_number
+                has_description = "Description / TITLE" in header.values()
+                continue
+            row = [None, None, None if has_description else "", None, None, None]
+            for col, name in wanted.items():
+                row[SOURCE_COLUMNS[name]] = values.get(col)
+            yield row_number - header_row - 1, tuple(row)
+
+
+# === Normalization
+@lru_cache(maxsize=1 << 16)
+def _clean_component(code: str) -> str:
+    return format_component(code).strip().upper()
+
+
+@lru_cache(maxsize=1 << 16)
+def _clean_material(code: str) -> str:
+    return code.strip().upper()
+
+
+@lru_cache(maxsize=256)
+def _level(value: Optional[str]) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return -1
+
+
+def _quantity(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def iter_member_rows(member) -> Iterator[tuple]:
+    """Normalized (Component, Material, Description, Level, Pos, Qty, Row,
+    Parent_Row) rows of one workbook.
+
+    ``member`` is a file object or path of the .xlsx itself. Rows missing
+    Component or Material are skipped; the description is passed through.
+    Parents come from a stack of the kept rows on the current path, which
+    gives the same nearest-kept-ancestor pointers as bom_hierarchy.
+    """
+    path = []  # (level, row) of the kept ancestors of the current row
+    with zipfile.ZipFile(member) as book:
+        for row, (component, material, description, level, pos, qty) in iter_sheet_rows(book):
+            kept = component is not None and material is not None
+            level = _level(level)
+            parent = -1
+            if level >= 0:
+                while path and path[-1][0] >= level:
+                    path.pop()
+                parent = path[-1][1] if path else -1
+                if kept:
+                    path.append((level, row))
+            if kept:
+                yield (
+                    _clean_component(component), _clean_material(material), description,
+                    level, pos, _quantity(qty), row, parent,
+                )
+
+
+def read_member_columns(data: bytes) -> pd.DataFrame:
+    """Streaming counterpart of ``bom_ingest.parse_member``."""
+    df = pd.DataFrame(list(iter_member_rows(BytesIO(data))), columns=MEMBER_COLUMNS)
+    return df.astype(HIERARCHY_DTYPES)
+
+
+def iter_zip_rows(
+    zip_path: Path, require_description: bool = True, skip_files=(), source_names: Optional[dict] = None
+) -> Iterator[tuple]:
+    """Yield (Component, Material, Description, Source_File) for every BOM row.
+
+    Each member is spooled to a temporary file (in memory up to a few MB) so
+    the workbook can be opened without reading it whole; members whose
+    Source_File is in ``skip_files`` are not opened at all. ``source_names``
+    selects and names the members as in ``bom_ingest.bom_members``. A member that fails
+    midway is logged and the rest are still read; a ``BomParseError`` listing
+    every failure is raised after the last member, so callers never save
+    counts from a partially read archive.
+    """
+    failures = {}
+    with zipfile.ZipFile(zip_path, "r") as archive:
+        for info, source_file in bom_members(archive, source_names):
+            if source_file in skip_files:
+                continue
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+                with archive.open(info) as member:
+                    shutil.copyfileobj(member, spool)
+                spool.seek(0)
+                try:
+                    for component, material, description, *_ in iter_member_rows(spool):
+                        if require_description and description is None:
+                            continue
+                        yield component, material, description, source_file
+                except Exception as e:
+                    logger.error(f"Error streaming {info.filename}: {e}")
+                    failures[info.filename] = e
+    if failures:
+        raise BomParseError(zip_path, failures)
+
+
+# === Chunked metric updates
+def stream_into_store(
+    zip_path: Path,
+    store: ArmMetricStore,
+    require_description: bool = True,
+    chunk_rows: int = CHUNK_ROWS,
+    code_map: Optional[dict] = None,
+    source_names: Optional[dict] = None,
+    file_keys: Optional[dict] = None,
+    quarters: Optional[dict] = None,
+) -> int:
+    """Feed every uncounted BOM file of ``zip_path`` into ``store`` in chunks.
+
+    Rows are deduplicated per file as they arrive and flushed to the store
+    whenever ``chunk_rows`` distinct (Component, Material, file) rows are
+    buffered, always at a file boundary so no file is split across chunks.
+    Files are sliced by ``quarters`` (Source_File -> quarter ordinal, by
+    default ``bom_ingest.member_quarters``).
+    ``code_map`` (``{"Component": {...}, "Material": {...}}``, see
+    code_canonical) renames codes before they are counted,
+    ``source_names`` selects and names the members (see ``bom_members``) and
+    ``file_keys`` gives their content keys (see ``ArmMetricStore.new_files``).
+    Files the store has counted are never opened. Returns the number of
+    files added.
+    """
+    if quarters is None:
+        quarters = member_quarters(zip_path, source_names)
+    skip_files = set(quarters) - set(store.new_files(quarters, file_keys))
+    component_map = (code_map or {}).get("Component", {})
+    material_map = (code_map or {}).get("Material", {})
+    added = 0
+    buffer = {}
+    buffered = 0
+    current_file = None
+    current_pairs = set()
+
+    def flush():
+        nonlocal added, buffer, buffered
+        if buffer:
+            rows = [(c, m, f) for f, pairs in buffer.items() for c, m in pairs]
+            batch = pd.DataFrame(rows, columns=["Component", "Material", "Source_File"])
+            added += store.apply_batch(batch, quarters, file_keys)
+            buffer, buffered = {}, 0
+
+    for component, material, _, source_file in iter_zip_rows(
+        zip_path, require_description, skip_files=skip_files, source_names=source_names
+    ):
+        if source_file != current_file:
+            if current_file is not None:
+                buffer.setdefault(current_file, set()).update(current_pairs)
+                buffered += len(current_pairs)
+                if buffered >= chunk_rows:
+                    flush()
+            current_file, current_pairs = source_file, set()
+        current_pairs.add((component_map.get(component, component), material_map.get(material, material)))
+    if current_file is not None:
+        buffer.setdefault(current_file, set()).update(current_pairs)
+    flush()
+    logger.info(f"Streamed {added} new files from {zip_path} into the metric store")
+    return added
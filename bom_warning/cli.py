@@ -0,0 +1,278 @@
+"""
+``bom-warning``: one command line for the whole pipeline.
+
+    bom-warning ingest        --input-dir Input               # parse and cache the history and batch
+    bom-warning metrics       --input-dir Input               # count new files into the ARM metric store
+    bom-warning mine          --input-dir Input --engine sparse --output Rules.xlsx
+    bom-warning report        --input-dir Input --layout early-warning --output Report.xlsx [--merge-history]
+    bom-warning merge-history --input-dir Input [--clear]
+    bom-warning status        --input-dir Input               # what the stores hold (no data is loaded)
+    bom-warning sweep ...     /  bom-warning serve ...        # threshold_sweep / warning_service
+
+Only the standard library is imported up front; every subcommand imports the
+pipeline modules it needs when it runs, so ``--help`` and ``status`` return
+without loading pandas, and openpyxl / mlxtend / scikit-learn are only
+loaded by the stages that use them.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from . import __version__
+
+LAYOUTS = ("early-warning", "fp-growth")
+RULE_ENGINES = ("apriori", "fpgrowth", "sparse")  # mining.RULE_ENGINES
+OUTPUT_FORMATS = ("xlsx", "parquet", "csv", "sqlite")  # report_backends.OUTPUT_FORMATS
+SUPPORT_MODES = ("all", "window", "decayed")  # arm_store.SUPPORT_COLUMNS
+DEFAULT_OUTPUTS = {
+    "early-warning": "BOM_Compare_Professional_Final_AllSheetsWithCounts.xlsx",
+    "fp-growth": "Updated_Historical_ARM.xlsx",
+    "mine": "Apriori_Only_Historical.xlsx",
+}
+QUARTER_HELP = "Quarter of the To_be_Added batch, e.g. 2024Q3 (default: from file names / workbook dates)"
+PASS_THROUGH = {
+    "sweep": ("threshold_sweep", "Rare / Not Rare and rule counts over a grid of thresholds"),
+    "serve": ("warning_service", "Resident early-warning lookup service"),
+}
+
+
+# === Settings shared by the subcommands
+def _input_paths(args):
+    from .pipeline import InputPaths
+
+    return InputPaths.under(args.input_dir)
+
+
+def _quarter(args):
+    from .arm_store import parse_quarter
+
+    return parse_quarter(args.quarter) if args.quarter else None
+
+
+def _settings(args, output: Path, **overrides):
+    from .runs import RunSettings
+
+    return RunSettings(
+        paths=_input_paths(args),
+        output=output,
+        support_threshold=args.support_threshold,
+        support_mode=args.support_mode,
+        window_quarters=args.window,
+        decay_half_life=args.half_life,
+        ingest_workers=args.workers,
+        canonicalize_codes=args.canonicalize,
+        output_formats=tuple(args.formats),
+        telemetry_path=args.telemetry,
+        profile_stages=tuple(args.profile),
+        trace_memory=args.trace_memory,
+        batch_quarter=_quarter(args),
+        **overrides,
+    )
+
+
+def _load(args, **ingest_kwargs):
+    from . import pipeline
+
+    data = pipeline.ingest(
+        _input_paths(args), workers=args.workers, batch_quarter=_quarter(args), **ingest_kwargs,
+    )
+    if args.canonicalize:
+        data = pipeline.canonicalize(data)
+    return pipeline.normalize(data)
+
+
+# === Subcommands
+def cmd_ingest(args) -> None:
+    data = _load(args)
+    print(f"✅ {data.history.total_files} history files ({len(data.hist_df)} rows), {len(data.new_df)} To_be_Added rows")
+
+
+def cmd_metrics(args) -> None:
+    from . import pipeline
+    from .report_backends import write_report
+
+    # Streamed counts need no rows, unless the codes have to be canonicalized first
+    data = _load(args, load_rows=not args.streaming or args.canonicalize, streaming=args.streaming)
+    metrics = pipeline.update_metrics(
+        data, support_mode=args.support_mode, window=args.window, half_life=args.half_life,
+    )
+    if args.output is not None:
+        write_report(args.output, {"4_Metrics": metrics.frame}, formats=tuple(args.formats))
+    print(f"✅ ARM metrics for {metrics.store.total_files} files ({metrics.added_files} newly counted), {len(metrics.frame)} pairs")
+
+
+def cmd_mine(args) -> None:
+    from .runs import run_rules
+
+    output = args.output or Path(DEFAULT_OUTPUTS["mine"])
+    settings = _settings(
+        args, output, rule_engine=args.engine, rule_min_support=args.min_support,
+        rule_min_confidence=args.min_confidence, max_files=args.max_files, mining_workers=args.workers,
+    )
+    sheets = run_rules(settings)
+    print(f"✅ {len(sheets['Apriori_IfThen'])} rules saved to: {output}")
+
+
+def cmd_report(args) -> None:
+    from .runs import run_early_warning, run_fp_growth
+
+    output = args.output or Path(DEFAULT_OUTPUTS[args.layout])
+    delta_output = None if args.no_delta else args.delta_output or output.parent / "Quarter_Delta.xlsx"
+    settings = _settings(
+        args, output, delta_output=delta_output, merge_history=args.merge_history, rule_engine=args.engine,
+        rule_min_support=args.min_support, rule_min_confidence=args.min_confidence, max_files=args.max_files,
+        mining_workers=args.workers,
+    )
+    run = run_early_warning if args.layout == "early-warning" else run_fp_growth
+    run(settings)
+    print(f"✅ Report exported ({', '.join(args.formats)}) → {output}")
+    if delta_output is not None:
+        print(f"✅ Quarter delta written to → {delta_output}")
+
+
+def cmd_merge_history(args) -> None:
+    from .history_store import HistoryStore
+    from .pipeline import merge_history
+
+    paths = _input_paths(args)
+    history = HistoryStore.open(paths.history_store, bootstrap_zip=paths.historical_zip)
+    added = merge_history(history, paths.to_be_added_zip, clear=args.clear, quarter=_quarter(args))
+    print(f"✅ {added} files committed; history store at {paths.history_store} holds {history.total_files} files")
+
+
+def _read_json(path: Path):
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _quarter_label(quarter: int) -> str:
+    # arm_store.quarter_label, without importing pandas
+    return "undated" if quarter == 0 else f"{quarter // 4}Q{quarter % 4 + 1}"
+
+
+def cmd_status(args) -> None:
+    """Summarize the stores from their manifests alone."""
+    root = Path(args.input_dir)
+    history = _read_json(root / "History_Store" / "manifest.json")
+    if history is None:
+        print("History store:  not created yet (seeded from Historical_BOM.zip on the first run)")
+    else:
+        files = sum(len(segment["members"]) for segment in history["segments"])
+        print(f"History store:  {len(history['segments'])} segments, {files} files")
+    store = _read_json(root / "ARM_Store" / "store.json")
+    if store is None:
+        print("Metric store:   empty")
+    else:
+        quarters = ", ".join(f"{_quarter_label(int(q))}: {n}" for q, n in store.get("quarter_files", {}).items())
+        print(f"Metric store:   {store['total_files']} files counted" + (f" ({quarters})" if quarters else ""))
+    snapshot = _read_json(root / "Delta_Snapshot" / "snapshot.json")
+    if snapshot is None:
+        print("Delta snapshot: none")
+    else:
+        print(
+            f"Delta snapshot: {snapshot['total_files']} files, {snapshot['support_mode']} support "
+            f"below {snapshot['support_threshold']}, {len(snapshot['critical'])} critical items"
+        )
+    code_index = _read_json(root / "Code_Index" / "index.json")
+    if code_index is not None:
+        print("Code index:     " + ", ".join(f"{n} {kind} codes" for kind, n in code_index["codes"].items()))
+    batch = root / "To_be_Added.zip"
+    if batch.exists():
+        import zipfile
+
+        with zipfile.ZipFile(batch) as archive:
+            members = [name for name in archive.namelist() if name.endswith(".xlsx")]
+        print(f"To_be_Added:    {len(members)} workbooks waiting")
+
+
+# === Parser
+def _common(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--input-dir", type=Path, default=Path("."), help="Folder with Historical_BOM.zip / To_be_Added.zip and the stores")
+    parser.add_argument("--workers", type=int, default=None, help="Parser / mining processes (default: all cores)")
+    parser.add_argument("--canonicalize", action="store_true", help="Merge near-duplicate Component / Material codes")
+    parser.add_argument("--support-threshold", type=float, default=0.035, help="Rare below this support")
+    parser.add_argument("--support-mode", choices=SUPPORT_MODES, default="all", help="Support used for Rare / Not Rare")
+    parser.add_argument("--window", type=int, default=8, help="Quarters in the sliding window")
+    parser.add_argument("--half-life", type=float, default=4, help="Quarters after which counts weigh half")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=["xlsx"])
+    parser.add_argument("--quarter", default=None, help=QUARTER_HELP)
+
+
+def _run_options(parser: argparse.ArgumentParser, engine: str, min_support, min_confidence: float, max_files) -> None:
+    parser.add_argument("--output", type=Path, default=None, help="Report path (other formats are written next to it)")
+    parser.add_argument("--engine", choices=RULE_ENGINES, default=engine, help="Rule mining engine")
+    parser.add_argument("--min-support", type=float, default=min_support, help="Rule min support (default: 3 x support threshold)")
+    parser.add_argument("--min-confidence", type=float, default=min_confidence, help="Rule min confidence")
+    parser.add_argument("--max-files", type=int, default=max_files, help="Files mined by the mlxtend engines")
+    parser.add_argument("--telemetry", type=Path, default=None, help="Per-stage run report (.json or .csv)")
+    parser.add_argument("--profile", nargs="+", default=[], help="Stages to run under cProfile, or all")
+    parser.add_argument("--trace-memory", action="store_true", help="Record each stage's tracemalloc peak (slower)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="bom-warning", description="BOM early warning pipeline.", epilog=__doc__.split("\n\n")[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    sub = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    ingest = sub.add_parser("ingest", help="Parse and cache the history and the To_be_Added batch")
+    _common(ingest)
+    ingest.set_defaults(handler=cmd_ingest)
+
+    metrics = sub.add_parser("metrics", help="Count new files into the ARM metric store")
+    _common(metrics)
+    metrics.add_argument("--streaming", action="store_true", help="Stream the counts into the store without loading rows (flat memory)")
+    metrics.add_argument("--output", type=Path, default=None, help="Also write the metrics sheet here")
+    metrics.set_defaults(handler=cmd_metrics)
+
+    mine = sub.add_parser("mine", help="Mine If-Then rules from the history")
+    _common(mine)
+    _run_options(mine, engine="apriori", min_support=0.07, min_confidence=0.5, max_files=5)
+    mine.set_defaults(handler=cmd_mine)
+
+    report = sub.add_parser("report", help="Write the early-warning or FP-Growth report")
+    _common(report)
+    _run_options(report, engine="fpgrowth", min_support=None, min_confidence=0.8, max_files=2)
+    report.add_argument("--layout", choices=LAYOUTS, default="early-warning")
+    report.add_argument("--delta-output", type=Path, default=None, help="Quarter delta report (default: next to the report)")
+    report.add_argument("--no-delta", action="store_true", help="Skip the quarter delta")
+    report.add_argument("--merge-history", action="store_true", help="Commit To_be_Added as a history segment afterwards")
+    report.set_defaults(handler=cmd_report)
+
+    merge = sub.add_parser("merge-history", help="Commit To_be_Added as a history segment")
+    merge.add_argument("--input-dir", type=Path, default=Path("."))
+    merge.add_argument("--clear", action="store_true", help="Empty To_be_Added.zip afterwards")
+    merge.add_argument("--quarter", default=None, help=QUARTER_HELP)
+    merge.set_defaults(handler=cmd_merge_history)
+
+    status = sub.add_parser("status", help="Summarize the history, metric and delta stores")
+    status.add_argument("--input-dir", type=Path, default=Path("."))
+    status.set_defaults(handler=cmd_status)
+
+    # Parsed by the module's own main(); -h is passed through as well.
+    for name, (_, description) in PASS_THROUGH.items():
+        sub.add_parser(name, help=description, add_help=False)
+    return parser
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+    if args.command in PASS_THROUGH:
+        from importlib import import_module
+
+        import_module(f".{PASS_THROUGH[args.command][0]}", __package__).main(rest)
+        return
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
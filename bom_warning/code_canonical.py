@@ -0,0 +1,358 @@
+"""
+Canonical component and material codes.
+
+Spelling variants of one code ("ALUMINUM" / "ALUMINIUM", "BRACKET REV B" /
+"BRACKET-R2") otherwise count as separate, falsely rare pairs. Each code is
+reduced to a match key (explicit revision markers -- REV x, -R2 -- and
+separators removed; every digit is kept), the character bigrams of the key
+are MinHashed, and banded LSH turns the signatures into candidate pairs, so
+millions of codes are clustered without comparing every pair. Only keys with
+the same digits share a bucket, so part numbers, grades and thicknesses
+(KM000123 / KM000132, AISI 304 / AISI 316, EN 1.4301 / EN 1.4404) are never
+merged; a candidate is accepted when the Jaccard similarity of the two keys'
+bigrams reaches the threshold.
+
+The digit rule also keeps a digit-free material apart from its variant with a
+trailing grade or thickness ("aluminum" / "ALUMINIUM 1.5"). Such pairs are
+found separately, on the keys without that trailing number, and listed as
+"suggested": unlike proposed mappings they are not applied until a reviewer
+sets their Decision to "accepted".
+
+``CodeIndex`` keeps the codes, keys and signatures it has seen, so a repeat
+run only hashes new codes; existing mappings never change by themselves.
+Every proposed or suggested mapping is listed in ``code_mapping.csv`` next to
+the index for review: set Decision to "rejected" to keep a code as is,
+"accepted" to apply a suggestion, or edit Canonical; the edits are read back
+on the next run.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("Component", "Material")
+INDEX_VERSION = 3  # 2: numeric tokens kept in material keys, revisions stripped only at an explicit marker, 3: stems
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: a 0.7-similar pair becomes a candidate with p ~ 0.99, a 0.3-similar one with p ~ 0.12
+BUCKET_WINDOW = 32  # Neighbours compared within one band bucket (bounds very common buckets)
+SIMILARITY_THRESHOLD = 0.6
+SIGNATURE_CHUNK = 20_000  # Codes hashed per block, bounds the gathered hash matrix
+MIN_KEY = 2  # Shorter keys are never matched
+STEM_KINDS = ("Material",)  # Kinds whose trailing numbers (grades, thicknesses) get suggested links
+UNAPPLIED = ("rejected", "suggested")  # Decisions that leave a code as is
+REVIEW_COLUMNS = ["Kind", "Code", "Canonical", "Similarity", "Decision"]
+
+_REVISION = re.compile(r"(?:[\s_-]+(?:REV\.?\s*[A-Z0-9]{1,3}|R\d{1,2}))+$")
+_SEPARATORS = re.compile(r"[\s\-_/.,]+")
+_TRAILING_NUMBER = re.compile(r"\d+$")
+
+
+# === Match keys
+def match_key(code: str) -> str:
+    """Upper-cased ``code`` without a trailing revision marker or separators.
+
+    Digits are never dropped: they carry grades and dimensions, and the LSH
+    salt is taken from them.
+    """
+    key = _REVISION.sub("", str(code).upper())
+    return _SEPARATORS.sub("", key)
+
+
+def stem_key(key: str) -> str:
+    """``key`` without its trailing number, "" if another digit remains or it gets too short."""
+    stem = _TRAILING_NUMBER.sub("", key)
+    return stem if len(stem) >= MIN_KEY and not any(ch.isdigit() for ch in stem) else ""
+
+
+def _digits(key: str) -> str:
+    return "".join(filter(str.isdigit, key))
+
+
+def _bigrams(key: str) -> set:
+    padded = f"\x02{key}\x03"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+# === MinHash signatures over byte bigrams
+@lru_cache(maxsize=1)
+def _gram_hashes() -> np.ndarray:
+    # One random 16-bit value per (permutation, bigram): a minimum over a
+    # gather replaces hashing every gram NUM_PERM times. 16-bit minima
+    # (b-bit MinHash) halve the stored signatures and only serve bucketing.
+    return np.random.default_rng(20240901).integers(0, 2**16, size=(NUM_PERM, 1 << 16), dtype=np.uint16)
+
+
+def minhash(keys: list) -> np.ndarray:
+    """(len(keys), NUM_PERM) uint16 signatures of the padded keys' bigrams."""
+    signatures = np.empty((len(keys), NUM_PERM), dtype=np.uint16)
+    table = _gram_hashes()
+    for start in range(0, len(keys), SIGNATURE_CHUNK):
+        data = [b"\x02" + key.encode() + b"\x03" for key in keys[start:start + SIGNATURE_CHUNK]]
+        lengths = np.fromiter(map(len, data), dtype=np.int64, count=len(data))
+        flat = np.frombuffer(b"".join(data), dtype=np.uint8).astype(np.int64)
+        grams = flat[:-1] << 8 | flat[1:]
+        ends = np.cumsum(lengths)
+        grams = np.delete(grams, ends[:-1] - 1)  # Bigrams spanning two keys
+        firsts = ends - lengths - np.arange(len(lengths))
+        signatures[start:start + len(data)] = np.minimum.reduceat(table[:, grams], firsts, axis=1).T
+    return signatures
+
+
+def candidate_pairs(signatures: np.ndarray, salt: np.ndarray, first_new: int = 0) -> np.ndarray:
+    """(i, j) pairs, i < j, sharing a band bucket, where j is a code from ``first_new`` on.
+
+    ``salt`` (uint64 per code) is mixed into every bucket, so only codes with
+    the same salt can pair up; codes with a salt of 0 are left out.
+    """
+    n = len(signatures)
+    rows = NUM_PERM // BANDS
+    pairs = np.empty(0, dtype=np.int64)  # Encoded i * n + j
+    usable = np.flatnonzero(salt != 0)
+    for band in range(BANDS):
+        block = np.ascontiguousarray(signatures[usable, band * rows:(band + 1) * rows]).view(np.uint64)[:, 0]
+        bucket = block ^ salt[usable]
+        ranks = np.argsort(bucket)
+        order, sorted_bucket = usable[ranks], bucket[ranks]
+        # Only the neighbourhoods of new codes are scanned, so an update costs
+        # one sort plus O(new codes * BUCKET_WINDOW).
+        at = np.flatnonzero(order >= first_new)
+        found = [pairs]
+        for step in range(1, BUCKET_WINDOW + 1):
+            for other in (at - step, at + step):
+                inside = (other >= 0) & (other < len(order))
+                here, there = at[inside], other[inside]
+                same = sorted_bucket[here] == sorted_bucket[there]
+                i, j = order[here][same], order[there][same]
+                found.append(np.minimum(i, j) * n + np.maximum(i, j))
+        pairs = np.unique(np.concatenate(found))  # Deduplicated per band, so memory stays bounded
+    return np.column_stack([pairs // n, pairs % n]) if n else np.empty((0, 2), dtype=np.int64)
+
+
+def jaccard(keys, pairs: np.ndarray) -> np.ndarray:
+    """Exact Jaccard similarity of the bigram sets of each pair's keys."""
+    grams = {}
+
+    def bigrams(i):
+        if i not in grams:
+            grams[i] = _bigrams(keys[i])
+        return grams[i]
+
+    scores = np.empty(len(pairs))
+    for k, (i, j) in enumerate(pairs.tolist()):
+        a, b = bigrams(i), bigrams(j)
+        scores[k] = len(a & b) / len(a | b)
+    return scores
+
+
+# === Persistent index
+class CodeIndex:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.codes = {kind: pd.DataFrame({
+            "Code": pd.Series(dtype=object), "Key": pd.Series(dtype=object), "Salt": pd.Series(dtype="uint64"),
+            "Stem": pd.Series(dtype=object), "Canonical": pd.Series(dtype=object),
+            "Similarity": pd.Series(dtype=float), "Decision": pd.Series(dtype=object),
+        }) for kind in KINDS}
+        self.signatures = {kind: np.empty((0, NUM_PERM), dtype=np.uint16) for kind in KINDS}
+        self.stem_signatures = {kind: np.empty((0, NUM_PERM), dtype=np.uint16) for kind in KINDS}
+        self.carried_review = None  # Reviewer decisions re-applied after rebuilding an outdated index
+
+    @property
+    def review_path(self) -> Path:
+        return self.root / "code_mapping.csv"
+
+    @classmethod
+    def open(cls, root: Path) -> "CodeIndex":
+        """Load the index at ``root`` (empty if there is none) with the reviewer's edits applied."""
+        index = cls(root)
+        outdated = False
+        if (index.root / "index.json").exists():
+            meta = json.loads((index.root / "index.json").read_text())
+            outdated = meta.get("version", 0) < INDEX_VERSION
+            if outdated:
+                # Keys (and the links built on them) changed; only the
+                # reviewer's explicit decisions survive the rebuild.
+                logger.warning(f"Code index in {root} uses match keys of version {meta.get('version')}; rebuilding it")
+            elif meta.get("version") != INDEX_VERSION:
+                raise ValueError(f"Unsupported code index version {meta.get('version')} in {root}")
+            else:
+                for kind in KINDS:
+                    index.codes[kind] = pd.read_parquet(index.root / f"{kind}_codes.parquet")
+                    index.signatures[kind] = np.load(index.root / f"{kind}_signatures.npy")
+                    index.stem_signatures[kind] = np.load(index.root / f"{kind}_stem_signatures.npy")
+        if index.review_path.exists():
+            review = pd.read_csv(index.review_path, dtype={"Code": str, "Canonical": str, "Decision": str})
+            if outdated:
+                index.carried_review = review[review["Decision"].fillna("proposed").str.strip().str.lower() != "proposed"]
+            else:
+                index._read_review(review)
+        return index
+
+    def _read_review(self, review: pd.DataFrame) -> None:
+        for kind, edits in review.groupby("Kind"):
+            codes = self.codes[kind].set_index("Code")
+            edits = edits.set_index("Code")
+            edits = edits[edits.index.isin(codes.index)]
+            codes.loc[edits.index, "Canonical"] = edits["Canonical"].fillna(pd.Series(edits.index, index=edits.index))
+            codes.loc[edits.index, "Decision"] = edits["Decision"].fillna("proposed").str.strip().str.lower()
+            self.codes[kind] = codes.reset_index()
+
+    # === Indexing
+    def update(self, *frames: pd.DataFrame, threshold: float = SIMILARITY_THRESHOLD) -> int:
+        """Index the codes of ``frames`` not seen before; returns how many were new."""
+        added = 0
+        for kind in KINDS:
+            values = pd.concat([pd.Series(np.asarray(df[kind], dtype=object)) for df in frames], ignore_index=True)
+            counts = values.value_counts()
+            known = set(self.codes[kind]["Code"].tolist())  # isin is slow on Arrow-backed strings
+            new_codes = sorted(code for code in counts.index if code not in known)
+            if new_codes:
+                self._add_codes(kind, new_codes, counts, threshold)
+                added += len(new_codes)
+        if self.carried_review is not None:
+            self._read_review(self.carried_review)
+            self.carried_review = None
+        return added
+
+    def _add_codes(self, kind: str, new_codes: list, counts: pd.Series, threshold: float) -> None:
+        old = self.codes[kind]
+        new_keys = [match_key(code) for code in new_codes]
+        # Salt: a hash of the key's digits, 0 for keys too short to match
+        new_salt = pd.util.hash_array(np.array([_digits(key) for key in new_keys], dtype=object)) | np.uint64(1)
+        new_salt[np.array([len(key) < MIN_KEY for key in new_keys], dtype=bool)] = 0
+        signatures = np.concatenate([self.signatures[kind], minhash(new_keys)])
+        codes = np.concatenate([old["Code"].to_numpy(dtype=object), np.array(new_codes, dtype=object)])
+        keys = np.concatenate([old["Key"].to_numpy(dtype=object), np.array(new_keys, dtype=object)])
+        salt = np.concatenate([old["Salt"].to_numpy(dtype=np.uint64), new_salt])
+        n_old, n = len(old), len(codes)
+
+        pairs = candidate_pairs(signatures, salt, first_new=n_old)
+        scores = jaccard(keys, pairs)
+        pairs, scores = pairs[scores >= threshold], scores[scores >= threshold]
+        logger.info(f"{kind}: {len(new_codes)} new codes, {len(pairs)} near-duplicate links")
+
+        # Clusters are formed over the linked codes only.
+        linked = np.unique(pairs)
+        local = np.searchsorted(linked, pairs)
+        graph = coo_matrix((np.ones(len(pairs)), (local[:, 0], local[:, 1])), shape=(len(linked), len(linked)))
+        labels = connected_components(graph, directed=False)[1]
+        best = np.zeros(len(linked))  # Best link score per code
+        np.maximum.at(best, local[:, 0], scores)
+        np.maximum.at(best, local[:, 1], scores)
+
+        # The canonical code of a cluster: the existing canonical of its most
+        # frequent indexed code, else its most frequent (then shortest) new code.
+        linked_codes = codes[linked]
+        frequency = counts.reindex(linked_codes).fillna(0).to_numpy()
+        lengths = np.fromiter(map(len, linked_codes), dtype=np.int64, count=len(linked))
+        order = np.lexsort((linked_codes.astype(str), lengths, -frequency, linked >= n_old))
+        cluster_labels, first = np.unique(labels[order], return_index=True)
+        leaders = np.empty(len(cluster_labels), dtype=np.int64)
+        leaders[cluster_labels] = order[first]
+        current = linked_codes.copy()
+        is_old = linked < n_old
+        current[is_old] = self._effective(kind)[linked[is_old]]
+
+        # Codes without a link stay their own canonical.
+        canonical = codes[n_old:].copy()
+        similar = np.ones(n - n_old)
+        canonical[linked[~is_old] - n_old] = current[leaders[labels[~is_old]]]
+        similar[linked[~is_old] - n_old] = best[~is_old]
+
+        decision = np.where(canonical == codes[n_old:], "", "proposed").astype(object)
+        stems = np.array([stem_key(key) if kind in STEM_KINDS else "" for key in new_keys], dtype=object)
+        stem_pairs, stem_scores = self._stem_links(kind, keys, np.concatenate([old["Stem"].to_numpy(dtype=object), stems]), n_old, threshold)
+        # A new code without a link gets its best stem link as a suggestion.
+        targets = np.concatenate([self._effective(kind), canonical])
+        order = np.argsort(-stem_scores, kind="stable")
+        for (i, j), score in zip(stem_pairs[order].tolist(), stem_scores[order].tolist()):
+            at = j - n_old
+            if decision[at] == "" and targets[i] != codes[j]:
+                canonical[at], similar[at], decision[at] = targets[i], score, "suggested"
+
+        new_rows = pd.DataFrame({
+            "Code": codes[n_old:], "Key": keys[n_old:], "Salt": new_salt, "Stem": stems, "Canonical": canonical,
+            "Similarity": np.where(canonical == codes[n_old:], 1.0, similar).round(3), "Decision": decision,
+        })
+        self.codes[kind] = pd.concat([old, new_rows], ignore_index=True)
+        self.signatures[kind] = signatures
+
+    def _stem_links(self, kind: str, keys: np.ndarray, stems: np.ndarray, n_old: int, threshold: float) -> tuple:
+        """(old or new, new) code pairs linking a digit-free key to a trailing-number
+        variant, compared on their stems, and the stems' Jaccard similarity."""
+        if kind not in STEM_KINDS:
+            return np.empty((0, 2), dtype=np.int64), np.empty(0)
+        self.stem_signatures[kind] = signatures = np.concatenate([self.stem_signatures[kind], minhash(list(stems[n_old:]))])
+        salt = (stems != "").astype(np.uint64)
+        pairs = candidate_pairs(signatures, salt, first_new=n_old)
+        plain = stems == keys  # Digit-free keys are their own stem
+        pairs = pairs[plain[pairs[:, 0]] != plain[pairs[:, 1]]]
+        scores = jaccard(stems, pairs)
+        return pairs[scores >= threshold], scores[scores >= threshold]
+
+    # === Mapping
+    def _effective(self, kind: str) -> np.ndarray:
+        codes = self.codes[kind]
+        return np.where(codes["Decision"].isin(UNAPPLIED), codes["Code"], codes["Canonical"]).astype(object)
+
+    def mapping(self, kind: str) -> dict:
+        """Code -> canonical code for every code that changes, chains followed."""
+        codes = self.codes[kind]["Code"].to_numpy(dtype=object)
+        mapping = {c: t for c, t in zip(codes, self._effective(kind)) if c != t}
+        for code, target in mapping.items():
+            seen = {code}
+            while target in mapping and target not in seen:  # Reviewer edits can chain
+                seen.add(target)
+                target = mapping[target]
+            mapping[code] = target
+        return mapping
+
+    def mappings(self) -> dict:
+        return {kind: self.mapping(kind) for kind in KINDS}
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return ``df`` with its Component and Material codes canonicalized."""
+        df = df.copy()
+        for kind, mapping in self.mappings().items():
+            if mapping and len(df):
+                codes, uniques = pd.factorize(df[kind])
+                cleaned = np.array([mapping.get(u, u) for u in uniques], dtype=object)
+                df[kind] = pd.Series(cleaned[codes], index=df.index)
+        return df
+
+    def review_table(self) -> pd.DataFrame:
+        frames = []
+        for kind in KINDS:
+            codes = self.codes[kind]
+            changed = codes[(codes["Canonical"] != codes["Code"]) | (codes["Decision"] == "rejected")]
+            frames.append(changed.assign(Kind=kind)[REVIEW_COLUMNS])
+        return pd.concat(frames, ignore_index=True).sort_values(["Kind", "Canonical", "Code"], ignore_index=True)
+
+    # === Persistence
+    def save(self) -> None:
+        """Write the index and the review table, replacing the previous index whole."""
+        tmp = self.root.with_name(self.root.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for kind in KINDS:
+            self.codes[kind].to_parquet(tmp / f"{kind}_codes.parquet", index=False)
+            np.save(tmp / f"{kind}_signatures.npy", self.signatures[kind])
+            np.save(tmp / f"{kind}_stem_signatures.npy", self.stem_signatures[kind])
+        self.review_table().to_csv(tmp / "code_mapping.csv", index=False)
+        (tmp / "index.json").write_text(json.dumps({"version": INDEX_VERSION, "codes": {k: len(v) for k, v in self.codes.items()}}))
+        old = self.root.with_name(self.root.name + ".old")
+        if self.root.exists():
+            os.replace(self.root, old)
+        os.replace(tmp, self.root)
+        shutil.rmtree(old, ignore_errors=True)
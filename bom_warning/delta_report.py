@@ -0,0 +1,438 @@
+"""
+Quarter-over-quarter delta report.
+
+Each run persists a snapshot of what it reported -- per-(Component, Material)
+file counts and Rare / Not Rare status, the critical item list and the mined
+rules -- and the next run reports only what changed against it:
+
+- ``Pair_Delta``:     pairs that appeared or disappeared, or crossed the rare
+                      threshold in either direction
+- ``Critical_Delta``: components that became critical
+- ``Rule_Delta``:     rules that appeared or disappeared, or whose confidence
+                      or lift moved beyond a tolerance
+
+With the all-history support, the snapshot is advanced by the batch alone:
+the rows of the newly counted files come from the batch (and the history
+segments holding them), their pairs are looked up by hashed key, counts are
+added in place and new pairs inserted at their key position. Support and
+Rare follow from the count and the file total, so they are not stored; an
+untouched pair only changes status when its unchanged count falls between
+the old and the new threshold count, which is one vectorized comparison
+over the stored counts. Nothing is grouped, sorted or concatenated beyond
+the batch; reading and writing the snapshot arrays stays linear. Windowed
+or decayed support moves every pair, so those modes (and a metric store that
+no longer extends the snapshot, e.g. after a rebuild, or counts under
+another code mapping than the snapshot's) compare the full metric frame.
+"""
+
+import json
+import logging
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .arm_store import ArmMetricStore
+from .pair_index import critical_flag
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SUPPORT_DECIMALS = 5  # ArmMetricStore.to_metrics rounding
+CONFIDENCE_TOLERANCE = 0.05  # Absolute change in confidence reported for a kept rule
+LIFT_TOLERANCE = 0.10  # Relative change in lift reported for a kept rule
+RULE_KEYS = ["Antecedent_Component", "Antecedent_Material", "Consequent_Component", "Consequent_Material"]
+PAIR_DELTA_COLUMNS = [
+    "Change", "Component", "Material", "Previous_Count", "Count", "Previous_Support", "Support",
+    "Previous_Status", "Status", "Critical_Flag",
+]
+CRITICAL_DELTA_COLUMNS = ["Component", "Change"]
+RULE_DELTA_COLUMNS = ["Change", *RULE_KEYS, "Previous_Confidence", "Confidence", "Previous_Lift", "Lift"]
+
+
+# === Keys
+def hash_keys(df: pd.DataFrame, columns: list) -> np.ndarray:
+    """uint64 key per row, stable across runs (categoricals hash their values)."""
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def component_keys(components) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.Series(components), index=False).to_numpy()
+
+
+def _lookup(sorted_keys: np.ndarray, keys: np.ndarray) -> tuple:
+    """Positions of ``keys`` in ``sorted_keys`` and whether each was found."""
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == keys
+
+
+def support(counts, total_files: int):
+    """Support as the metric store reports it (rounded like ``to_metrics``)."""
+    return np.round(counts / total_files, SUPPORT_DECIMALS) if total_files else counts * 0.0
+
+
+def rare_count(total_files: int, support_threshold: float) -> int:
+    """Smallest file count whose reported support is not Rare."""
+    if total_files <= 0:
+        return 0
+    count = max(math.ceil(support_threshold * total_files) - 2, 0)
+    while support(count, total_files) < support_threshold:
+        count += 1
+    return count
+
+
+# === Snapshot
+class DeltaSnapshot:
+    """What the previous run reported, as arrays sorted by hashed key.
+
+    ``pairs`` has Key, Component, Material and Count sorted by Key, plus the
+    reported Support and Rare for windowed or decayed support (see
+    ``reported_pairs``). ``critical`` is the critical item list and
+    ``components`` the sorted keys of every component present.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.exists = False
+        self.pairs = pd.DataFrame({
+            "Key": pd.Series(dtype="uint64"), "Component": pd.Series(dtype=object), "Material": pd.Series(dtype=object),
+            "Count": pd.Series(dtype="int64"),
+        })
+        self.components = np.empty(0, dtype=np.uint64)
+        self.critical = set()
+        self.rules = None
+        self.total_files = 0
+        self.last_file = None
+        self.support_mode = "all"
+        self.support_threshold = None
+        self.code_map_version = ""  # Code mapping the reported pairs were counted under (see bom_codes)
+
+    @classmethod
+    def open(cls, root: Path) -> "DeltaSnapshot":
+        snapshot = cls(root)
+        meta_path = snapshot.root / "snapshot.json"
+        if not meta_path.exists():
+            return snapshot
+        meta = json.loads(meta_path.read_text())
+        if meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported delta snapshot version {meta.get('version')} in {root}")
+        snapshot.exists = True
+        snapshot.pairs = pd.read_parquet(snapshot.root / "pairs.parquet")
+        snapshot.components = np.load(snapshot.root / "components.npy")
+        if (snapshot.root / "rules.parquet").exists():
+            snapshot.rules = pd.read_parquet(snapshot.root / "rules.parquet")
+        snapshot.critical = set(meta["critical"])
+        snapshot.total_files = meta["total_files"]
+        snapshot.last_file = meta["last_file"]
+        snapshot.support_mode = meta["support_mode"]
+        snapshot.support_threshold = meta["support_threshold"]
+        snapshot.code_map_version = meta.get("code_map_version", "")
+        return snapshot
+
+    def save(self) -> None:
+        """Write the snapshot, replacing the previous one whole."""
+        tmp = self.root.with_name(self.root.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        self.pairs.to_parquet(tmp / "pairs.parquet", index=False)
+        np.save(tmp / "components.npy", self.components)
+        if self.rules is not None:
+            self.rules.to_parquet(tmp / "rules.parquet", index=False)
+        (tmp / "snapshot.json").write_text(json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "total_files": self.total_files,
+            "last_file": self.last_file,
+            "support_mode": self.support_mode,
+            "support_threshold": self.support_threshold,
+            "code_map_version": self.code_map_version,
+            "critical": sorted(self.critical),
+        }))
+        old = self.root.with_name(self.root.name + ".old")
+        if self.root.exists():
+            os.replace(self.root, old)
+        os.replace(tmp, self.root)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def set_pairs(self, pairs: pd.DataFrame, components: Optional[np.ndarray] = None, support_mode: str = "all") -> None:
+        """Replace the pairs (sorted by Key), keeping Support / Rare only where the count does not give them."""
+        if support_mode == "all":
+            pairs = pairs[["Key", "Component", "Material", "Count"]]
+        self.pairs = pairs if pairs["Key"].is_monotonic_increasing else pairs.sort_values("Key", kind="stable", ignore_index=True)
+        self.components = np.unique(component_keys(self.pairs["Component"])) if components is None else components
+
+    def reported_pairs(self, rows=slice(None)) -> pd.DataFrame:
+        """``pairs`` rows with the Support and Rare the previous run reported."""
+        pairs = self.pairs.iloc[rows].reset_index(drop=True)
+        if "Rare" in pairs.columns:
+            return pairs
+        return _with_status(pairs, self.total_files, rare_count(self.total_files, self.support_threshold))
+
+    def extended_by(self, store: ArmMetricStore) -> bool:
+        """True if ``store`` holds exactly the snapshot's files plus later ones."""
+        if store.total_files < self.total_files:
+            return False
+        return self.total_files == 0 or store.files[self.total_files - 1] == self.last_file
+
+
+def _with_status(pairs: pd.DataFrame, total_files: int, not_rare_from: int) -> pd.DataFrame:
+    """All-history Support and Rare of ``pairs`` from their Count."""
+    counts = pairs["Count"].to_numpy()
+    return pairs.assign(Support=support(counts, total_files), Rare=counts < not_rare_from)
+
+
+def _status(rare) -> np.ndarray:
+    return np.where(np.asarray(rare, dtype=bool), "Rare", "Not Rare")
+
+
+def _pair_rows(change: str, previous: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """Delta rows from aligned previous / current frames (None for a missing side)."""
+    base = current if current is not None else previous
+    n = len(base)
+    return pd.DataFrame({
+        "Change": np.full(n, change, dtype=object),
+        "Component": np.asarray(base["Component"], dtype=object),
+        "Material": np.asarray(base["Material"], dtype=object),
+        "Previous_Count": previous["Count"].to_numpy() if previous is not None else np.zeros(n, dtype=np.int64),
+        "Count": current["Count"].to_numpy() if current is not None else np.zeros(n, dtype=np.int64),
+        "Previous_Support": previous["Support"].to_numpy() if previous is not None else np.full(n, np.nan),
+        "Support": current["Support"].to_numpy() if current is not None else np.full(n, np.nan),
+        "Previous_Status": _status(previous["Rare"]) if previous is not None else np.full(n, "", dtype=object),
+        "Status": _status(current["Rare"]) if current is not None else np.full(n, "", dtype=object),
+    })
+
+
+def _empty_pair_delta() -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in PAIR_DELTA_COLUMNS})
+
+
+def _crossed(rows: pd.DataFrame) -> pd.DataFrame:
+    return rows.assign(Change=np.where(rows["Status"] == "Rare", "Became Rare", "No Longer Rare"))
+
+
+# === Pair delta
+def incremental_pair_delta(
+    snapshot: DeltaSnapshot, batch: pd.DataFrame, total_files: int, support_threshold: float
+) -> tuple:
+    """Pair delta for the all-history support from the newly counted rows only.
+
+    ``batch`` holds the rows of the files counted since the snapshot and
+    ``total_files`` the file total after them. Returns the delta rows and the
+    new snapshot pair table: the stored counts of the batch pairs grow in
+    place and the new pairs are inserted at their key position.
+    """
+    unique = batch[["Component", "Material", "Source_File"]].drop_duplicates()
+    counts = unique.groupby(["Component", "Material"], observed=True).size().rename("Batch_Count").reset_index()
+    counts["Key"] = hash_keys(counts, ["Component", "Material"])
+    counts = counts.sort_values("Key", kind="stable", ignore_index=True)
+    pairs = snapshot.pairs
+    keys = pairs["Key"].to_numpy()
+    stored = pairs["Count"].to_numpy(dtype=np.int64)
+    positions, found = _lookup(keys, counts["Key"].to_numpy())
+    batch_counts = counts["Batch_Count"].to_numpy(dtype=np.int64)
+    old_not_rare_from = rare_count(snapshot.total_files, snapshot.support_threshold)
+    not_rare_from = rare_count(total_files, support_threshold)
+
+    # Pairs of the batch: counts grow by their batch count.
+    previous = snapshot.reported_pairs(positions[found])
+    touched = _with_status(previous.assign(Count=stored[positions[found]] + batch_counts[found]), total_files, not_rare_from)
+    appeared = _with_status(pd.DataFrame({
+        "Key": counts["Key"].to_numpy()[~found],
+        "Component": np.asarray(counts["Component"], dtype=object)[~found],
+        "Material": np.asarray(counts["Material"], dtype=object)[~found],
+        "Count": batch_counts[~found],
+    }), total_files, not_rare_from)
+    moved = touched["Rare"].to_numpy() != previous["Rare"].to_numpy()
+
+    # Untouched pairs keep their count, so they flip only when it lies
+    # between the old and the new threshold count.
+    low, high = sorted((old_not_rare_from, not_rare_from))
+    between = np.flatnonzero((stored >= low) & (stored < high))
+    between = np.setdiff1d(between, positions[found], assume_unique=True)
+    flipped = snapshot.reported_pairs(between)
+    flipped_now = _with_status(flipped, total_files, not_rare_from)
+
+    delta = pd.concat([
+        _pair_rows("Appeared", None, appeared),
+        _crossed(_pair_rows("", previous[moved], touched[moved])),
+        _crossed(_pair_rows("", flipped, flipped_now)),
+    ], ignore_index=True)
+
+    # Advance the snapshot by key: counts in place, new pairs inserted in key order.
+    stored = stored.copy()
+    stored[positions[found]] += batch_counts[found]
+    at = np.searchsorted(keys, appeared["Key"].to_numpy())
+    updated = pd.DataFrame({
+        "Key": np.insert(keys, at, appeared["Key"].to_numpy()),
+        "Component": np.insert(np.asarray(pairs["Component"], dtype=object), at, appeared["Component"].to_numpy()),
+        "Material": np.insert(np.asarray(pairs["Material"], dtype=object), at, appeared["Material"].to_numpy()),
+        "Count": np.insert(stored, at, appeared["Count"].to_numpy()),
+    })
+    return delta, updated
+
+
+def full_pair_delta(
+    snapshot: DeltaSnapshot, metrics: pd.DataFrame, count_column: str, support_column: str, support_threshold: float
+) -> tuple:
+    """Pair delta by comparing the whole metric frame with the snapshot."""
+    current = pd.DataFrame({
+        "Key": hash_keys(metrics, ["Component", "Material"]),
+        "Component": np.asarray(metrics["Component"], dtype=object),
+        "Material": np.asarray(metrics["Material"], dtype=object),
+        "Count": metrics[count_column].to_numpy(dtype=np.int64),
+        "Support": metrics[support_column].to_numpy(dtype=float),
+    })
+    current["Rare"] = current["Support"].to_numpy() < support_threshold
+    current = current.sort_values("Key", kind="stable", ignore_index=True)
+    previous = snapshot.reported_pairs()
+    positions, found = _lookup(previous["Key"].to_numpy(), current["Key"].to_numpy())
+    kept_previous = previous.iloc[positions[found]].reset_index(drop=True)
+    kept_current = current[found].reset_index(drop=True)
+    moved = kept_previous["Rare"].to_numpy() != kept_current["Rare"].to_numpy()
+    gone = np.ones(len(previous), dtype=bool)
+    gone[positions[found]] = False
+    delta = pd.concat([
+        _pair_rows("Appeared", None, current[~found]),
+        _pair_rows("Disappeared", previous[gone], None),
+        _crossed(_pair_rows("", kept_previous[moved], kept_current[moved])),
+    ], ignore_index=True)
+    return delta, current
+
+
+# === Critical components
+def critical_delta(snapshot: DeltaSnapshot, critical_items, batch_components) -> pd.DataFrame:
+    """Components that are critical now but were not in the previous report.
+
+    Either the component was added to the critical item list (and is in the
+    data), or it is critical and appears in the data for the first time.
+    """
+    critical_items = set(critical_items)
+    present = snapshot.components
+    rows = []
+    listed = sorted(critical_items - snapshot.critical)
+    if listed:
+        _, known = _lookup(present, component_keys(listed))
+        batch = set(np.asarray(batch_components, dtype=object))
+        rows += [(c, "Added to critical list") for c, k in zip(listed, known) if k or c in batch]
+    first_seen = pd.unique(np.asarray(batch_components, dtype=object))
+    first_seen = first_seen[~_lookup(present, component_keys(first_seen))[1]]
+    rows += [(c, "New critical component") for c in sorted(first_seen) if c in critical_items and c in snapshot.critical]
+    return pd.DataFrame(rows, columns=CRITICAL_DELTA_COLUMNS)
+
+
+# === Rules
+def rule_delta(
+    previous: Optional[pd.DataFrame],
+    current: pd.DataFrame,
+    confidence_tolerance: float = CONFIDENCE_TOLERANCE,
+    lift_tolerance: float = LIFT_TOLERANCE,
+) -> pd.DataFrame:
+    """Rules that appeared, disappeared or moved beyond the tolerances.
+
+    Both frames have the RULE_KEYS columns plus Confidence and Lift.
+    """
+    current = current.assign(Key=hash_keys(current, RULE_KEYS))
+    if previous is None:
+        previous = current.iloc[:0]
+    merged = previous.merge(current, on="Key", how="outer", suffixes=("_prev", ""), indicator=True)
+    for key in RULE_KEYS:
+        merged[key] = merged[key].fillna(merged[f"{key}_prev"])
+    moved = (merged["_merge"] == "both") & (
+        ((merged["Confidence"] - merged["Confidence_prev"]).abs() > confidence_tolerance)
+        | ((merged["Lift"] - merged["Lift_prev"]).abs() > lift_tolerance * merged["Lift_prev"].abs())
+    )
+    change = np.select(
+        [merged["_merge"] == "right_only", merged["_merge"] == "left_only", moved],
+        ["Appeared", "Disappeared", "Moved"], default="",
+    )
+    merged = merged.assign(Change=change, Previous_Confidence=merged["Confidence_prev"], Previous_Lift=merged["Lift_prev"])
+    merged = merged[merged["Change"] != ""][RULE_DELTA_COLUMNS]
+    return merged.sort_values(["Change", *RULE_KEYS], kind="stable", ignore_index=True)
+
+
+def rule_frame(antecedents: tuple, consequents: tuple, confidence, lift) -> pd.DataFrame:
+    """Rule table from decoded (components, materials) of both sides."""
+    return pd.DataFrame({
+        "Antecedent_Component": np.asarray(antecedents[0], dtype=object),
+        "Antecedent_Material": np.asarray(antecedents[1], dtype=object),
+        "Consequent_Component": np.asarray(consequents[0], dtype=object),
+        "Consequent_Material": np.asarray(consequents[1], dtype=object),
+        "Confidence": np.asarray(confidence, dtype=float),
+        "Lift": np.asarray(lift, dtype=float),
+    })
+
+
+# === Report
+def quarter_delta(
+    snapshot_path: Path,
+    rows_of: Callable[[list], pd.DataFrame],
+    metric_store: ArmMetricStore,
+    metrics: pd.DataFrame,
+    support_threshold: float,
+    critical_items,
+    support_mode: str = "all",
+    support_column: str = "Support",
+    count_column: str = "File_Occurrence",
+    rules: Optional[pd.DataFrame] = None,
+    confidence_tolerance: float = CONFIDENCE_TOLERANCE,
+    lift_tolerance: float = LIFT_TOLERANCE,
+    code_map_version: str = "",
+) -> tuple:
+    """Compare this run with the persisted snapshot and advance it in memory.
+
+    ``rows_of`` returns the loaded rows of the given Source_Files; it is
+    asked only for the files the metric store counted since the snapshot. ``rules`` (see ``rule_frame``)
+    adds the Rule_Delta sheet. ``code_map_version`` is the code mapping of
+    the metric store's counts. Returns the sheets and the advanced
+    ``DeltaSnapshot``, which the caller saves once the run has succeeded;
+    without a previous snapshot the sheets are empty.
+    """
+    snapshot = DeltaSnapshot.open(snapshot_path)
+    components = None  # Recomputed from the pairs unless only the batch added some
+    new_files = metric_store.files[snapshot.total_files:] if snapshot.extended_by(metric_store) else metric_store.files
+    batch = rows_of(new_files)
+    batch_components = batch["Component"].unique() if len(batch) else []
+
+    if not snapshot.exists:
+        logger.info(f"No delta snapshot at {snapshot_path}; starting from this run")
+        pairs = full_pair_delta(snapshot, metrics, count_column, support_column, support_threshold)[1]
+        pair_rows, critical_rows = _empty_pair_delta(), pd.DataFrame(columns=CRITICAL_DELTA_COLUMNS)
+    else:
+        incremental = (
+            support_mode == "all" and snapshot.support_mode == "all" and snapshot.extended_by(metric_store)
+            and snapshot.code_map_version == code_map_version
+        )
+        if incremental:
+            pair_rows, pairs = incremental_pair_delta(snapshot, batch, metric_store.total_files, support_threshold)
+            components = np.union1d(snapshot.components, component_keys(batch_components))
+        else:
+            logger.info("Delta snapshot not extended by this run's counts; comparing every pair")
+            pair_rows, pairs = full_pair_delta(snapshot, metrics, count_column, support_column, support_threshold)
+        critical_rows = critical_delta(snapshot, critical_items, batch_components)
+    if len(pair_rows):
+        pair_rows["Critical_Flag"] = critical_flag(pair_rows["Component"], critical_items)
+        pair_rows = pair_rows.sort_values(["Change", "Component", "Material"], kind="stable", ignore_index=True)
+    else:
+        pair_rows = _empty_pair_delta()
+    sheets = {"Pair_Delta": pair_rows, "Critical_Delta": critical_rows}
+    if rules is not None:
+        if snapshot.exists:
+            sheets["Rule_Delta"] = rule_delta(snapshot.rules, rules, confidence_tolerance, lift_tolerance)
+        else:
+            sheets["Rule_Delta"] = pd.DataFrame(columns=RULE_DELTA_COLUMNS)
+        snapshot.rules = rules.assign(Key=hash_keys(rules, RULE_KEYS))
+
+    snapshot.set_pairs(pairs, components, support_mode)
+    snapshot.critical = set(critical_items)
+    snapshot.total_files = metric_store.total_files
+    snapshot.last_file = str(metric_store.files[-1]) if metric_store.total_files else None
+    snapshot.support_mode = support_mode
+    snapshot.support_threshold = support_threshold
+    snapshot.code_map_version = code_map_version
+    logger.info(", ".join(f"{name}: {len(df)} rows" for name, df in sheets.items()))
+    return sheets, snapshot
@@ -0,0 +1,408 @@
+"""
+Append-only, segmented store for the historical BOM workbooks.
+
+Every quarterly batch (a To_be_Added.zip) becomes a new immutable segment
+archive under ``segments/``; the workbooks are copied byte for byte, so no
+column is ever lost. ``manifest.json`` lists the live segments in order and,
+per member, its SHA-256, the Source_File it is reported and counted under and
+the quarter it is dated to. A commit writes the segment and the new manifest
+to temporary files and renames them into place, so a crash leaves either the
+old or the new history, never a mix. Compaction merges the segments into fewer, larger ones and can
+run on a background thread while the scripts carry on.
+
+Compaction never deletes a segment a reader may still be loading: the new
+manifest is committed first and lists the replaced segments as retired; their
+files are removed by a later commit or compaction once they have been retired
+for ``RETIRE_SECONDS``. A reader that still finds a segment gone (it held the
+manifest across that whole period) re-reads the manifest and loads again.
+
+Re-sent files: a file is identified by its Source_File (the workbook's base
+name) together with its content. A workbook whose content is already in the
+history is skipped, whatever its name, and so is a repeated member name
+within one archive. A workbook that reuses a Source_File of the history with
+new content is kept as a new file under a versioned name, ``<stem>~<first 8
+hex digits of its SHA-256>.xlsx``. ``batch_plan`` gives the same decision for
+a batch before it is committed, and the loaders and the ARM metric store use
+it, so the history, the metric counts and the reports always agree on which
+files exist and under what name.
+
+The store assumes a single writing process; within that process appends and
+compaction are serialised on a lock. ``open(..., read_only=True)`` never
+writes: it reads the committed history or, before the first commit, presents
+the bootstrap archive as the history without creating the store.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path, PurePath
+from typing import Optional
+
+import pandas as pd
+
+from .bom_ingest import empty_frame, is_bom_member, load_zip, member_quarter, member_quarters
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+COMPACT_SEGMENTS = 8  # Compact once this many segments have accumulated
+RETIRE_SECONDS = 3600  # Keep segments replaced by a compaction this long for readers of the old manifest
+
+
+def _write_atomic(path: Path, write) -> None:
+    """Call ``write(tmp_path)``, flush it to disk and rename it to ``path``."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def versioned_name(source_file: str, digest: str) -> str:
+    """Source_File for new content re-sent under a name the history already holds."""
+    path = PurePath(source_file)
+    return f"{path.stem}~{digest[:8]}{path.suffix}"
+
+
+def source_file(member: dict) -> str:
+    """Source_File of a manifest member (its base name unless versioned)."""
+    return member.get("source_file", PurePath(member["name"]).name)
+
+
+def content_keys(members: list) -> dict:
+    """Source_File -> content key (SHA-256) for manifest members."""
+    return {source_file(member): member["sha256"] for member in members}
+
+
+def _copy_members(target: Path, sources: list) -> None:
+    """Write ``(archive path, ZipInfo)`` members into a new archive at ``target``.
+
+    The original ZipInfo is reused, so names, timestamps and CRCs (and with
+    them the parsed-member cache keys) carry over unchanged.
+    """
+    archives = {}
+    try:
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as out:
+            for archive_path, info in sources:
+                if archive_path not in archives:
+                    archives[archive_path] = zipfile.ZipFile(archive_path, "r")
+                out.writestr(info, archives[archive_path].read(info), compress_type=info.compress_type)
+    finally:
+        for archive in archives.values():
+            archive.close()
+
+
+class HistoryStore:
+    def __init__(self, root: Path, read_only: bool = False):
+        self.root = Path(root)
+        self.segment_dir = self.root / "segments"
+        self.manifest_path = self.root / "manifest.json"
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {"version": MANIFEST_VERSION, "next_segment": 1, "segments": []}
+        manifest = json.loads(self.manifest_path.read_text())
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported history manifest version in {self.manifest_path}")
+        return manifest
+
+    @classmethod
+    def open(cls, root: Path, bootstrap_zip: Optional[Path] = None, read_only: bool = False) -> "HistoryStore":
+        """Open the store at ``root``, seeding an empty one from ``bootstrap_zip``.
+
+        With ``read_only`` nothing is written: an empty store is instead shown
+        with ``bootstrap_zip`` as its only (uncommitted) segment.
+        """
+        store = cls(root, read_only=read_only)
+        if not read_only:
+            store._record_quarters()
+        if store.manifest["segments"] or bootstrap_zip is None or not Path(bootstrap_zip).exists():
+            return store
+        if read_only:
+            members = [entry for _, entry in store._plan(bootstrap_zip, store.hashes, set())]
+            store.manifest["segments"].append({"name": Path(bootstrap_zip).name, "path": str(bootstrap_zip), "members": members})
+        else:
+            added = store.append_zip(bootstrap_zip)
+            logger.info(f"History store {root} bootstrapped with {added} files from {bootstrap_zip}")
+        return store
+
+    # === Contents
+    def _segment_path(self, segment: dict) -> Path:
+        # Only read-only views carry a "path": the bootstrap archive itself.
+        return Path(segment["path"]) if "path" in segment else self.segment_dir / segment["name"]
+
+    @property
+    def segments(self) -> list:
+        return [self._segment_path(segment) for segment in self.manifest["segments"]]
+
+    @property
+    def hashes(self) -> set:
+        return {member["sha256"] for segment in self.manifest["segments"] for member in segment["members"]}
+
+    @property
+    def total_files(self) -> int:
+        return sum(len(segment["members"]) for segment in self.manifest["segments"])
+
+    def source_files(self) -> list:
+        """Source_File of every file in the history, in commit order."""
+        return [source_file(member) for segment in self.manifest["segments"] for member in segment["members"]]
+
+    def segment_names(self, segment: dict) -> dict:
+        """Member name -> Source_File for one manifest segment."""
+        return {member["name"]: source_file(member) for member in segment["members"]}
+
+    def file_keys(self) -> dict:
+        """Source_File -> content key (SHA-256) for every file in the history."""
+        return {name: key for segment in self.manifest["segments"] for name, key in self.segment_keys(segment).items()}
+
+    def segment_keys(self, segment: dict) -> dict:
+        """Source_File -> content key (SHA-256) for one manifest segment."""
+        return content_keys(segment["members"])
+
+    def segment_quarters(self, segment: dict) -> dict:
+        """Source_File -> quarter ordinal for one manifest segment.
+
+        Read from the manifest, which records each file's quarter when it is
+        committed (see ``bom_ingest.member_quarter``).
+        """
+        if all("quarter" in member for member in segment["members"]):
+            return {source_file(member): member["quarter"] for member in segment["members"]}
+        return member_quarters(self._segment_path(segment), self.segment_names(segment))
+
+    def file_quarters(self) -> dict:
+        """Source_File -> quarter ordinal for every file in the history."""
+        quarters = {}
+        for segment in self.manifest["segments"]:
+            quarters.update(self.segment_quarters(segment))
+        return quarters
+
+    def load(
+        self, source_type: str, max_files: Optional[int] = None, segment_rows: Optional[dict] = None, **load_kwargs
+    ) -> pd.DataFrame:
+        """Load the whole history with ``bom_ingest.load_zip``, segment by segment.
+
+        ``segment_rows``, if given, is filled with segment name -> (start,
+        stop) row range of that segment in the returned frame. If a segment
+        file has been removed by a compaction since the manifest was read,
+        the manifest is re-read and the history loaded again.
+        """
+        try:
+            return self._load(source_type, max_files, segment_rows, **load_kwargs)
+        except FileNotFoundError:
+            if not self.manifest_path.exists():
+                raise
+            manifest = self._read_manifest()
+            if manifest == self.manifest:
+                raise
+            logger.info("History compacted while loading; loading the new manifest")
+            self.manifest = manifest
+            if segment_rows is not None:
+                segment_rows.clear()
+            return self._load(source_type, max_files, segment_rows, **load_kwargs)
+
+    def _load(self, source_type: str, max_files: Optional[int], segment_rows: Optional[dict], **load_kwargs) -> pd.DataFrame:
+        frames = []
+        rows = 0
+        for segment in self.manifest["segments"]:
+            if max_files is not None and max_files <= 0:
+                break
+            frames.append(load_zip(
+                self._segment_path(segment), source_type, max_files=max_files, source_names=self.segment_names(segment),
+                **load_kwargs,
+            ))
+            if segment_rows is not None:
+                segment_rows[segment["name"]] = (rows, rows + len(frames[-1]))
+            rows += len(frames[-1])
+            if max_files is not None:
+                max_files -= len(segment["members"])
+        return pd.concat(frames, ignore_index=True) if frames else empty_frame(load_kwargs.get("columns"))
+
+    # === Re-sent files
+    def _plan(self, zip_path: Path, known: set, taken: set, quarter: Optional[int] = None) -> list:
+        """(ZipInfo, manifest entry) for every member of ``zip_path`` a commit
+        would add, given the hashes and Source_Files already ``known`` / ``taken``.
+        ``quarter`` dates the whole archive (see ``bom_ingest.member_quarter``)."""
+        planned, names = [], set()
+        with zipfile.ZipFile(zip_path, "r") as archive:
+            for info in archive.infolist():
+                if not is_bom_member(info):
+                    continue
+                data = archive.read(info)
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in known or info.filename in names:
+                    logger.info(f"Skipping {info.filename}: already in the history store")
+                    continue
+                name = PurePath(info.filename).name
+                if name in taken:
+                    versioned = versioned_name(name, digest)
+                    logger.warning(f"{info.filename} was re-sent with new content; kept as {versioned}")
+                    name = versioned
+                known.add(digest)
+                taken.add(name)
+                names.add(info.filename)
+                planned.append((info, {
+                    "name": info.filename, "sha256": digest, "size": info.file_size, "source_file": name,
+                    "quarter": member_quarter(PurePath(info.filename).name, data, quarter),
+                }))
+        return planned
+
+    def batch_plan(self, zip_path: Path, quarter: Optional[int] = None) -> list:
+        """Manifest entries for the members of ``zip_path`` that ``append_zip``
+        would add now; skipped members are left out."""
+        return [entry for _, entry in self._plan(zip_path, self.hashes, set(self.source_files()), quarter)]
+
+    # === Commits
+    def _commit_manifest(self, manifest: dict) -> None:
+        _write_atomic(self.manifest_path, lambda tmp: tmp.write_text(json.dumps(manifest, indent=1)))
+        self.manifest = manifest
+
+    def _reserve_segment_names(self, count: int) -> list:
+        # Called under the lock; the bumped counter is persisted by the next commit.
+        first = self.manifest["next_segment"]
+        self.manifest["next_segment"] += count
+        return [f"seg-{number:06d}.zip" for number in range(first, first + count)]
+
+    def _record_quarters(self) -> None:
+        # Manifests written before quarters were recorded get them once, from
+        # the same file name / workbook dates a new commit would use.
+        segments = [s for s in self.manifest["segments"] if any("quarter" not in m for m in s["members"])]
+        if not segments:
+            return
+        with self._lock:
+            manifest = json.loads(json.dumps(self.manifest))
+            for segment in manifest["segments"]:
+                if any("quarter" not in member for member in segment["members"]):
+                    quarters = member_quarters(self._segment_path(segment), self.segment_names(segment))
+                    for member in segment["members"]:
+                        member["quarter"] = quarters[source_file(member)]
+            self._commit_manifest(manifest)
+        logger.info(f"Recorded the quarter of every file in {len(segments)} history segments")
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise RuntimeError(f"History store {self.root} was opened read-only")
+
+    def append_zip(self, zip_path: Path, quarter: Optional[int] = None) -> int:
+        """Add the BOM workbooks of ``zip_path`` as a new segment; returns files added.
+
+        Re-sent files follow the policy in the module docstring: known
+        content is skipped, a known name with new content gets a versioned
+        Source_File. Each file's quarter is recorded in the manifest;
+        ``quarter`` dates the whole batch.
+        """
+        self._check_writable()
+        self.purge_retired()
+        with self._lock:
+            planned = self._plan(zip_path, self.hashes, set(self.source_files()), quarter)
+            members = [entry for _, entry in planned]
+            sources = [(Path(zip_path), info) for info, _ in planned]
+            if not members:
+                return 0
+
+            name, = self._reserve_segment_names(1)
+            manifest = json.loads(json.dumps(self.manifest))
+            self.segment_dir.mkdir(parents=True, exist_ok=True)
+            _write_atomic(self.segment_dir / name, lambda tmp: _copy_members(tmp, sources))
+            manifest["segments"].append({
+                "name": name,
+                "source": Path(zip_path).name,
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "members": members,
+            })
+            self._commit_manifest(manifest)
+        logger.info(f"History segment {name} committed with {len(members)} files from {zip_path}")
+        return len(members)
+
+    # === Compaction
+    def needs_compaction(self, max_segments: int = COMPACT_SEGMENTS) -> bool:
+        return len(self.manifest["segments"]) >= max_segments
+
+    def compact(self) -> int:
+        """Merge all current segments into as few as possible; returns segments removed.
+
+        Segments appended while the merge runs are kept after the merged ones.
+        A re-sent file name starts a new output segment, so no archive ever
+        holds two members with the same name. The replaced segments are only
+        retired; ``purge_retired`` deletes them later.
+        """
+        self._check_writable()
+        self.purge_retired()
+        start_time = time.time()
+        with self._lock:
+            snapshot = json.loads(json.dumps(self.manifest["segments"]))
+            if len(snapshot) < 2:
+                return 0
+            groups = [[]]
+            names = set()
+            for segment in snapshot:
+                for member in segment["members"]:
+                    if member["name"] in names:
+                        groups.append([])
+                        names = set()
+                    names.add(member["name"])
+                    groups[-1].append((self.segment_dir / segment["name"], member))
+            new_names = self._reserve_segment_names(len(groups))
+
+        merged = []
+        for name, group in zip(new_names, groups):
+            infos = {}
+            for path, _ in group:
+                if path not in infos:
+                    with zipfile.ZipFile(path, "r") as archive:
+                        infos[path] = {info.filename: info for info in archive.infolist()}
+            sources = [(path, infos[path][member["name"]]) for path, member in group]
+            _write_atomic(self.segment_dir / name, lambda tmp: _copy_members(tmp, sources))
+            merged.append({
+                "name": name,
+                "source": "compaction",
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "members": [member for _, member in group],
+            })
+
+        replaced = {segment["name"] for segment in snapshot}
+        with self._lock:
+            manifest = json.loads(json.dumps(self.manifest))
+            manifest["segments"] = merged + [s for s in manifest["segments"] if s["name"] not in replaced]
+            manifest["retired"] = manifest.get("retired", []) + [{"name": name, "retired": time.time()} for name in sorted(replaced)]
+            self._commit_manifest(manifest)
+        logger.info(f"Compacted {len(snapshot)} history segments into {len(merged)} in {time.time() - start_time:.2f} seconds")
+        return len(snapshot) - len(merged)
+
+    def purge_retired(self, grace: float = RETIRE_SECONDS) -> int:
+        """Delete segment files retired by a compaction more than ``grace`` seconds ago; returns files deleted."""
+        self._check_writable()
+        with self._lock:
+            retired = self.manifest.get("retired", [])
+            expired = {entry["name"] for entry in retired if time.time() - entry["retired"] >= grace}
+            if not expired:
+                return 0
+            manifest = json.loads(json.dumps(self.manifest))
+            manifest["retired"] = [entry for entry in retired if entry["name"] not in expired]
+            self._commit_manifest(manifest)
+            for name in expired:
+                (self.segment_dir / name).unlink(missing_ok=True)
+        logger.info(f"Deleted {len(expired)} history segments retired by compaction")
+        return len(expired)
+
+    def compact_in_background(self) -> threading.Thread:
+        """Run ``compact`` on a worker thread; the interpreter waits for it on exit."""
+        thread = threading.Thread(target=self._compact_logged, name="history-compaction")
+        thread.start()
+        return thread
+
+    def _compact_logged(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"History compaction failed: {e}")
@@ -0,0 +1,169 @@
+"""
+1-to-1 rule engines over (Component, Material) pair items.
+
+Items are the integer pair keys of a ``PairIndex``; every engine returns the
+rules with ``Antecedent`` / ``Consequent`` item keys and mlxtend's
+``support`` / ``confidence`` / ``lift`` columns, and ``mine_rules`` decodes
+them back to the antecedent's Component and the consequent's Material.
+
+mlxtend, scikit-learn and scipy are imported by the engine that needs them,
+so importing this module costs nothing.
+"""
+
+import logging
+import time
+from typing import Optional
+
+import pandas as pd
+
+from .bom_codes import observed_counts
+from .pair_index import PairIndex
+
+logger = logging.getLogger(__name__)
+
+RULE_ENGINES = ("apriori", "fpgrowth", "sparse")
+
+
+def _single_item_rules(rules: pd.DataFrame) -> pd.DataFrame:
+    rules = rules[(rules["antecedents"].apply(lambda x: len(x) == 1)) & (rules["consequents"].apply(lambda x: len(x) == 1))].copy()
+    rules["Antecedent"] = rules["antecedents"].apply(lambda x: list(x)[0])
+    rules["Consequent"] = rules["consequents"].apply(lambda x: list(x)[0])
+    return rules
+
+
+# === Engines
+def mine_apriori(items_df: pd.DataFrame, min_support: float, min_confidence: float) -> pd.DataFrame:
+    """mlxtend Apriori on the dense file x item matrix of ``items_df``."""
+    from mlxtend.frequent_patterns import apriori, association_rules
+    from mlxtend.preprocessing import TransactionEncoder
+
+    # === Group into transactions
+    transaction_df = pd.DataFrame({"File": items_df["Source_File"], "Item": items_df["Item"]})
+    transaction_basket = transaction_df.groupby("File", observed=True)["Item"].apply(list).tolist()
+    transaction_basket = [t for t in transaction_basket if len(t) > 0]
+
+    # === Encode transactions (dense mode)
+    te = TransactionEncoder()
+    te_array = te.fit(transaction_basket).transform(transaction_basket)
+    basket = pd.DataFrame(te_array, columns=te.columns_)
+
+    frequent_itemsets = apriori(basket, min_support=min_support, use_colnames=True)
+    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+    return _single_item_rules(rules)
+
+
+def mine_fpgrowth(items_df: pd.DataFrame, min_support: float, min_confidence: float, max_files: int = 2) -> pd.DataFrame:
+    """mlxtend path: aggressive prefiltering, then FP-Growth on a few files."""
+    from mlxtend.frequent_patterns import association_rules, fpgrowth
+    from scipy.sparse import csr_matrix
+    from sklearn.preprocessing import MultiLabelBinarizer
+
+    # More aggressive filtering
+    logger.info("Applying aggressive filtering")
+    # 1. Filter by component frequency - keep only top 10%
+    component_counts = observed_counts(items_df["Component"])
+    top_components = component_counts[component_counts >= component_counts.quantile(0.9)].index
+    logger.info(f"Selected top {len(top_components)} components")
+
+    # 2. Filter by material frequency - keep only top 10%
+    material_counts = observed_counts(items_df["Material"])
+    top_materials = material_counts[material_counts >= material_counts.quantile(0.9)].index
+    logger.info(f"Selected top {len(top_materials)} materials")
+
+    # 3. Filter by file frequency - keep only top 10%
+    file_counts = observed_counts(items_df["Source_File"])
+    top_files = file_counts[file_counts >= file_counts.quantile(0.9)].index
+    logger.info(f"Selected top {len(top_files)} files")
+
+    # 4. Apply all filters
+    items_df = items_df[
+        (items_df["Component"].isin(top_components)) &
+        (items_df["Material"].isin(top_materials)) &
+        (items_df["Source_File"].isin(top_files))
+    ]
+
+    # Select top N files based on frequency
+    file_counts = observed_counts(items_df["Source_File"])
+    selected_files = file_counts.head(max_files).index
+    items_df = items_df[items_df["Source_File"].isin(selected_files)]
+    logger.info(f"Selected top {len(selected_files)} files for FP-Growth analysis")
+
+    # 5. Filter out rare items with higher threshold
+    item_counts = items_df["Item"].value_counts()
+    frequent_items = item_counts[item_counts >= min_support * len(items_df["Source_File"].unique())].index
+    items_df = items_df[items_df["Item"].isin(frequent_items)]
+    logger.info(f"After filtering: {len(items_df)} rows, {len(frequent_items)} unique items, {len(items_df['Source_File'].unique())} files")
+
+    # Create transaction matrix
+    transaction_df = pd.DataFrame({"File": items_df["Source_File"], "Item": items_df["Item"]})
+    transaction_basket = transaction_df.groupby("File", observed=True)["Item"].apply(list)
+
+    # Convert to sparse matrix with reduced dimensions
+    logger.info("Converting to sparse matrix")
+    mlb = MultiLabelBinarizer()
+    basket_sparse = csr_matrix(mlb.fit_transform(transaction_basket))
+    basket_dummies = pd.DataFrame.sparse.from_spmatrix(basket_sparse, columns=mlb.classes_)
+    # Convert to boolean type for better performance
+    basket_dummies = basket_dummies.astype(bool)
+    logger.info(f"Final matrix shape: {basket_dummies.shape}")
+
+    logger.info("Running FP-Growth algorithm")
+    frequent_itemsets = fpgrowth(basket_dummies, min_support=min_support, use_colnames=True)
+    logger.info(f"Found {len(frequent_itemsets)} frequent itemsets")
+
+    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+    logger.info(f"Generated {len(rules)} rules")
+    return _single_item_rules(rules)
+
+
+def mine_sparse(items_df: pd.DataFrame, min_support: float, min_confidence: float, workers: Optional[int] = None) -> pd.DataFrame:
+    """Pairwise engine: every 1-to-1 rule on the full, unfiltered data."""
+    from .pair_rules import mine_pair_rules
+
+    rules = mine_pair_rules(
+        items_df["Source_File"], items_df["Item"], min_support=min_support, min_confidence=min_confidence, workers=workers,
+    )
+    logger.info(f"Generated {len(rules)} pairwise rules")
+    return rules.rename(columns={"antecedent": "Antecedent", "consequent": "Consequent"})
+
+
+# === Driver
+def mine_rules(
+    df: pd.DataFrame,
+    item_index: PairIndex,
+    engine: str = "sparse",
+    min_support: float = 0.105,
+    min_confidence: float = 0.8,
+    max_files: int = 2,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """Mine 1-to-1 rules between the pairs of ``df`` coded by ``item_index``.
+
+    ``max_files`` bounds the files the fpgrowth engine mines and ``workers``
+    the processes of the sparse engine. The mining time is logged here (and
+    recorded by the caller's telemetry stage), not taken from a script global.
+    """
+    start_time = time.time()
+    items_df = df.assign(Item=item_index.encode(df))
+    if engine == "apriori":
+        rules = mine_apriori(items_df, min_support, min_confidence)
+    elif engine == "fpgrowth":
+        rules = mine_fpgrowth(items_df, min_support, min_confidence, max_files)
+    elif engine == "sparse":
+        rules = mine_sparse(items_df, min_support, min_confidence, workers)
+    else:
+        raise ValueError(f"Unknown rule engine {engine!r}; expected one of {', '.join(RULE_ENGINES)}")
+    rules["Component"] = item_index.decode(rules["Antecedent"])[0]
+    rules["Material"] = item_index.decode(rules["Consequent"])[1]
+    logger.info(f"Mined {len(rules)} rules with the {engine} engine in {time.time() - start_time:.2f} seconds")
+    return rules
+
+
+def rule_sheet(rules: pd.DataFrame, item_status: Optional[pd.Series] = None) -> pd.DataFrame:
+    """The If-Then sheet; with ``item_status`` (Status by item key) the
+    consequent's Status is included."""
+    columns = ["Component", "Material", "support", "confidence", "lift"]
+    if item_status is not None:
+        rules = rules.assign(Status=item_status.loc[rules["Consequent"]].to_numpy())
+        columns.insert(2, "Status")
+    return rules[columns].rename(columns={"support": "Support", "confidence": "Confidence", "lift": "Lift"})
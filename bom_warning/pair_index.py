@@ -0,0 +1,90 @@
+"""
+Integer-coded (Component, Material) pair index.
+
+Replaces the row-wise history lookups in the scripts: pairs are coded against
+the component and material vocabularies of a reference frame and kept as a
+sorted int64 array, so membership and status for a whole frame are a single
+vectorized lookup.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .bom_codes import category_codes
+
+
+class PairIndex:
+    def __init__(self, components: pd.Index, materials: pd.Index, keys: np.ndarray):
+        self.components = components
+        self.materials = materials
+        self.keys = keys
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PairIndex":
+        index = cls(_vocabulary(df["Component"]), _vocabulary(df["Material"]), np.empty(0, dtype=np.int64))
+        index.keys = np.unique(index._keys(df))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def encode(self, df: pd.DataFrame) -> np.ndarray:
+        """Return the int64 pair key of every row.
+
+        Raises ValueError if a row's pair is not in the index, so an unseen
+        pair never turns into a key that decodes to another one; use
+        ``contains`` to test membership.
+        """
+        keys = self._keys(df)
+        unseen = ~self._indexed(keys)
+        if unseen.any():
+            first = df.loc[unseen, ["Component", "Material"]].iloc[0]
+            raise ValueError(
+                f"{int(unseen.sum())} rows have pairs outside the index, e.g. ({first['Component']}, {first['Material']})"
+            )
+        return keys
+
+    def _keys(self, df: pd.DataFrame) -> np.ndarray:
+        # -1 for rows with a code outside the vocabularies
+        component_codes = category_codes(self.components, df["Component"])
+        material_codes = category_codes(self.materials, df["Material"])
+        keys = component_codes.astype(np.int64) * len(self.materials) + material_codes
+        keys[(component_codes < 0) | (material_codes < 0)] = -1
+        return keys
+
+    def decode(self, keys) -> tuple:
+        """Return the (components, materials) arrays for the given pair keys."""
+        keys = np.asarray(keys, dtype=np.int64)
+        component_codes, material_codes = np.divmod(keys, len(self.materials))
+        return self.components.to_numpy()[component_codes], self.materials.to_numpy()[material_codes]
+
+    def contains(self, df: pd.DataFrame) -> np.ndarray:
+        return self._indexed(self._keys(df))
+
+    def _indexed(self, keys: np.ndarray) -> np.ndarray:
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return (keys >= 0) & (self.keys[positions] == keys)
+
+
+def _vocabulary(values: pd.Series) -> pd.Index:
+    # Dictionary-encoded columns already carry their vocabulary.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return pd.Index(values.cat.categories)
+    return pd.Index(values.unique())
+
+
+# === Classification
+def rarity_status(support, support_threshold: float) -> np.ndarray:
+    return np.where(np.asarray(support, dtype=float) < support_threshold, "Rare", "Not Rare")
+
+
+def assign_status(df: pd.DataFrame, history: PairIndex, support_threshold: float, support_column: str = "Support") -> np.ndarray:
+    """New if the pair is not in ``history``, else Rare/Not Rare by support."""
+    is_new = ~history.contains(df)
+    return np.where(is_new, "New", rarity_status(df[support_column], support_threshold))
+
+
+def critical_flag(components: pd.Series, critical_items) -> np.ndarray:
+    return np.where(components.isin(critical_items), "Critical", "Safe")
@@ -0,0 +1,134 @@
+"""
+Direct pairwise rule engine.
+
+Mines every single-item -> single-item rule from the file x item incidence
+matrix without generating frequent itemsets: the co-occurrence counts of all
+item pairs are the sparse Gram product X^T X, computed in column blocks sized
+to a fixed non-zero budget and spread over a process pool. Support, confidence
+and lift use the same definitions (and float arithmetic) as mlxtend's
+association_rules, so the engine can replace the mlxtend path on the full,
+unfiltered history.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix
+
+from .bom_ingest import pool_context
+
+logger = logging.getLogger(__name__)
+
+RULE_COLUMNS = ["antecedent", "consequent", "antecedent support", "consequent support", "support", "confidence", "lift"]
+MAX_BLOCK_NNZ = 20_000_000
+
+
+def incidence_matrix(files, items) -> tuple:
+    """Return the boolean file x item matrix (CSC) and its item labels."""
+    file_codes, _ = pd.factorize(np.asarray(files), sort=False)
+    item_codes, item_labels = pd.factorize(np.asarray(items), sort=True)
+    keep = (file_codes >= 0) & (item_codes >= 0)
+    data = np.ones(int(keep.sum()), dtype=np.int32)
+    matrix = csc_matrix((data, (file_codes[keep], item_codes[keep])), shape=(file_codes.max() + 1, len(item_labels)))
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix, item_labels
+
+
+def column_blocks(matrix: csc_matrix, max_block_nnz: int) -> list:
+    """Split the columns so each block's slice of X^T X stays near the budget.
+
+    A column's Gram row can hold at most the summed lengths of the file rows it
+    touches, which bounds the memory a block needs (a single column costlier
+    than the budget still gets a block of its own).
+    """
+    if matrix.shape[1] == 0:
+        return []
+    row_lengths = np.diff(matrix.tocsr().indptr)
+    cost = np.asarray(matrix.T @ row_lengths).ravel()
+    block_ids = (np.cumsum(cost) - cost) // max(max_block_nnz, 1)
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(block_ids)) + 1, [len(cost)]))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+_matrix = None
+_item_support = None
+
+
+def _init_worker(matrix: csc_matrix, item_support: np.ndarray) -> None:
+    global _matrix, _item_support
+    _matrix, _item_support = matrix, item_support
+
+
+def _mine_block(block: tuple, min_support: float, min_confidence: float) -> tuple:
+    start, stop = block
+    n_files = _matrix.shape[0]
+    gram = (_matrix[:, start:stop].T @ _matrix).tocoo()
+    antecedent = gram.row.astype(np.int64) + start
+    consequent = gram.col.astype(np.int64)
+    support = gram.data / n_files
+    keep = (antecedent != consequent) & (support >= min_support)
+    antecedent, consequent, support = antecedent[keep], consequent[keep], support[keep]
+    confidence = support / _item_support[antecedent]
+    keep = confidence >= min_confidence
+    return antecedent[keep], consequent[keep], support[keep], confidence[keep]
+
+
+def mine_pair_rules(
+    files,
+    items,
+    min_support: float,
+    min_confidence: float,
+    workers: Optional[int] = None,
+    max_block_nnz: int = MAX_BLOCK_NNZ,
+) -> pd.DataFrame:
+    """Mine all 1-to-1 rules between ``items`` co-occurring in ``files``.
+
+    ``files`` and ``items`` are parallel sequences (one entry per BOM row);
+    repeated rows count once per file. Items whose own support is below
+    ``min_support`` cannot take part in a rule and are dropped before the Gram
+    product. The result has one row per rule with mlxtend-style columns.
+    """
+    if len(files) == 0:
+        return pd.DataFrame(columns=RULE_COLUMNS)
+    matrix, labels = incidence_matrix(files, items)
+    n_files = matrix.shape[0]
+    item_counts = np.diff(matrix.indptr)
+    frequent = np.flatnonzero(item_counts / n_files >= min_support)
+    matrix, labels = matrix[:, frequent], labels[frequent]
+    item_support = item_counts[frequent] / n_files
+    blocks = column_blocks(matrix, max_block_nnz)
+    logger.info(f"Pairwise mining over {n_files} files x {len(labels)} frequent items in {len(blocks)} blocks")
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(blocks)),
+            mp_context=pool_context(),
+            initializer=_init_worker,
+            initargs=(matrix, item_support),
+        ) as pool:
+            parts = list(pool.map(_mine_block, blocks, [min_support] * len(blocks), [min_confidence] * len(blocks)))
+    else:
+        _init_worker(matrix, item_support)
+        parts = [_mine_block(block, min_support, min_confidence) for block in blocks]
+
+    if parts:
+        antecedent, consequent, support, confidence = (np.concatenate(arrays) for arrays in zip(*parts))
+    else:
+        antecedent = consequent = np.empty(0, dtype=np.int64)
+        support = confidence = np.empty(0, dtype=float)
+    rules = pd.DataFrame({
+        "antecedent": labels[antecedent],
+        "consequent": labels[consequent],
+        "antecedent support": item_support[antecedent],
+        "consequent support": item_support[consequent],
+        "support": support,
+        "confidence": confidence,
+        "lift": confidence / item_support[consequent],
+    }, columns=RULE_COLUMNS)
+    return rules.sort_values(["antecedent", "consequent"], ignore_index=True)
@@ -0,0 +1,437 @@
+"""
+In-memory stage API.
+
+Each stage of the scripts is a function that takes and returns DataFrames (or
+the small containers below), so stages can be chained in one process without
+writing intermediate workbooks:
+
+    from bom_warning import pipeline
+
+    data = pipeline.normalize(pipeline.ingest(pipeline.InputPaths.under("Input")))
+    metrics = pipeline.update_metrics(data)
+    sheets = pipeline.early_warning_sheets(data, metrics, support_threshold=0.035)
+    pipeline.write_report("Report.xlsx", sheets)
+
+Only numpy and pandas are imported here; the code index, the rule engines
+and openpyxl are loaded by the stages that use them.
+"""
+
+import logging
+import zipfile
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .arm_store import SUPPORT_COLUMNS, ArmMetricStore
+from .bom_codes import code_map_version, encode_frames
+from .bom_hierarchy import HIERARCHY_COLUMNS, ROLLUP_COLUMNS, assembly_rollup, pair_rollup, rollup_frame
+from .bom_ingest import empty_frame, load_zip
+from .bom_stream import stream_into_store
+from .delta_report import CONFIDENCE_TOLERANCE, LIFT_TOLERANCE, quarter_delta, rule_frame
+from .history_store import HistoryStore, content_keys
+from .pair_index import PairIndex, assign_status, critical_flag, rarity_status
+from .report_backends import write_report
+
+logger = logging.getLogger(__name__)
+
+PAIR_KEYS = ["Component", "Material"]
+
+
+# === Inputs
+@dataclass
+class InputPaths:
+    """Where a run reads its inputs and keeps its stores."""
+
+    historical_zip: Path
+    to_be_added_zip: Path
+    critical_items: Path
+    history_store: Path
+    metric_store: Path
+    cache_dir: Path
+    code_index: Path
+    delta_snapshot: Path
+
+    @classmethod
+    def under(cls, input_dir) -> "InputPaths":
+        """The standard layout of an input folder."""
+        input_dir = Path(input_dir)
+        return cls(
+            historical_zip=input_dir / "Historical_BOM.zip",
+            to_be_added_zip=input_dir / "To_be_Added.zip",
+            critical_items=input_dir / "KONE_Critical_Item.xlsx",
+            history_store=input_dir / "History_Store",
+            metric_store=input_dir / "ARM_Store",
+            cache_dir=input_dir / ".bom_cache",
+            code_index=input_dir / "Code_Index",
+            delta_snapshot=input_dir / "Delta_Snapshot",
+        )
+
+
+@dataclass
+class BomData:
+    """The loaded history and To_be_Added batch of one run."""
+
+    hist_df: pd.DataFrame
+    new_df: pd.DataFrame
+    history: HistoryStore
+    paths: InputPaths
+    critical_items: frozenset = frozenset()
+    code_map: Optional[dict] = None  # Set by canonicalize
+    batch_names: Optional[dict] = None  # To_be_Added member -> Source_File (HistoryStore.batch_plan)
+    batch_keys: Optional[dict] = None  # To_be_Added Source_File -> content key
+    batch_quarters: Optional[dict] = None  # To_be_Added Source_File -> quarter ordinal
+    segment_rows: Optional[dict] = None  # History segment -> (start, stop) rows of hist_df
+    rows_loaded: bool = True  # False: frames left empty, update_metrics streams the counts
+
+    @property
+    def rows(self) -> int:
+        return len(self.hist_df) + len(self.new_df)
+
+
+@dataclass
+class Metrics:
+    """The updated metric store and the metric frame read from it."""
+
+    store: ArmMetricStore
+    frame: pd.DataFrame
+    support_mode: str
+    added_files: int
+    count_column: str = "File_Occurrence"
+
+    @property
+    def support_column(self) -> str:
+        return SUPPORT_COLUMNS[self.support_mode]
+
+
+def load_critical_items(path: Path) -> frozenset:
+    critical_df = pd.read_excel(path, engine="openpyxl", dtype=str)
+    return frozenset(critical_df["ItemID_KONE"].dropna().astype(str).str.strip().str.upper())
+
+
+# === Stages
+def ingest(
+    paths: InputPaths,
+    workers: Optional[int] = None,
+    streaming: bool = False,
+    file_times: Optional[dict] = None,
+    include_new: bool = True,
+    max_files: Optional[int] = None,
+    require_description: bool = True,
+    batch_quarter: Optional[int] = None,
+    load_rows: bool = True,
+    columns: Optional[list] = None,
+) -> BomData:
+    """Load the history store (seeded from Historical_BOM.zip) and, with
+    ``include_new``, the To_be_Added batch and the critical item list.
+
+    The batch is read the way the history will commit it: workbooks already
+    in the history are left out, re-sent names get their versioned
+    Source_File (see history_store) and each file is dated as the commit will
+    date it; ``batch_quarter`` dates the whole batch. ``columns`` keeps only
+    those member columns in the frames. Without ``load_rows`` no rows are
+    read at all: the frames are empty and ``update_metrics`` streams the
+    counts from the archives instead.
+    """
+    history = HistoryStore.open(paths.history_store, bootstrap_zip=paths.historical_zip)
+    load_options = dict(
+        cache_dir=paths.cache_dir, workers=workers, require_description=require_description, streaming=streaming,
+        file_times=file_times,
+    )
+    segment_rows = {}
+    if load_rows:
+        hist_df = history.load("Historical", max_files=max_files, segment_rows=segment_rows, columns=columns, **load_options)
+    else:
+        hist_df = empty_frame(columns)
+    if not include_new:
+        return BomData(hist_df, hist_df.iloc[:0], history, paths, segment_rows=segment_rows, rows_loaded=load_rows)
+    plan = history.batch_plan(paths.to_be_added_zip, batch_quarter)
+    batch_names = {entry["name"]: entry["source_file"] for entry in plan}
+    if load_rows:
+        new_df = load_zip(paths.to_be_added_zip, "To_be_Added", source_names=batch_names, columns=columns, **load_options)
+    else:
+        new_df = empty_frame(columns)
+    return BomData(
+        hist_df, new_df, history, paths, load_critical_items(paths.critical_items), batch_names=batch_names,
+        batch_keys=content_keys(plan), batch_quarters={entry["source_file"]: entry["quarter"] for entry in plan},
+        segment_rows=segment_rows, rows_loaded=load_rows,
+    )
+
+
+def canonicalize(data: BomData, index_path: Optional[Path] = None) -> BomData:
+    """Map near-duplicate codes to their canonical code (see code_canonical).
+
+    Codes not indexed before are added to the index at ``index_path``
+    (default: the input folder's Code_Index) and its review table rewritten.
+    """
+    from .code_canonical import CodeIndex
+
+    code_index = CodeIndex.open(index_path or data.paths.code_index)
+    added = code_index.update(data.hist_df, data.new_df)
+    code_index.save()
+    logger.info(f"Code index updated with {added} new codes")
+    return replace(
+        data, hist_df=code_index.apply(data.hist_df), new_df=code_index.apply(data.new_df), code_map=code_index.mappings()
+    )
+
+
+def normalize(data: BomData) -> BomData:
+    """Shared categorical codes for both frames."""
+    hist_df, new_df = encode_frames(data.hist_df, data.new_df)
+    return replace(data, hist_df=hist_df, new_df=new_df)
+
+
+def count_history(
+    store: ArmMetricStore,
+    history: HistoryStore,
+    hist_df: Optional[pd.DataFrame] = None,
+    segment_rows: Optional[dict] = None,
+    code_map: Optional[dict] = None,
+) -> int:
+    """Count the history segments holding files ``store`` has not counted yet.
+
+    Fully counted segments are skipped from the manifest alone, so the cost
+    follows the new segments, not the history. A segment's rows are taken
+    from ``hist_df`` where ``segment_rows`` (see ``HistoryStore.load``) gives
+    their range and streamed from its archive otherwise. Returns the number
+    of files added.
+    """
+    added = 0
+    for path, segment in zip(history.segments, history.manifest["segments"]):
+        names, keys = history.segment_names(segment), history.segment_keys(segment)
+        if not store.new_files(names.values(), keys):
+            continue
+        quarters = history.segment_quarters(segment)
+        rows = (segment_rows or {}).get(segment["name"])
+        if hist_df is not None and rows is not None:
+            added += store.apply_batch(hist_df.iloc[rows[0]:rows[1]], quarters, keys)
+        else:
+            added += stream_into_store(path, store, code_map=code_map, source_names=names, file_keys=keys, quarters=quarters)
+    return added
+
+
+def update_metrics(
+    data: BomData,
+    support_mode: str = "all",
+    window: int = 8,
+    half_life: float = 4,
+    count_column: str = "File_Occurrence",
+    save: bool = True,
+) -> Metrics:
+    """Add the files the ARM metric store has not counted yet and read the metrics.
+
+    Counts come from the loaded frames; only what was not loaded (see
+    ``ingest``'s ``load_rows``) is streamed from the archives, so no workbook
+    is parsed twice. A store counted under another code mapping than
+    ``data.code_map`` is recounted (see arm_store). The saved store holds the
+    committed history only: it
+    is saved (when history files were added) before the To_be_Added batch is
+    counted, and the batch is added in memory for this run's metrics. Once
+    committed, the batch comes back as a history segment under the same
+    Source_Files and content keys and is counted then.
+    """
+    paths = data.paths
+    store = ArmMetricStore.open(paths.metric_store, code_map_version(data.code_map))
+    added = count_history(store, data.history, data.hist_df, data.segment_rows, code_map=data.code_map)
+    if save and added:
+        store.save(paths.metric_store)
+    if data.batch_names:
+        if not data.rows_loaded:
+            added += stream_into_store(
+                paths.to_be_added_zip, store, code_map=data.code_map, source_names=data.batch_names,
+                file_keys=data.batch_keys, quarters=data.batch_quarters,
+            )
+        else:
+            added += store.apply_batch(data.new_df, data.batch_quarters, data.batch_keys)
+    frame = store.to_metrics(
+        count_column=count_column,
+        window=window if support_mode == "window" else None,
+        half_life=half_life if support_mode == "decayed" else None,
+    )
+    logger.info(f"ARM metrics for {store.total_files} files ({added} newly counted)")
+    return Metrics(store, frame, support_mode, added, count_column)
+
+
+def merge_history(history: HistoryStore, to_be_added_zip: Path, clear: bool = False, quarter: Optional[int] = None) -> int:
+    """Commit a To_be_Added batch as a new history segment.
+
+    ``quarter`` dates the whole batch (see ``bom_ingest.member_quarter``).
+    With ``clear`` the batch archive is emptied afterwards. Returns the
+    number of files added.
+    """
+    added = history.append_zip(to_be_added_zip, quarter)
+    if clear:
+        with zipfile.ZipFile(to_be_added_zip, "w"):
+            pass
+    if history.needs_compaction():
+        history.compact_in_background()
+    return added
+
+
+def file_rows(data: BomData, files) -> pd.DataFrame:
+    """Loaded rows of ``files``, scanning only the batch and the history
+    segments holding them (all of ``hist_df`` where a segment's rows are unknown)."""
+    files = set(files)
+    frames = [data.new_df]
+    pending = files - set((data.batch_names or {}).values())
+    for segment in data.history.manifest["segments"]:
+        if not pending:
+            break
+        names = pending.intersection(data.history.segment_names(segment).values())
+        if not names:
+            continue
+        rows = (data.segment_rows or {}).get(segment["name"])
+        if rows is None:
+            break
+        frames.append(data.hist_df.iloc[rows[0]:rows[1]])
+        pending -= names
+    if pending:
+        frames = [data.new_df, data.hist_df]
+    return pd.concat([df[df["Source_File"].isin(files)] for df in frames], ignore_index=True)
+
+
+def delta(
+    data: BomData,
+    metrics: Metrics,
+    support_threshold: float,
+    rules: Optional[pd.DataFrame] = None,
+    item_index: Optional[PairIndex] = None,
+    confidence_tolerance: float = CONFIDENCE_TOLERANCE,
+    lift_tolerance: float = LIFT_TOLERANCE,
+) -> tuple:
+    """Quarter-over-quarter delta sheets (see delta_report) and the advanced
+    snapshot, to be saved once the run has succeeded; ``rules`` are mined
+    rules with item keys from ``item_index``."""
+    rule_table = None
+    if rules is not None:
+        rule_table = rule_frame(
+            item_index.decode(rules["Antecedent"]), item_index.decode(rules["Consequent"]), rules["confidence"], rules["lift"]
+        )
+    return quarter_delta(
+        data.paths.delta_snapshot, lambda files: file_rows(data, files), metrics.store, metrics.frame, support_threshold,
+        data.critical_items, support_mode=metrics.support_mode, support_column=metrics.support_column,
+        count_column=metrics.count_column, rules=rule_table, confidence_tolerance=confidence_tolerance,
+        lift_tolerance=lift_tolerance, code_map_version=metrics.store.code_map_version,
+    )
+
+
+# === Early warning report (pair sheets per source, then assembly roll-ups)
+def early_warning_status(data: BomData, metrics: Metrics, support_threshold: float) -> tuple:
+    """Sheets 1-5 of the early-warning workbook and the BOM nodes with their
+    Status / Critical_Flag for ``early_warning_rollup``."""
+    metrics_df, support_column = metrics.frame, metrics.support_column
+    hist_index = PairIndex.from_frame(data.hist_df)
+    hist_df = data.hist_df.assign(Critical_Flag=critical_flag(data.hist_df["Component"], data.critical_items))
+    add_df = data.new_df.assign(Critical_Flag=critical_flag(data.new_df["Component"], data.critical_items))
+    combined_df = pd.concat([hist_df, add_df], ignore_index=True)
+
+    # === Sheet 1: Historical
+    hist_grouped = hist_df.drop_duplicates(subset=PAIR_KEYS).merge(metrics_df, on=PAIR_KEYS, how="left")
+    hist_grouped["Status"] = rarity_status(hist_grouped[support_column], support_threshold)
+
+    # === Sheet 2: New data + status
+    add_df["Is_New"] = ~hist_index.contains(add_df)
+    add_grouped = add_df.drop_duplicates(subset=PAIR_KEYS).merge(metrics_df, on=PAIR_KEYS, how="left")
+    add_grouped["Status"] = assign_status(add_grouped, hist_index, support_threshold, support_column)
+
+    # === Sheet 3: Merged
+    merged_df = pd.concat([hist_grouped, add_grouped], ignore_index=True)
+
+    # === Sheet 5: Total count with metrics
+    total_df = combined_df.groupby(PAIR_KEYS, observed=True).agg({
+        "Component": "size",
+        "Description / TITLE": "first",
+        "Critical_Flag": "first"
+    }).rename(columns={"Component": "Total_Count"}).reset_index()
+    total_df = total_df.merge(metrics_df, on=PAIR_KEYS, how="left")
+    total_df["Status"] = rarity_status(total_df[support_column], support_threshold)
+
+    nodes = pd.concat([
+        hist_df.merge(hist_grouped[[*PAIR_KEYS, "Status"]], on=PAIR_KEYS, how="left"),
+        add_df.merge(add_grouped[[*PAIR_KEYS, "Status"]], on=PAIR_KEYS, how="left"),
+    ], ignore_index=True)
+    sheets = {
+        "1_Historical": hist_grouped,
+        "2_To_Be_Added": add_grouped,
+        "3_Merged": merged_df,
+        "4_Metrics": metrics_df,
+        "5_Total_Count": total_df,
+    }
+    return sheets, nodes
+
+
+def early_warning_rollup(sheets: dict, nodes: pd.DataFrame) -> dict:
+    """Add the assembly roll-up sheet and the per-pair roll-up columns to sheets 1-3."""
+    rollup = rollup_frame(nodes, nodes["Status"] == "Rare", nodes["Status"] == "New", nodes["Critical_Flag"] == "Critical")
+    pair_df = pair_rollup(nodes, rollup)
+    sheets = dict(sheets)
+    for name in ("1_Historical", "2_To_Be_Added", "3_Merged"):
+        sheets[name] = sheets[name].drop(columns=HIERARCHY_COLUMNS).merge(pair_df, on=PAIR_KEYS, how="left")
+    sheets["6_Assembly_Rollup"] = assembly_rollup(nodes, rollup)
+    return sheets
+
+
+def early_warning_sheets(data: BomData, metrics: Metrics, support_threshold: float) -> dict:
+    return early_warning_rollup(*early_warning_status(data, metrics, support_threshold))
+
+
+def early_warning_highlights(sheets: dict) -> dict:
+    merged_df = sheets["3_Merged"]
+    return {"3_Merged": merged_df["Source_Type"].astype(str).str.contains("To_be_Added", regex=False)}
+
+
+# === FP-Growth report (one row per pair over the whole data)
+def pair_status(data: BomData, metrics: Metrics, support_threshold: float) -> pd.DataFrame:
+    """Every pair's metrics with its sources, description, Critical_Flag and Status."""
+    combined_df = pd.concat([data.hist_df, data.new_df], ignore_index=True)
+    desc_map = combined_df.drop_duplicates(subset=PAIR_KEYS).set_index(PAIR_KEYS)["Description / TITLE"].to_dict()
+    source_map = combined_df.groupby(PAIR_KEYS, observed=True)["Source_File"].apply(lambda x: ", ".join(sorted(set(x)))).reset_index()
+
+    merged = metrics.frame.merge(source_map, on=PAIR_KEYS, how="left")
+    merged["Description / TITLE"] = merged.set_index(PAIR_KEYS).index.map(desc_map)
+    merged["Critical_Flag"] = critical_flag(merged["Component"], data.critical_items)
+    # One vectorized lookup against the historical pair index instead of
+    # filtering hist_df once per row.
+    merged["Status"] = assign_status(merged, PairIndex.from_frame(data.hist_df), support_threshold, metrics.support_column)
+    return merged
+
+
+def pair_rollup_status(data: BomData, merged: pd.DataFrame) -> tuple:
+    """``merged`` with the per-pair roll-up columns, and the assembly roll-up sheet."""
+    combined_df = pd.concat([data.hist_df, data.new_df], ignore_index=True)
+    nodes = combined_df.merge(merged[[*PAIR_KEYS, "Status", "Critical_Flag"]], on=PAIR_KEYS, how="left")
+    rollup = rollup_frame(nodes, nodes["Status"] == "Rare", nodes["Status"] == "New", nodes["Critical_Flag"] == "Critical")
+    return merged.merge(pair_rollup(nodes, rollup), on=PAIR_KEYS, how="left"), assembly_rollup(nodes, rollup)
+
+
+def fp_growth_sheets(data: BomData, merged: pd.DataFrame, final_rules: pd.DataFrame, assembly_df: pd.DataFrame) -> tuple:
+    """The FP-Growth workbook's sheets and their highlights."""
+    time_columns = [c for c in merged.columns if c.startswith(("Window_", "Decayed_"))]  # Only with support_mode != "all"
+    sheet1 = merged[[
+        "Component", "Material", "Count", "Support", "Confidence", *time_columns, "Source_File", "Description / TITLE",
+        "Critical_Flag", "Status", *ROLLUP_COLUMNS[1:],
+    ]]
+    sheet2 = sheet1[sheet1["Status"] == "New"]
+    sheet3 = merged[["Component", "Material", "Count", "Support", "Confidence", "Support_Confidence_Sum"]].sort_values("Support_Confidence_Sum", ascending=False)
+    sheet4 = pd.concat([data.hist_df, data.new_df], ignore_index=True).drop(columns=HIERARCHY_COLUMNS)
+    sheets = {
+        "All_BOMs_Combined": sheet1,
+        "To_be_Added_Only": sheet2,
+        "Material_Summary": sheet3,
+        "Merged_Sheet": sheet4,
+        "Apriori_IfThen": final_rules,
+        "Assembly_Rollup": assembly_df,
+    }
+    highlights = {
+        "All_BOMs_Combined": sheet1["Status"] == "New",
+        "Merged_Sheet": sheet4["Source_Type"] == "To_be_Added",
+    }
+    return sheets, highlights
+
+
+__all__ = [
+    "BomData", "InputPaths", "Metrics", "canonicalize", "count_history", "delta", "early_warning_highlights",
+    "early_warning_rollup", "early_warning_sheets", "early_warning_status", "fp_growth_sheets", "ingest",
+    "load_critical_items", "merge_history", "normalize", "pair_rollup_status", "pair_status", "update_metrics", "write_report",
+]
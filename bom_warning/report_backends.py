@@ -0,0 +1,132 @@
+"""
+Pluggable output backends for the report sheets.
+
+Every script produces a handful of named sheets; ``write_report`` hands the
+same ``{sheet name: frame}`` mapping to each requested backend:
+
+- ``xlsx``:    the highlighted workbook (``report_writer``), as before
+- ``parquet``: one dataset directory per sheet under ``<report>_parquet/``,
+               hive-partitioned by Source_Type or Status where the sheet has one
+- ``csv``:     one file per sheet under ``<report>_csv/``
+- ``sqlite``:  one table per sheet in ``<report>.sqlite``, indexed on
+               (Component, Material) so dashboards can query pairs directly
+
+Each backend builds its output next to the target and swaps it in whole, so a
+reader never sees a half-written report.
+"""
+
+import logging
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("xlsx", "parquet", "csv", "sqlite")
+INDEX_COLUMNS = ["Component", "Material"]
+PARTITION_COLUMNS = ["Source_Type", "Status"]
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    """Decode categorical columns for backends without a dictionary type."""
+    categorical = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.astype({c: object for c in categorical})
+
+
+def _replace_dir(tmp: Path, path: Path) -> None:
+    old = path.with_name(path.name + ".old")
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _fresh_dir(path: Path) -> Path:
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+# === Backends
+def write_xlsx(report_path: Path, sheets: dict, highlights: dict) -> Path:
+    from .report_writer import write_excel_report  # openpyxl is only loaded for workbooks
+
+    tmp = report_path.with_name(f"{report_path.stem}.{os.getpid()}.tmp{report_path.suffix}")
+    try:
+        write_excel_report(tmp, sheets, highlights)
+        os.replace(tmp, report_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return report_path
+
+
+def write_parquet(report_path: Path, sheets: dict, highlights: dict) -> Path:
+    path = report_path.with_name(report_path.stem + "_parquet")
+    tmp = _fresh_dir(path)
+    for name, df in sheets.items():
+        partition = next((c for c in PARTITION_COLUMNS if c in df.columns), None)
+        if partition is None or df.empty:
+            (tmp / name).mkdir()
+            df.to_parquet(tmp / name / "part-0.parquet", index=False)
+        else:
+            df.to_parquet(tmp / name, index=False, partition_cols=[partition])
+    _replace_dir(tmp, path)
+    return path
+
+
+def write_csv(report_path: Path, sheets: dict, highlights: dict) -> Path:
+    path = report_path.with_name(report_path.stem + "_csv")
+    tmp = _fresh_dir(path)
+    for name, df in sheets.items():
+        df.to_csv(tmp / f"{name}.csv", index=False)
+    _replace_dir(tmp, path)
+    return path
+
+
+def write_sqlite(report_path: Path, sheets: dict, highlights: dict) -> Path:
+    path = report_path.with_suffix(".sqlite")
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    with sqlite3.connect(tmp) as con:
+        for name, df in sheets.items():
+            _plain(df).to_sql(name, con, index=False)
+            keys = [c for c in INDEX_COLUMNS if c in df.columns]
+            if keys:
+                columns = ", ".join(f'"{c}"' for c in keys)
+                con.execute(f'CREATE INDEX "{name}_{"_".join(keys)}" ON "{name}" ({columns})')
+    con.close()
+    os.replace(tmp, path)
+    return path
+
+
+BACKENDS = {
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "csv": write_csv,
+    "sqlite": write_sqlite,
+}
+
+
+def write_report(report_path: Path, sheets: dict, formats=("xlsx",), highlights: Optional[dict] = None) -> list:
+    """Write ``sheets`` with every backend in ``formats``; returns the paths written.
+
+    ``report_path`` is the workbook path; the other backends derive their
+    output names from it. ``highlights`` only affects the Excel workbook.
+    """
+    unknown = [f for f in formats if f not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown output format(s) {unknown}; choose from {list(OUTPUT_FORMATS)}")
+    report_path = Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    written = []
+    for fmt in formats:
+        written.append(BACKENDS[fmt](report_path, sheets, highlights or {}))
+        logger.info(f"Report written as {fmt}: {written[-1]}")
+    return written
@@ -0,0 +1,113 @@
+"""
+Single-pass streaming Excel report writer.
+
+Writes every sheet with openpyxl's write-only workbook, so rows are streamed
+to disk instead of held as cell objects, and applies the row highlighting as
+the rows are written -- no save / load_workbook / restyle / save cycle. Header
+cells get pandas' default ``to_excel`` style (bold, thin border, centred), so
+the workbooks look as they did. A sheet that would exceed Excel's row limit
+continues on numbered sheets ("3_Merged", "3_Merged_2", ...).
+"""
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+logger = logging.getLogger(__name__)
+
+EXCEL_MAX_ROWS = 1_048_576
+SHEET_NAME_LIMIT = 31
+CHUNK_ROWS = 50_000
+
+GREEN_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+# pandas' ExcelFormatter header style (the to_excel default before pandas 3)
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(*(Side(style="thin"),) * 4)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def continuation_name(name: str, part: int) -> str:
+    """Sheet name for part ``part`` (1-based) of a split sheet."""
+    if part == 1:
+        return name[:SHEET_NAME_LIMIT]
+    suffix = f"_{part}"
+    return name[:SHEET_NAME_LIMIT - len(suffix)] + suffix
+
+
+class ExcelReportWriter:
+    def __init__(self, path: Path, max_rows: int = EXCEL_MAX_ROWS):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+
+    def __enter__(self) -> "ExcelReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+
+    def close(self) -> None:
+        self.workbook.save(self.path)
+
+    def write_sheet(self, name: str, df: pd.DataFrame, highlight=None, fill: PatternFill = GREEN_FILL) -> list:
+        """Stream ``df`` into one or more sheets; returns the sheet names used.
+
+        ``highlight`` is an optional boolean mask aligned with ``df``'s rows;
+        matching rows get ``fill`` on every cell as they are written.
+        """
+        mask = np.zeros(len(df), dtype=bool) if highlight is None else np.asarray(highlight, dtype=bool)
+        rows_per_sheet = self.max_rows - 1
+        parts = max(1, -(-len(df) // rows_per_sheet))
+        names = []
+        for part in range(parts):
+            sheet_name = continuation_name(name, part + 1)
+            sheet = self.workbook.create_sheet(sheet_name)
+            sheet.append(self._header_row(sheet, df.columns))
+            start = part * rows_per_sheet
+            stop = min(start + rows_per_sheet, len(df))
+            for chunk_start in range(start, stop, CHUNK_ROWS):
+                chunk_stop = min(chunk_start + CHUNK_ROWS, stop)
+                chunk = df.iloc[chunk_start:chunk_stop]
+                values = chunk.astype(object).where(chunk.notna(), None)
+                for row, styled in zip(values.itertuples(index=False, name=None), mask[chunk_start:chunk_stop]):
+                    sheet.append(self._styled_row(sheet, row, fill) if styled else list(row))
+            names.append(sheet_name)
+        if parts > 1:
+            logger.info(f"Sheet {name} split into {parts} sheets of at most {rows_per_sheet} rows")
+        return names
+
+    @staticmethod
+    def _header_row(sheet, columns) -> list:
+        cells = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font, cell.border, cell.alignment = HEADER_FONT, HEADER_BORDER, HEADER_ALIGNMENT
+            cells.append(cell)
+        return cells
+
+    @staticmethod
+    def _styled_row(sheet, row, fill: PatternFill) -> list:
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.fill = fill
+            cells.append(cell)
+        return cells
+
+
+def write_excel_report(path: Path, sheets: dict, highlights: Optional[dict] = None) -> None:
+    """Write ``{sheet name: frame}`` to ``path`` in one pass.
+
+    ``highlights`` maps sheet names to boolean row masks for the green fill.
+    """
+    highlights = highlights or {}
+    with ExcelReportWriter(path) as writer:
+        for name, df in sheets.items():
+            writer.write_sheet(name, df, highlight=highlights.get(name))
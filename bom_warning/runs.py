@@ -0,0 +1,222 @@
+"""
+End-to-end runs behind the three scripts and ``bom-warning report`` / ``mine``.
+
+A run chains the ``pipeline`` stages in memory, times each one with
+``RunTelemetry`` and writes its report through the output backends.
+``RunSettings`` carries what used to be the scripts' module-level
+configuration.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from . import pipeline
+from .mining import mine_rules, rule_sheet
+from .pair_index import PairIndex
+from .report_backends import write_report
+from .telemetry import RunTelemetry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RunSettings:
+    paths: pipeline.InputPaths
+    output: Path
+    support_threshold: float = 0.035  # Rare below this support
+    support_mode: str = "all"  # Status from "all" history, the last window_quarters ("window") or "decayed" support
+    window_quarters: int = 8
+    decay_half_life: float = 4  # Quarters after which a quarter's counts weigh half
+    ingest_workers: Optional[int] = None  # Parser processes (None = all cores)
+    canonicalize_codes: bool = False  # Merge near-duplicate Component / Material codes
+    rule_engine: str = "fpgrowth"  # "apriori", "fpgrowth" or "sparse" (see mining)
+    rule_min_support: Optional[float] = None  # Default: 3 x support_threshold
+    rule_min_confidence: float = 0.8
+    max_files: Optional[int] = None  # Files mined by the mlxtend engines
+    mining_workers: Optional[int] = None  # Pairwise engine processes (None = all cores)
+    rule_confidence_tolerance: float = pipeline.CONFIDENCE_TOLERANCE
+    rule_lift_tolerance: float = pipeline.LIFT_TOLERANCE
+    delta_output: Optional[Path] = None  # Quarter delta report (None = no delta)
+    merge_history: bool = True  # Commit To_be_Added as a history segment
+    batch_quarter: Optional[int] = None  # Quarter ordinal of the whole batch (None = from file names / workbook dates)
+    output_formats: tuple = ("xlsx",)  # Any of "xlsx", "parquet", "csv", "sqlite"
+    telemetry_path: Optional[Path] = None  # Per-stage run report (.json or .csv)
+    profile_stages: tuple = field(default_factory=tuple)  # Stages to run under cProfile
+    trace_memory: bool = False  # Per-stage tracemalloc peak in the telemetry (slower)
+
+    @property
+    def min_rule_support(self) -> float:
+        return self.rule_min_support if self.rule_min_support is not None else self.support_threshold * 3
+
+
+def _telemetry(name: str, settings: RunSettings) -> RunTelemetry:
+    profile_dir = settings.telemetry_path.parent if settings.telemetry_path is not None else settings.output.parent
+    return RunTelemetry(name, profile=settings.profile_stages, profile_dir=profile_dir, trace_memory=settings.trace_memory)
+
+
+def _finish(telemetry: RunTelemetry, settings: RunSettings) -> None:
+    if settings.telemetry_path is not None:
+        telemetry.write(settings.telemetry_path)
+
+
+def _load(telemetry: RunTelemetry, settings: RunSettings, **ingest_kwargs) -> pipeline.BomData:
+    with telemetry.stage("load") as stage:
+        data = pipeline.ingest(
+            settings.paths, workers=settings.ingest_workers, file_times=stage.file_times,
+            batch_quarter=settings.batch_quarter, **ingest_kwargs,
+        )
+        stage.rows_out = data.rows
+    if settings.canonicalize_codes:
+        # Spelling variants and revision suffixes of one code are mapped to a
+        # single canonical code before anything is counted.
+        with telemetry.stage("canonicalize", rows_in=data.rows) as stage:
+            data = pipeline.canonicalize(data)
+            stage.rows_out = data.rows
+    with telemetry.stage("normalize", rows_in=data.rows) as stage:
+        data = pipeline.normalize(data)
+        stage.rows_out = data.rows
+    return data
+
+
+def _metrics(telemetry: RunTelemetry, settings: RunSettings, data: pipeline.BomData, count_column: str) -> pipeline.Metrics:
+    # Only files the store has not counted yet are aggregated; the rest of the
+    # history is already in its counters.
+    with telemetry.stage("metrics", rows_in=data.rows) as stage:
+        metrics = pipeline.update_metrics(
+            data, support_mode=settings.support_mode, window=settings.window_quarters,
+            half_life=settings.decay_half_life, count_column=count_column,
+        )
+        stage.rows_out = len(metrics.frame)
+    return metrics
+
+
+def _delta(telemetry: RunTelemetry, settings: RunSettings, data, metrics, **rule_kwargs):
+    """Write the delta report; returns the advanced snapshot (None without a delta)."""
+    if settings.delta_output is None:
+        return None
+    with telemetry.stage("delta", rows_in=len(data.new_df)) as stage:
+        delta_sheets, snapshot = pipeline.delta(
+            data, metrics, settings.support_threshold, confidence_tolerance=settings.rule_confidence_tolerance,
+            lift_tolerance=settings.rule_lift_tolerance, **rule_kwargs,
+        )
+        write_report(settings.delta_output, delta_sheets, formats=settings.output_formats)
+        stage.rows_out = sum(len(df) for df in delta_sheets.values())
+    return snapshot
+
+
+def _merge_history(telemetry: RunTelemetry, settings: RunSettings, data, clear: bool, snapshot=None) -> None:
+    if settings.merge_history:
+        with telemetry.stage("history_commit") as stage:
+            stage.rows_out = pipeline.merge_history(
+                data.history, settings.paths.to_be_added_zip, clear=clear, quarter=settings.batch_quarter,
+            )
+        logger.info(f"History store updated at {settings.paths.history_store} ({data.history.total_files} files)")
+    # The delta snapshot only advances once the report is out and the batch
+    # committed; after a failed run the next one compares against the old one.
+    if snapshot is not None:
+        snapshot.save()
+
+
+# === Runs
+def run_early_warning(settings: RunSettings) -> dict:
+    """Early_warning.py: pair sheets per source with Rare / New / Critical
+    status and assembly roll-ups. Returns the report sheets."""
+    telemetry = _telemetry("early_warning", settings)
+    data = _load(telemetry, settings)
+    metrics = _metrics(telemetry, settings, data, "File_Occurrence")
+    snapshot = _delta(telemetry, settings, data, metrics)
+
+    with telemetry.stage("status", rows_in=data.rows) as stage:
+        sheets, nodes = pipeline.early_warning_status(data, metrics, settings.support_threshold)
+        stage.rows_out = len(sheets["3_Merged"]) + len(sheets["5_Total_Count"])
+    # Every BOM row is a node; Rare / New / Critical descendants are counted
+    # per assembly and, worst case per pair, added to sheets 1-3.
+    with telemetry.stage("hierarchy", rows_in=data.rows) as stage:
+        sheets = pipeline.early_warning_rollup(sheets, nodes)
+        stage.rows_out = len(sheets["6_Assembly_Rollup"])
+
+    # Excel: single pass, To_be_Added rows highlighted in green as they are written
+    with telemetry.stage("export", rows_in=sum(len(df) for df in sheets.values())) as stage:
+        write_report(settings.output, sheets, formats=settings.output_formats, highlights=pipeline.early_warning_highlights(sheets))
+        stage.rows_out = stage.rows_in
+
+    # === Permanent merge step: once the report is out, the To_be_Added batch
+    # becomes a new history segment (a failed run leaves the history untouched)
+    _merge_history(telemetry, settings, data, clear=False, snapshot=snapshot)
+    _finish(telemetry, settings)
+    return sheets
+
+
+def run_fp_growth(settings: RunSettings) -> dict:
+    """FP-Growth_version.py: one row per pair over history and batch, the
+    If-Then rules and assembly roll-ups. Returns the report sheets."""
+    telemetry = _telemetry("fp_growth", settings)
+    data = _load(telemetry, settings)
+    metrics = _metrics(telemetry, settings, data, "Count")
+
+    with telemetry.stage("status", rows_in=len(metrics.frame)) as stage:
+        merged = pipeline.pair_status(data, metrics, settings.support_threshold)
+        stage.rows_out = len(merged)
+    with telemetry.stage("hierarchy", rows_in=data.rows) as stage:
+        merged, assembly_df = pipeline.pair_rollup_status(data, merged)
+        stage.rows_out = len(assembly_df)
+
+    logger.info(f"Starting rule mining ({settings.rule_engine})")
+    with telemetry.stage("mining", rows_in=data.rows) as stage:
+        # Every (Component, Material) pair carries exactly one Status, so the integer
+        # pair key is the item; strings are decoded again once the rules are mined.
+        item_index = PairIndex.from_frame(merged)
+        item_status = pd.Series(merged["Status"].to_numpy(), index=item_index.encode(merged))
+        rules = mine_rules(
+            pd.concat([data.hist_df, data.new_df], ignore_index=True), item_index, engine=settings.rule_engine,
+            min_support=settings.min_rule_support, min_confidence=settings.rule_min_confidence,
+            max_files=settings.max_files or 2, workers=settings.mining_workers,
+        )
+        final_rules = rule_sheet(rules, item_status)
+        stage.rows_out = len(final_rules)
+
+    snapshot = _delta(telemetry, settings, data, metrics, rules=rules, item_index=item_index)
+
+    # Excel: single pass, new entries highlighted as they are written
+    sheets, highlights = pipeline.fp_growth_sheets(data, merged, final_rules, assembly_df)
+    logger.info(f"Writing results as {', '.join(settings.output_formats)}")
+    with telemetry.stage("export", rows_in=sum(len(df) for df in sheets.values())) as stage:
+        write_report(settings.output, sheets, formats=settings.output_formats, highlights=highlights)
+        stage.rows_out = stage.rows_in
+
+    # Commit the new files as a history segment, then clear to_be_added
+    _merge_history(telemetry, settings, data, clear=True, snapshot=snapshot)
+    _finish(telemetry, settings)
+    return sheets
+
+
+def run_rules(settings: RunSettings) -> dict:
+    """Apriori_version.py: If-Then rules mined from the history alone.
+
+    The mlxtend engines only read the first ``max_files`` workbooks; the
+    sparse engine reads the whole history.
+    """
+    telemetry = _telemetry("apriori", settings)
+    data = _load(
+        telemetry, settings, include_new=False, require_description=False, columns=["Component", "Material"],
+        max_files=None if settings.rule_engine == "sparse" else settings.max_files,
+    )
+    with telemetry.stage("mining", rows_in=data.rows) as stage:
+        pair_index = PairIndex.from_frame(data.hist_df)
+        rules = mine_rules(
+            data.hist_df, pair_index, engine=settings.rule_engine, min_support=settings.min_rule_support,
+            min_confidence=settings.rule_min_confidence, max_files=settings.max_files or 2,
+            workers=settings.mining_workers,
+        )
+        final_rules = rule_sheet(rules)
+        stage.rows_out = len(final_rules)
+    sheets = {"Apriori_IfThen": final_rules}
+    with telemetry.stage("export", rows_in=len(final_rules)) as stage:
+        write_report(settings.output, sheets, formats=settings.output_formats)
+        stage.rows_out = len(final_rules)
+    _finish(telemetry, settings)
+    return sheets
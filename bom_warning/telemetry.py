@@ -0,0 +1,203 @@
+"""
+Per-stage run telemetry for the three pipelines.
+
+Each script wraps its stages in ``telemetry.stage(...)``; every stage records
+wall time, CPU time (this process plus finished worker processes), the
+process's peak RSS so far, input / output row counts and, for the load
+stages, per-file parse times keyed by (archive, member). The peak RSS
+(VmHWM on Linux, else ``ru_maxrss``) is a high-water mark for the whole
+process lifetime, so ``process_peak_rss_mb`` never goes down from one stage
+to the next; ``rss_growth_mb`` is how far the stage raised it. With ``trace_memory`` each stage also records
+``stage_peak_mb``, the tracemalloc peak of the allocations made inside the
+stage (Python objects and numpy buffers; slower, so off by default).
+``write`` saves the run report as JSON, or as CSV (one row per stage, plus a
+``*_files.csv`` with the parse times). Stages named in ``profile`` also run
+under cProfile, or under pyinstrument's sampling profiler when it is
+installed and selected; profiles are written next to the report.
+"""
+
+import cProfile
+import csv
+import importlib.util
+import json
+import logging
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ("cprofile", "pyinstrument")
+STAGE_COLUMNS = [
+    "stage", "wall_seconds", "cpu_seconds", "process_peak_rss_mb", "rss_growth_mb", "stage_peak_mb",
+    "rows_in", "rows_out", "files_parsed", "parse_seconds", "slowest_file", "profile",
+]
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # Linux carries ru_maxrss over exec, so a process started from a large one
+    # would report its parent's peak; VmHWM is this process image's own.
+    if who == resource.RUSAGE_SELF and sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/status") as status:
+                for line in status:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def _cpu_seconds() -> float:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    process_peak_rss_mb: float = 0.0  # Process-lifetime high-water mark at the end of the stage
+    rss_growth_mb: float = 0.0
+    stage_peak_mb: Optional[float] = None  # tracemalloc peak within the stage (trace_memory only)
+    profile: Optional[str] = None
+    file_times: dict = field(default_factory=dict)  # (archive, member) -> seconds, filled by load_zip(file_times=...)
+
+    def summary(self) -> dict:
+        row = {k: v for k, v in asdict(self).items() if k != "file_times"}
+        row["files_parsed"] = len(self.file_times)
+        row["parse_seconds"] = round(sum(self.file_times.values()), 4)
+        row["slowest_file"] = "/".join(max(self.file_times, key=self.file_times.get)) if self.file_times else None
+        return row
+
+    def file_rows(self) -> list:
+        return [
+            {"source": source, "file": name, "parse_seconds": round(seconds, 4)}
+            for (source, name), seconds in self.file_times.items()
+        ]
+
+
+class RunTelemetry:
+    def __init__(
+        self,
+        pipeline: str,
+        profile=(),
+        profiler: str = "cprofile",
+        profile_dir: Optional[Path] = None,
+        trace_memory: bool = False,
+    ):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}; choose from {list(PROFILERS)}")
+        if profiler == "pyinstrument" and importlib.util.find_spec("pyinstrument") is None:
+            logger.warning("pyinstrument is not installed; profiling stages with cProfile")
+            profiler = "cprofile"
+        self.pipeline = pipeline
+        self.profile = set(profile)
+        self.profiler = profiler
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.trace_memory = trace_memory
+        self.started = datetime.now()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """Time the enclosed block; set ``rows_out`` (and ``file_times``) on the yielded record."""
+        record = StageRecord(name, rows_in=rows_in)
+        profiler = self._start_profiler(name)
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        rss_before = _peak_rss_mb()
+        cpu_before = _cpu_seconds()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.wall_seconds = round(time.perf_counter() - start, 4)
+            record.cpu_seconds = round(_cpu_seconds() - cpu_before, 4)
+            record.process_peak_rss_mb = round(max(_peak_rss_mb(), _peak_rss_mb(resource.RUSAGE_CHILDREN)), 2)
+            record.rss_growth_mb = round(_peak_rss_mb() - rss_before, 2)
+            if tracing:
+                record.stage_peak_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+                tracemalloc.stop()
+            if profiler is not None:
+                record.profile = self._stop_profiler(name, profiler)
+            self.stages.append(record)
+            logger.info(
+                f"[{self.pipeline}] {name}: {record.wall_seconds:.2f}s wall, {record.cpu_seconds:.2f}s CPU, "
+                f"process peak RSS {record.process_peak_rss_mb:.0f} MB"
+                + (f", stage peak {record.stage_peak_mb:.0f} MB" if record.stage_peak_mb is not None else "")
+                + f", rows {record.rows_in} -> {record.rows_out}"
+            )
+
+    # === Profiling hook
+    def _start_profiler(self, name: str):
+        if name not in self.profile and "all" not in self.profile:
+            return None
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, name: str, profiler) -> str:
+        out_dir = self.profile_dir or Path(".")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.pipeline}_{name}_{self.started:%Y%m%d_%H%M%S}"
+        if self.profiler == "pyinstrument":
+            profiler.stop()
+            path = out_dir / f"{stem}.html"
+            path.write_text(profiler.output_html())
+        else:
+            profiler.disable()
+            path = out_dir / f"{stem}.prof"
+            profiler.dump_stats(path)
+        return str(path)
+
+    # === Run report
+    def report(self) -> dict:
+        return {
+            "pipeline": self.pipeline,
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "total_wall_seconds": round(sum(s.wall_seconds for s in self.stages), 4),
+            "process_peak_rss_mb": max((s.process_peak_rss_mb for s in self.stages), default=0.0),
+            "stages": [{**s.summary(), "file_times": s.file_rows()} for s in self.stages],
+        }
+
+    def write(self, path: Path) -> Path:
+        """Write the run report; ``.csv`` gives flat tables, anything else JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=STAGE_COLUMNS, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(s.summary() for s in self.stages)
+            with open(path.with_name(f"{path.stem}_files.csv"), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=["stage", "source", "file", "parse_seconds"])
+                writer.writeheader()
+                for s in self.stages:
+                    writer.writerows({"stage": s.stage, **row} for row in s.file_rows())
+        else:
+            path.write_text(json.dumps(self.report(), indent=1))
+        logger.info(f"Run telemetry written to {path}")
+        return path
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Threshold sweep: Rare / Not Rare and rule counts for a whole grid of settings.
+
+Counts are computed once -- pair supports come from the ARM metric store and
+the rules from a single pairwise mining pass at the loosest grid point -- and
+every grid point is then answered by binary search over the sorted supports
+and confidences. The summary shows, per setting, how many pairs are Rare and
+how many pairs and rules flip relative to the configured baseline, so tuning
+``support_threshold`` / ``min_support`` / the confidence cutoff takes one run.
+
+    bom-warning sweep --input-dir /Users/mahtab/Desktop/AIRE/Input \\
+        --support 0.01:0.08:0.005 --rule-support 0.05:0.2:0.025 --confidence 0.5:0.9:0.1
+
+Only the sparse engine is swept: rule counts come from the pairwise miner
+on the full history, i.e. the ``rule_engine = "sparse"`` setting of the
+scripts. The mlxtend Apriori / FP-Growth engines read only the first
+``max_files`` workbooks and can give other counts; the Rule_Sweep sheet
+carries the engine in its Rule_Engine column. ``--support-mode`` sweeps the
+windowed or decayed support instead of the all-history one.
+
+Nothing is written to the stores: the history is opened read-only (an
+unbootstrapped Historical_BOM.zip is read in place) and the metric store is
+never saved.
+"""
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .arm_store import SUPPORT_COLUMNS, ArmMetricStore, parse_quarter
+from .bom_codes import encode_frames
+from .bom_ingest import load_zip
+from .history_store import HistoryStore, content_keys
+from .pair_index import PairIndex
+from .pair_rules import mine_pair_rules
+from .report_backends import OUTPUT_FORMATS, write_report
+
+logger = logging.getLogger(__name__)
+
+BASELINE_SUPPORT = 0.035  # support_threshold / min_support in the scripts
+BASELINE_RULE_SUPPORT = BASELINE_SUPPORT * 3
+BASELINE_CONFIDENCE = 0.8
+RULE_ENGINE = "sparse"  # the only engine the rule sweep mines with
+
+
+def parse_grid(spec: str) -> np.ndarray:
+    """``"0.01:0.1:0.005"`` (inclusive range) or ``"0.02,0.035,0.05"``."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = np.array([float(x) for x in spec.split(",")])
+    return np.unique(np.round(values, 6))
+
+
+def _count_below(sorted_values: np.ndarray, thresholds) -> np.ndarray:
+    return np.searchsorted(sorted_values, thresholds, side="left")
+
+
+# === Rare / Not Rare
+def sweep_status(
+    metrics: pd.DataFrame, is_new: np.ndarray, thresholds, baseline: float = BASELINE_SUPPORT, support_column: str = "Support"
+) -> pd.DataFrame:
+    """Status counts per support threshold.
+
+    ``is_new`` marks pairs absent from the history; they are New at every
+    threshold. A pair flips between thresholds a and b when its support lies
+    in [min(a, b), max(a, b)).
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    support = np.sort(metrics[support_column].to_numpy(dtype=float)[~is_new])
+    rare = _count_below(support, thresholds)
+    baseline_rare = _count_below(support, [baseline])[0]
+    previous_rare = np.concatenate(([rare[0]], rare[:-1])) if len(rare) else rare
+    return pd.DataFrame({
+        "Support_Threshold": thresholds,
+        "Rare_Pairs": rare,
+        "Not_Rare_Pairs": len(support) - rare,
+        "New_Pairs": int(is_new.sum()),
+        "Flipped_vs_Baseline": np.abs(rare - baseline_rare),
+        "Flipped_vs_Previous": np.abs(rare - previous_rare),
+    })
+
+
+# === Rules
+def sweep_rules(
+    rules: pd.DataFrame,
+    supports,
+    confidences,
+    baseline: tuple = (BASELINE_RULE_SUPPORT, BASELINE_CONFIDENCE),
+) -> pd.DataFrame:
+    """Rule counts per (min support, min confidence) from one mined superset.
+
+    ``rules`` must have been mined at or below every grid value. Rule sets
+    shrink monotonically with both thresholds, so the overlap with the
+    baseline set is itself a count at the element-wise maximum.
+    """
+    support = rules["support"].to_numpy(dtype=float)
+    confidence = rules["confidence"].to_numpy(dtype=float)
+    order = np.argsort(support)
+    support, confidence = support[order], confidence[order]
+
+    def count(min_support: float, min_confidence: float) -> int:
+        start = np.searchsorted(support, min_support, side="left")
+        return int((confidence[start:] >= min_confidence).sum())
+
+    base_support, base_confidence = baseline
+    baseline_rules = count(base_support, base_confidence)
+    rows = []
+    for s in supports:
+        for c in confidences:
+            n = count(s, c)
+            shared = count(max(s, base_support), max(c, base_confidence))
+            rows.append((RULE_ENGINE, s, c, n, n - shared, baseline_rules - shared))
+    return pd.DataFrame(
+        rows,
+        columns=["Rule_Engine", "Min_Support", "Min_Confidence", "Rules", "Rules_Gained_vs_Baseline", "Rules_Lost_vs_Baseline"],
+    )
+
+
+def run_sweep(
+    hist_df: pd.DataFrame,
+    new_df: pd.DataFrame,
+    metric_store: ArmMetricStore,
+    support_grid,
+    rule_support_grid,
+    confidence_grid,
+    baseline_support: float = BASELINE_SUPPORT,
+    baseline_rule: tuple = (BASELINE_RULE_SUPPORT, BASELINE_CONFIDENCE),
+    workers=None,
+    support_mode: str = "all",
+    window: int = 8,
+    half_life: float = 4,
+    quarters: Optional[dict] = None,
+    file_keys: Optional[dict] = None,
+) -> dict:
+    """Return the two summary sheets for already loaded frames.
+
+    ``quarters`` and ``file_keys`` map Source_File to its quarter and content
+    key for files the store has not counted yet (see
+    ``bom_ingest.member_quarter`` and ``ArmMetricStore.new_files``).
+    """
+    hist_df, new_df = encode_frames(hist_df, new_df)
+    combined_df = pd.concat([hist_df, new_df], ignore_index=True)
+    metric_store.apply_batch(hist_df, quarters, file_keys)
+    metric_store.apply_batch(new_df, quarters, file_keys)
+    metrics = metric_store.to_metrics(
+        window=window if support_mode == "window" else None,
+        half_life=half_life if support_mode == "decayed" else None,
+    )
+    is_new = ~PairIndex.from_frame(hist_df).contains(metrics)
+
+    item_index = PairIndex.from_frame(metrics)
+    rules = mine_pair_rules(
+        combined_df["Source_File"], item_index.encode(combined_df),
+        min_support=min(min(rule_support_grid), baseline_rule[0]),
+        min_confidence=min(min(confidence_grid), baseline_rule[1]),
+        workers=workers,
+    )
+    logger.info(f"Sweeping {len(metrics)} pairs and {len(rules)} candidate rules ({RULE_ENGINE} engine)")
+    return {
+        "Status_Sweep": sweep_status(metrics, is_new, support_grid, baseline_support, SUPPORT_COLUMNS[support_mode]),
+        "Rule_Sweep": sweep_rules(rules, rule_support_grid, confidence_grid, baseline_rule),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="bom-warning sweep", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--input-dir", type=Path, default=Path("."), help="Folder with Historical_BOM.zip / To_be_Added.zip")
+    parser.add_argument("--support", type=parse_grid, default=parse_grid("0.005:0.1:0.005"), help="Rare/Not Rare thresholds")
+    parser.add_argument("--rule-support", type=parse_grid, default=parse_grid("0.05:0.25:0.025"), help="Rule min support")
+    parser.add_argument("--confidence", type=parse_grid, default=parse_grid("0.5:0.9:0.1"), help="Rule min confidence")
+    parser.add_argument("--baseline-support", type=float, default=BASELINE_SUPPORT)
+    parser.add_argument("--support-mode", choices=list(SUPPORT_COLUMNS), default="all", help="Support swept for Rare / Not Rare")
+    parser.add_argument("--window", type=int, default=8, help="Quarters in the sliding window")
+    parser.add_argument("--half-life", type=float, default=4, help="Quarters after which counts weigh half")
+    parser.add_argument("--quarter", default=None, help="Quarter of the To_be_Added batch, e.g. 2024Q3")
+    parser.add_argument("--baseline-rule", type=float, nargs=2, default=[BASELINE_RULE_SUPPORT, BASELINE_CONFIDENCE])
+    parser.add_argument("--output", type=Path, default=Path("Threshold_Sweep.xlsx"))
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=["xlsx"])
+    parser.add_argument("--workers", type=int, default=None, help="Parser / mining processes (default: all cores)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+
+    # Same stores and parse cache as the scripts, so nothing already parsed is parsed again.
+    input_dir = args.input_dir
+    cache_dir = input_dir / ".bom_cache"
+    to_be_added_zip = input_dir / "To_be_Added.zip"
+    history = HistoryStore.open(input_dir / "History_Store", bootstrap_zip=input_dir / "Historical_BOM.zip", read_only=True)
+    hist_df = history.load("Historical", cache_dir=cache_dir, workers=args.workers)
+    # The batch under the names the next merge would give it: known content is left out.
+    plan = history.batch_plan(to_be_added_zip, parse_quarter(args.quarter) if args.quarter else None)
+    batch_names = {entry["name"]: entry["source_file"] for entry in plan}
+    new_df = load_zip(to_be_added_zip, "To_be_Added", cache_dir=cache_dir, workers=args.workers, source_names=batch_names)
+    # Read-only: the store is opened for its counts but never saved here.
+    metric_store = ArmMetricStore.open(input_dir / "ARM_Store")
+
+    sheets = run_sweep(
+        hist_df, new_df, metric_store, args.support, args.rule_support, args.confidence,
+        baseline_support=args.baseline_support, baseline_rule=tuple(args.baseline_rule), workers=args.workers,
+        support_mode=args.support_mode, window=args.window, half_life=args.half_life,
+        quarters={**history.file_quarters(), **{entry["source_file"]: entry["quarter"] for entry in plan}},
+        file_keys={**history.file_keys(), **content_keys(plan)},
+    )
+    write_report(args.output, sheets, formats=tuple(args.formats))
+    print(sheets["Status_Sweep"].to_string(index=False))
+    print(f"Rule counts are for the {RULE_ENGINE} engine only (Apriori / FP-Growth are not swept)")
+    print(f"✅ Threshold sweep written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resident early-warning lookup service for order intake.
+
+Loads the committed history (History_Store), the ARM metric store, the
+critical item list and the pairwise rules into memory once and answers
+(Component, Material) lookups over local HTTP or a Unix socket:
+
+    bom-warning serve --input-dir /Users/mahtab/Desktop/AIRE/Input --port 8765
+    bom-warning serve --input-dir /Users/mahtab/Desktop/AIRE/Input --socket /tmp/early_warning.sock
+
+    GET  /lookup?component=KM123456&material=AISI304[&rules=1]
+    POST /lookup   {"pairs": [["KM123456", "AISI304"], {"Component": "...", "Material": "..."}], "rules": false}
+    GET  /health
+    POST /reload
+
+Status follows ``assign_status`` exactly: New when the pair is not in the
+committed history, otherwise Rare / Not Rare by Support (all-history,
+windowed or decayed, as ``--support-mode`` selects; the returned Support and
+Confidence are those of the mode). Codes are
+normalized like the parsed workbooks. Every answer is a dictionary lookup on
+a prebuilt index. A watcher polls the history manifest, the metric store and
+the critical item file. When a new quarterly batch is committed, a fresh
+index is built on that thread and swapped in, so lookups never wait on a
+reload.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from .arm_store import SUPPORT_COLUMNS, ArmMetricStore
+from .bom_codes import encode_frames
+from .bom_ingest import format_component
+from .history_store import HistoryStore
+from .pair_index import PairIndex, assign_status
+from .pair_rules import mine_pair_rules
+from .pipeline import count_history, load_critical_items
+
+logger = logging.getLogger(__name__)
+
+SUPPORT_THRESHOLD = 0.035  # Same thresholds and support modes as FP-Growth_version.py
+RULE_MIN_SUPPORT = SUPPORT_THRESHOLD * 3
+RULE_MIN_CONFIDENCE = 0.8
+WINDOW_QUARTERS = 8
+DECAY_HALF_LIFE = 4
+POLL_SECONDS = 5.0
+
+
+def normalize_pair(component, material) -> tuple:
+    """Clean raw codes the way parse_member does."""
+    return format_component(component).strip().upper(), str(material).strip().upper()
+
+
+def input_signature(input_dir: Path) -> tuple:
+    """Changes whenever a batch is committed or the critical item list is edited."""
+    signature = []
+    for path in (input_dir / "History_Store" / "manifest.json", input_dir / "ARM_Store" / "store.json", input_dir / "KONE_Critical_Item.xlsx"):
+        try:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+# === In-memory index (one immutable snapshot per load)
+class WarningIndex:
+    def __init__(
+        self,
+        metrics: pd.DataFrame,
+        rules: pd.DataFrame,
+        critical_items: frozenset,
+        history_files: int,
+        signature: tuple = (),
+        support_mode: str = "all",
+    ):
+        support_column = SUPPORT_COLUMNS[support_mode]
+        self.positions = {pair: i for i, pair in enumerate(zip(metrics["Component"].astype(str), metrics["Material"].astype(str)))}
+        self.status = metrics["Status"].tolist()
+        self.support = metrics[support_column].tolist()
+        self.confidence = metrics[support_column.replace("Support", "Confidence")].tolist()
+        self.support_mode = support_mode
+        self.critical_items = critical_items
+        self.history_files = history_files
+        self.signature = signature
+        self.loaded = datetime.now().isoformat(timespec="seconds")
+        self.rules = {}  # Antecedent pair -> consequents, most confident first
+        for rule in rules.sort_values("confidence", ascending=False, kind="stable").itertuples(index=False):
+            self.rules.setdefault(rule.antecedent, []).append({
+                "Component": rule.consequent[0], "Material": rule.consequent[1],
+                "Support": round(rule.support, 5), "Confidence": round(rule.confidence, 5), "Lift": round(rule.lift, 5),
+            })
+
+    @classmethod
+    def build(
+        cls,
+        input_dir: Path,
+        support_threshold: float = SUPPORT_THRESHOLD,
+        support_mode: str = "all",
+        window: int = WINDOW_QUARTERS,
+        half_life: float = DECAY_HALF_LIFE,
+        rule_support: float = RULE_MIN_SUPPORT,
+        rule_confidence: float = RULE_MIN_CONFIDENCE,
+        workers: Optional[int] = None,
+    ) -> "WarningIndex":
+        """Load the committed state of ``input_dir`` (read-only, parse cache reused)."""
+        input_dir = Path(input_dir)
+        signature = input_signature(input_dir)
+        history = HistoryStore.open(input_dir / "History_Store", read_only=True)
+        segment_rows = {}
+        hist_df = history.load("Historical", cache_dir=input_dir / ".bom_cache", workers=workers, segment_rows=segment_rows)
+        hist_df, = encode_frames(hist_df)
+        metric_store = ArmMetricStore.open(input_dir / "ARM_Store")
+        # Files committed since the last pipeline run are counted here, in memory only.
+        count_history(metric_store, history, hist_df, segment_rows)
+        metrics = metric_store.to_metrics(
+            window=window if support_mode == "window" else None,
+            half_life=half_life if support_mode == "decayed" else None,
+        )
+        metrics["Status"] = assign_status(metrics, PairIndex.from_frame(hist_df), support_threshold, SUPPORT_COLUMNS[support_mode])
+
+        item_index = PairIndex.from_frame(metrics)
+        rules = mine_pair_rules(hist_df["Source_File"], item_index.encode(hist_df), rule_support, rule_confidence, workers=workers)
+        rules["antecedent"] = list(zip(*item_index.decode(rules["antecedent"])))
+        rules["consequent"] = list(zip(*item_index.decode(rules["consequent"])))
+        critical_items = load_critical_items(input_dir / "KONE_Critical_Item.xlsx")
+        index = cls(metrics, rules, critical_items, history.total_files, signature, support_mode)
+        logger.info(f"Index built: {len(index)} pairs, {len(rules)} rules, {history.total_files} history files")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    # === Lookups
+    def lookup(self, component, material, with_rules: bool = False) -> dict:
+        component, material = normalize_pair(component, material)
+        i = self.positions.get((component, material))
+        result = {
+            "Component": component,
+            "Material": material,
+            "Status": "New" if i is None else self.status[i],
+            "Support": None if i is None else self.support[i],
+            "Confidence": None if i is None else self.confidence[i],
+            "Critical_Flag": "Critical" if component in self.critical_items else "Safe",
+        }
+        if with_rules:
+            result["Rules"] = self.rules.get((component, material), [])
+        return result
+
+    def lookup_many(self, pairs, with_rules: bool = False) -> list:
+        return [self.lookup(component, material, with_rules) for component, material in pairs]
+
+    def summary(self) -> dict:
+        return {
+            "pairs": len(self),
+            "rules": sum(len(r) for r in self.rules.values()),
+            "critical_items": len(self.critical_items),
+            "history_files": self.history_files,
+            "support_mode": self.support_mode,
+            "loaded": self.loaded,
+        }
+
+
+# === Service: current index plus the hot-reload watcher
+class WarningService:
+    def __init__(self, input_dir: Path, poll_seconds: float = POLL_SECONDS, **build_kwargs):
+        self.input_dir = Path(input_dir)
+        self.poll_seconds = poll_seconds
+        self.build_kwargs = build_kwargs
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.index = WarningIndex.build(self.input_dir, **build_kwargs)
+
+    def reload(self, force: bool = False) -> bool:
+        """Rebuild the index if the inputs changed; the old one serves until the swap."""
+        with self._reload_lock:
+            if not force and input_signature(self.input_dir) == self.index.signature:
+                return False
+            try:
+                index = WarningIndex.build(self.input_dir, **self.build_kwargs)
+            except Exception as e:
+                # A commit or compaction may still be in flight; the next poll retries.
+                logger.warning(f"Reload failed, keeping the index from {self.index.loaded}: {e}")
+                return False
+            self.index = index
+            return True
+
+    def watch(self) -> threading.Thread:
+        def poll():
+            while not self._stop.wait(self.poll_seconds):
+                if self.reload():
+                    logger.info("New batch committed; index reloaded")
+
+        thread = threading.Thread(target=poll, name="warning-index-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so intake clients reuse one connection
+    service: WarningService = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/health":
+            return self._send(200, self.service.index.summary())
+        if url.path != "/lookup":
+            return self._send(404, {"error": f"Unknown path {url.path}"})
+        if "component" not in query or "material" not in query:
+            return self._send(400, {"error": "component and material are required"})
+        with_rules = query.get("rules", ["0"])[0] in ("1", "true")
+        self._send(200, self.service.index.lookup(query["component"][0], query["material"][0], with_rules))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/reload":
+            return self._send(200, {"reloaded": self.service.reload(force=True), **self.service.index.summary()})
+        if url.path != "/lookup":
+            return self._send(404, {"error": f"Unknown path {url.path}"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            pairs = [(p["Component"], p["Material"]) if isinstance(p, dict) else tuple(p) for p in body["pairs"]]
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send(400, {"error": f"Expected {{\"pairs\": [[component, material], ...]}}: {e}"})
+        index = self.service.index  # One snapshot for the whole batch
+        self._send(200, {"results": index.lookup_many(pairs, bool(body.get("rules")))})
+
+    def _send(self, code: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Unix-socket peers have no address, so the default (address-prefixed) log line cannot be used.
+        logger.debug(format % args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: WarningService, host: str = "127.0.0.1", port: int = 8765, socket_path: Optional[Path] = None):
+    # Headers and body go out as separate writes, so TCP needs Nagle off to
+    # avoid a delayed-ACK stall per keep-alive request.
+    handler = type("WarningHandler", (_Handler,), {"service": service, "disable_nagle_algorithm": socket_path is None})
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixHTTPServer(str(socket_path), handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="bom-warning serve", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--input-dir", type=Path, default=Path("."), help="Folder with History_Store / ARM_Store / KONE_Critical_Item.xlsx")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", type=Path, help="Serve on this Unix socket instead of TCP")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="Seconds between checks for a committed batch")
+    parser.add_argument("--support-threshold", type=float, default=SUPPORT_THRESHOLD)
+    parser.add_argument("--support-mode", choices=list(SUPPORT_COLUMNS), default="all", help="Support used for Rare / Not Rare")
+    parser.add_argument("--window", type=int, default=WINDOW_QUARTERS, help="Quarters in the sliding window")
+    parser.add_argument("--half-life", type=float, default=DECAY_HALF_LIFE, help="Quarters after which counts weigh half")
+    parser.add_argument("--workers", type=int, default=None, help="Parser / mining processes used on (re)load")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+
+    start = time.perf_counter()
+    service = WarningService(
+        args.input_dir, poll_seconds=args.poll, support_threshold=args.support_threshold, support_mode=args.support_mode,
+        window=args.window, half_life=args.half_life, workers=args.workers,
+    )
+    logger.info(f"Index ready in {time.perf_counter() - start:.2f}s: {service.index.summary()}")
+    service.watch()
+    server = make_server(service, args.host, args.port, args.socket)
+    print(f"✅ Early warning service on {args.socket or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+        if args.socket is not None and args.socket.exists():
+            args.socket.unlink()
+
+
+if __name__ == "__main__":
+    main()
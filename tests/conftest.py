@@ -0,0 +1,27 @@
+"""Shared fixtures: a small synthetic input folder (see benchmarks/synthetic_bom.py)."""
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from synthetic_bom import SyntheticConfig, generate  # noqa: E402
+
+INPUT_FILES = ("Historical_BOM.zip", "To_be_Added.zip", "KONE_Critical_Item.xlsx")
+SMALL = SyntheticConfig(files=12, new_files=3, rows_per_file=12, components=40, materials=6, quarters=4)
+
+
+@pytest.fixture(scope="session")
+def generated_inputs(tmp_path_factory) -> Path:
+    return generate(tmp_path_factory.mktemp("generated"), SMALL)
+
+
+@pytest.fixture
+def input_dir(generated_inputs, tmp_path) -> Path:
+    """A fresh copy of the synthetic inputs: stores, caches and snapshots start empty."""
+    for name in INPUT_FILES:
+        shutil.copy(generated_inputs / name, tmp_path)
+    return tmp_path
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bom_warning.arm_store import ArmMetricStore, _file_names
+from bom_warning.bom_codes import encode_frames
+
+
+def bom_rows(first: int, files: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed + first)
+    frames = []
+    for number in range(first, first + files):
+        rows = int(rng.integers(3, 20))
+        frames.append(pd.DataFrame({
+            "Component": [f"KM{c}" for c in rng.integers(0, 12, rows)],
+            "Material": [f"M{m}" for m in rng.integers(0, 4, rows)],
+            "Source_File": f"BOM_{number:03d}.xlsx",
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def quarters_of(df: pd.DataFrame) -> dict:
+    return {name: 8000 + i % 5 for i, name in enumerate(sorted(df["Source_File"].unique()))}
+
+
+def metrics_of(store: ArmMetricStore) -> pd.DataFrame:
+    return store.to_metrics(window=2, half_life=2)
+
+
+def test_incremental_counts_match_from_scratch(tmp_path):
+    batches = [bom_rows(0, 10), bom_rows(10, 3), bom_rows(13, 1), bom_rows(14, 6)]
+    everything = pd.concat(batches, ignore_index=True)
+    quarters = quarters_of(everything)
+
+    scratch = ArmMetricStore()
+    scratch.apply_batch(everything, quarters)
+    incremental = ArmMetricStore()
+    for batch in batches:
+        incremental.apply_batch(batch, quarters)
+        incremental.save(tmp_path / "store")
+        incremental = ArmMetricStore.load(tmp_path / "store")
+
+    assert incremental.files == scratch.files
+    pd.testing.assert_frame_equal(metrics_of(incremental), metrics_of(scratch))
+
+
+def test_applying_a_batch_twice_adds_nothing():
+    batch = bom_rows(0, 4)
+    store = ArmMetricStore.from_frame(batch)
+    before = store.to_metrics()
+    assert store.apply_batch(batch) == 0
+    pd.testing.assert_frame_equal(store.to_metrics(), before)
+
+
+def test_counted_name_with_other_content_is_rejected():
+    batch = bom_rows(0, 1)
+    store = ArmMetricStore()
+    store.apply_batch(batch, file_keys={"BOM_000.xlsx": "a" * 64})
+    with pytest.raises(ValueError):
+        store.apply_batch(batch, file_keys={"BOM_000.xlsx": "b" * 64})
+
+
+def test_same_content_under_another_name_is_skipped():
+    batch = bom_rows(0, 1)
+    store = ArmMetricStore()
+    store.apply_batch(batch, file_keys={"BOM_000.xlsx": "a" * 64})
+    renamed = batch.assign(Source_File="BOM_copy.xlsx")
+    assert store.apply_batch(renamed, file_keys={"BOM_copy.xlsx": "a" * 64}) == 0
+
+
+def test_shared_vocabulary_lists_only_files_with_rows():
+    hist_df, new_df = encode_frames(bom_rows(0, 3), bom_rows(3, 2))
+    assert _file_names(new_df["Source_File"]) == ["BOM_003.xlsx", "BOM_004.xlsx"]
+    assert _file_names(hist_df["Source_File"].iloc[:0]) == []
+
+
+def test_open_recounts_under_another_code_mapping(tmp_path):
+    store = ArmMetricStore("v1")
+    store.apply_batch(bom_rows(0, 3))
+    store.save(tmp_path / "store")
+    assert ArmMetricStore.open(tmp_path / "store", "v1").total_files == 3
+    reopened = ArmMetricStore.open(tmp_path / "store", "v2")
+    assert reopened.total_files == 0 and reopened.code_map_version == "v2"
@@ -0,0 +1,35 @@
+import pandas as pd
+
+from bom_warning.code_canonical import CodeIndex, match_key, stem_key
+
+
+def codes(materials: list) -> pd.DataFrame:
+    return pd.DataFrame({"Component": [f"KM{i}" for i in range(len(materials))], "Material": materials})
+
+
+def test_spelling_variants_are_merged_but_numbers_are_not(tmp_path):
+    index = CodeIndex.open(tmp_path / "Code_Index")
+    index.update(codes(["ALUMINIUM", "ALUMINIUM", "ALUMINUM", "AISI 304", "AISI 316"]))
+    mapping = index.mapping("Material")
+    assert mapping == {"ALUMINUM": "ALUMINIUM"}
+
+
+def test_stem_key_drops_only_a_trailing_number():
+    assert stem_key(match_key("ALUMINIUM 1.5")) == "ALUMINIUM"
+    assert stem_key(match_key("AISI 304")) == "AISI"
+    assert stem_key(match_key("S355 10")) == ""  # The grade's digits remain
+    assert stem_key(match_key("X1")) == ""  # Too short
+
+
+def test_trailing_number_variant_is_suggested_until_accepted(tmp_path):
+    index = CodeIndex.open(tmp_path / "Code_Index")
+    index.update(codes(["ALUMINIUM 1.5", "ALUMINIUM 1.5", "aluminium"]))
+    assert index.mapping("Material") == {}
+    review = index.review_table()
+    suggested = review[review["Decision"] == "suggested"]
+    assert suggested[["Code", "Canonical"]].values.tolist() == [["aluminium", "ALUMINIUM 1.5"]]
+
+    index.save()
+    review.loc[review["Decision"] == "suggested", "Decision"] = "accepted"
+    review.to_csv(index.review_path, index=False)
+    assert CodeIndex.open(tmp_path / "Code_Index").mapping("Material") == {"aluminium": "ALUMINIUM 1.5"}
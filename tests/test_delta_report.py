@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+from bom_warning.arm_store import ArmMetricStore
+from bom_warning.delta_report import DeltaSnapshot, quarter_delta
+
+SUPPORT_THRESHOLD = 0.2
+CRITICAL = {"KM1"}
+
+
+def bom_rows(rng, first: int, files: int) -> pd.DataFrame:
+    frames = []
+    for number in range(first, first + files):
+        rows = int(rng.integers(3, 30))
+        frames.append(pd.DataFrame({
+            "Component": [f"KM{c}" for c in rng.integers(0, 15, rows)],
+            "Material": [f"M{m}" for m in rng.integers(0, 6, rows)],
+            "Source_File": f"BOM_{number:03d}.xlsx",
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_incremental_delta_matches_full_comparison(tmp_path):
+    rng = np.random.default_rng(0)
+    store = ArmMetricStore()
+    frames = []
+
+    def rows_of(files):
+        return pd.concat([df[df["Source_File"].isin(files)] for df in frames], ignore_index=True)
+
+    first = 0
+    for step, files in enumerate([20, 3, 5, 1, 7]):
+        frames.append(bom_rows(rng, first, files))
+        first += files
+        store.apply_batch(frames[-1])
+        metrics = store.to_metrics()
+        sheets, snapshot = quarter_delta(tmp_path / "incremental", rows_of, store, metrics, SUPPORT_THRESHOLD, CRITICAL)
+
+        # The same previous snapshot under another code mapping forces the full comparison.
+        full_path = tmp_path / f"full{step}"
+        if step:
+            previous = DeltaSnapshot.open(tmp_path / "previous")
+            previous.root, previous.code_map_version = full_path, "other"
+            previous.save()
+        full, _ = quarter_delta(full_path, rows_of, store, metrics, SUPPORT_THRESHOLD, CRITICAL)
+
+        assert step == 0 or len(sheets["Pair_Delta"])
+        pd.testing.assert_frame_equal(sheets["Pair_Delta"].astype(str), full["Pair_Delta"].astype(str))
+        snapshot.save()
+        snapshot.root = tmp_path / "previous"
+        snapshot.save()
+
+    saved = DeltaSnapshot.open(tmp_path / "incremental").pairs
+    assert saved["Key"].is_monotonic_increasing
+    expected = store.to_metrics()
+    assert dict(zip(zip(saved["Component"], saved["Material"]), saved["Count"])) == dict(
+        zip(zip(expected["Component"], expected["Material"]), expected["File_Occurrence"])
+    )
+
+
+def test_snapshot_is_only_written_by_save(tmp_path):
+    store = ArmMetricStore.from_frame(bom_rows(np.random.default_rng(1), 0, 4))
+    _, snapshot = quarter_delta(tmp_path / "snapshot", lambda files: pd.DataFrame(), store, store.to_metrics(), 0.2, set())
+    assert not (tmp_path / "snapshot").exists()
+    snapshot.save()
+    assert DeltaSnapshot.open(tmp_path / "snapshot").total_files == 4
@@ -0,0 +1,52 @@
+import zipfile
+
+from bom_warning.history_store import HistoryStore, versioned_name
+
+
+def members(path) -> dict:
+    with zipfile.ZipFile(path) as archive:
+        return {info.filename: archive.read(info) for info in archive.infolist()}
+
+
+def write_zip(path, contents: dict):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in contents.items():
+            archive.writestr(name, data)
+    return path
+
+
+def test_known_content_is_skipped_and_a_resent_name_is_versioned(input_dir):
+    history = HistoryStore.open(input_dir / "History_Store", bootstrap_zip=input_dir / "Historical_BOM.zip")
+    (first, first_data), (second, second_data) = list(members(input_dir / "Historical_BOM.zip").items())[:2]
+    batch = write_zip(input_dir / "batch.zip", {"renamed_copy.xlsx": first_data, second: first_data + b" "})
+    # The copy is caught by content; the re-sent name has new bytes, so it is kept.
+    planned = history.batch_plan(batch)
+    assert [entry["name"] for entry in planned] == [second]
+    assert history.append_zip(batch) == 1
+    resent = history.manifest["segments"][-1]["members"][0]
+    assert resent["source_file"] == versioned_name(second, resent["sha256"])
+    assert history.append_zip(batch) == 0
+
+
+def test_compaction_retires_segments_until_purged(input_dir):
+    history = HistoryStore.open(input_dir / "History_Store", bootstrap_zip=input_dir / "Historical_BOM.zip")
+    history.append_zip(input_dir / "To_be_Added.zip")
+    reader = HistoryStore.open(input_dir / "History_Store", read_only=True)
+    expected = len(reader.load("Historical"))
+    old_segments = reader.segments
+
+    assert history.compact() == 1
+    assert all(path.exists() for path in old_segments)
+    assert len(reader.load("Historical")) == expected  # Still on the old manifest
+
+    assert history.purge_retired() == 0  # Within the grace period
+    assert history.purge_retired(grace=0) == 2
+    assert not any(path.exists() for path in old_segments)
+    assert len(reader.load("Historical")) == expected  # Re-read the manifest
+    assert reader.segments == history.segments
+
+
+def test_read_only_open_writes_nothing(input_dir):
+    history = HistoryStore.open(input_dir / "History_Store", bootstrap_zip=input_dir / "Historical_BOM.zip", read_only=True)
+    assert history.total_files == len(members(input_dir / "Historical_BOM.zip"))
+    assert not (input_dir / "History_Store").exists()
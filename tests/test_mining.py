@@ -0,0 +1,29 @@
+import pytest
+
+from bom_warning import pipeline
+from bom_warning.mining import mine_rules
+from bom_warning.pair_index import PairIndex
+from bom_warning.pipeline import InputPaths
+
+pytest.importorskip("mlxtend")
+
+RULE_COLUMNS = ["Component", "Material", "support", "confidence", "lift"]
+
+
+@pytest.mark.parametrize("min_support, min_confidence", [(0.5, 0.6), (0.25, 0.8)])
+def test_sparse_rules_match_apriori(input_dir, min_support, min_confidence):
+    data = pipeline.ingest(InputPaths.under(input_dir), workers=1, include_new=False, max_files=4)
+    item_index = PairIndex.from_frame(data.hist_df)
+    mined = {
+        engine: mine_rules(data.hist_df, item_index, engine=engine, min_support=min_support, min_confidence=min_confidence)
+        for engine in ("apriori", "sparse")
+    }
+    keys = ["Antecedent", "Consequent"]
+    apriori, sparse = (
+        rules.sort_values(keys, ignore_index=True)[keys + RULE_COLUMNS].astype({c: float for c in RULE_COLUMNS[2:]})
+        for rules in (mined["apriori"], mined["sparse"])
+    )
+    assert len(apriori)
+    assert apriori[keys].values.tolist() == sparse[keys].values.tolist()
+    for column in RULE_COLUMNS[2:]:
+        assert apriori[column].to_numpy() == pytest.approx(sparse[column].to_numpy())
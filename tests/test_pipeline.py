@@ -0,0 +1,41 @@
+import shutil
+
+import pandas as pd
+
+from bom_warning import pipeline
+from bom_warning.pipeline import InputPaths
+
+
+def metrics_frame(input_dir, save: bool = True, **ingest_kwargs) -> pd.DataFrame:
+    data = pipeline.ingest(InputPaths.under(input_dir), workers=1, **ingest_kwargs)
+    return pipeline.update_metrics(data, support_mode="window", save=save).frame
+
+
+def test_streamed_counts_match_loaded_counts(input_dir):
+    # Neither run saves the store, so both count every file from scratch.
+    loaded = metrics_frame(input_dir, save=False)
+    streamed = metrics_frame(input_dir, save=False, load_rows=False)
+    assert len(loaded)
+    pd.testing.assert_frame_equal(streamed, loaded)
+
+
+def test_incremental_metrics_match_a_rebuild(input_dir):
+    paths = InputPaths.under(input_dir)
+    data = pipeline.ingest(paths, workers=1)
+    pipeline.update_metrics(data)
+    assert pipeline.merge_history(data.history, paths.to_be_added_zip) > 0
+
+    incremental = metrics_frame(input_dir)
+    shutil.rmtree(paths.metric_store)
+    rebuilt = metrics_frame(input_dir)
+    pd.testing.assert_frame_equal(incremental, rebuilt)
+
+
+def test_file_rows_reads_only_the_requested_files(input_dir):
+    data = pipeline.ingest(InputPaths.under(input_dir), workers=1)
+    wanted = [data.hist_df["Source_File"].iloc[-1], data.new_df["Source_File"].iloc[0]]
+    rows = pipeline.file_rows(data, wanted)
+    expected = pd.concat([data.hist_df, data.new_df], ignore_index=True)
+    expected = expected[expected["Source_File"].isin(wanted)]
+    assert set(rows["Source_File"]) == set(wanted)
+    assert len(rows) == len(expected)